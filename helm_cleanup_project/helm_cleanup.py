@@ -1,21 +1,26 @@
-import subprocess
+import argparse
 import datetime
+import time
 import json
 import pytz
 
-def run_command(command):
-    process = subprocess.Popen(command, stdout=subprocess.PIPE, shell=True)
-    output, error = process.communicate()
-    return output.decode('utf-8')
+from helmdates import parse_helm_time
+from helmexec import UninstallExecutor, helm_uninstall, print_summary
+from helmmetrics import Metrics
+from helmproc import run_command
+from helmstore import connect, list_releases
 
-def get_helm_releases():
-    output = run_command("helm list -A -o json")
+def get_helm_releases(source='helm', api_server=None):
+    if source == 'api':
+        # Reads release Secret labels directly instead of forking helm
+        return list_releases(connect(api_server))
+    # Argument vector, no shell; raises CalledProcessError with helm's stderr
+    output = run_command(['helm', 'list', '-A', '-o', 'json'])
     return json.loads(output)
 
 def parse_helm_date(date_string):
-    # Remove the fractional seconds and UTC indicator
-    date_string = date_string.split('.')[0] + ' UTC'
-    return datetime.datetime.strptime(date_string, "%Y-%m-%d %H:%M:%S %Z").replace(tzinfo=pytz.UTC)
+    # Handles fractional seconds and any UTC offset (BST, +0200, ...)
+    return datetime.datetime.fromtimestamp(parse_helm_time(date_string), pytz.UTC)
 
 def should_delete(release):
     # Example: Delete releases older than 30 days
@@ -29,11 +34,57 @@ def delete_release(release):
     #run_command(f"nstall {name} -n {namespace}")
     print(f"Deleted release: {name} in namespace: {namespace}")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Delete Helm releases older than 30 days.")
+    parser.add_argument('--source', choices=['helm', 'api'], default='helm', help="where to read the release inventory from")
+    parser.add_argument('--api-server', help="API server URL for --source api (default: in-cluster)")
+    parser.add_argument('--execute', action='store_true', help="actually run helm uninstall (default: dry run)")
+    parser.add_argument('--workers', type=int, default=8, help="maximum concurrent uninstalls")
+    parser.add_argument('--namespace-limit', type=int, default=4, help="maximum concurrent uninstalls per namespace")
+    parser.add_argument('--retries', type=int, default=2, help="retries per failed uninstall")
+    parser.add_argument('--batch-size', type=int, default=10, help="releases per helm uninstall call")
+    parser.add_argument('--metrics-file', help="write run metrics here (node-exporter textfile collector format)")
+    parser.add_argument('--pushgateway', help="push run metrics to this Pushgateway URL")
+    parser.add_argument('--job', default='helm_cleanup', help="Pushgateway job name (default: helm_cleanup)")
+    return parser.parse_args()
+
 def main():
-    releases = get_helm_releases()
-    for release in releases:
-        if should_delete(release):
+    args = parse_args()
+    metrics = Metrics('helm_cleanup')
+    try:
+        run(args, metrics)
+        metrics.set('run_success', "1 if the last run completed.", 1)
+    except BaseException:
+        metrics.set('run_success', "1 if the last run completed.", 0)
+        raise
+    finally:
+        metrics.set('last_run_timestamp_seconds', "When the last run finished.", int(time.time()))
+        if args.metrics_file:
+            metrics.write_textfile(args.metrics_file)
+        if args.pushgateway:
+            metrics.push(args.pushgateway, args.job)
+
+def run(args, metrics):
+    with metrics.span('list'):
+        listed = get_helm_releases(args.source, args.api_server)
+    metrics.inc('releases_seen', "Releases listed.", len(listed))
+    with metrics.span('decide'):
+        releases = [release for release in listed if should_delete(release)]
+    metrics.inc('releases_retained', "Releases kept, by reason.", len(listed) - len(releases), reason='young')
+    metrics.inc('releases_stale', "Releases older than 30 days.", len(releases))
+    if not args.execute:
+        for release in releases:
             delete_release(release)
+        return
+    uninstall = metrics.observed('uninstall_call_duration_seconds', "Duration of helm uninstall calls, by outcome.",
+                                 helm_uninstall)
+    executor = UninstallExecutor(workers=args.workers, namespace_limit=args.namespace_limit, retries=args.retries,
+                                 batch_size=args.batch_size, uninstall=uninstall)
+    with metrics.span('uninstall'):
+        results = executor.run([(release['name'], release['namespace']) for release in releases])
+    metrics.inc('releases_uninstalled', "Releases uninstalled.", sum(result.ok for result in results))
+    metrics.inc('uninstall_failures', "Releases that could not be uninstalled.", sum(not result.ok for result in results))
+    print_summary(results)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,324 @@
+import argparse
+import contextlib
+import csv
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import helmcolumns
+from helmsnapshots import SNAPSHOT_FIELDS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DELHELM_DIR = os.path.join(HERE, 'helmdel', 'delhelm')
+
+BASELINE_VERSION = 1
+
+# Stack shapes seen in our snapshots: a name pattern ({id} is a random
+# 6-character tag) and the suffixes of its members ('' is the stack root).
+STACKS = [
+    ('vector-backend-{ticket}-{id}', ['', 'audit', 'db', 'frontend', 'rabbitmq', 'redis']),
+    ('vector-frontend-{letter}-{id}', ['', 'unleash-proxy']),
+    ('workflow-builder-{id}', ['', 'audit', 'be', 'db-be', 'fe', 'rabbitmq', 'redis']),
+    ('ref-{project}-{number}-{word}-{id}', ['', 'db', 'redis']),
+    ('vector-cargowise-{id}', ['', 'db', 'rabbitmq']),
+    ('vector-email-serv-{id}', ['', 'db-be', 'db-email', 'e', 'elasticsearch']),
+]
+PROJECTS = ['omn', 'apps2', 'enblr', 'fin', 'raft']
+WORDS = ['loo', 'car', 'disab', 'ship', 'rate', 'mail']
+
+# Long-lived services, which pile up revisions.
+SERVICES = ['vector-ocr-manager', 'vector-standardize', 'vector-splice', 'quotes-rates', 'dagster',
+            'workflow-builder', 'raft-ship-ext-consumer', 'email-ner', 'billing-service', 'grafana']
+NAMESPACES = ['default'] * 12 + ['ml', 'monitoring', 'dagster', 'linkerd', 'kafka', 'pulsar']
+
+# (offset, zone) pairs helm prints, weighted roughly as in our snapshots
+ZONES = [('+0000', 'UTC')] * 16 + [('+0100', 'BST')] * 2 + [('+0200', '+0200'), ('+0530', '+0530')]
+
+_ID_CHARS = 'abcdefghijklmnopqrstuvwxyz0123456789'
+
+def _helm_time(rng, when):
+    offset, zone = rng.choice(ZONES)
+    hours, minutes = int(offset[1:3]), int(offset[3:])
+    local = when + timedelta(hours=hours, minutes=minutes)
+    roll = rng.random()
+    if roll < 0.05:
+        fraction = ''
+    elif roll < 0.3:
+        fraction = f".{rng.randrange(10 ** 6):06d}"
+    else:
+        fraction = f".{rng.randrange(10 ** 9):09d}"
+    return f"{local:%Y-%m-%d %H:%M:%S}{fraction} {offset} {zone}"
+
+def iter_inventory(count, seed=0, now=None):
+    """
+    Yield `count` synthetic release rows (SNAPSHOT_FIELDS, as strings), deterministically for `seed`.
+
+    About 90% of releases are preview stacks in the shapes of STACKS, the rest
+    long-lived services with their own namespaces and revision counts in the
+    tens of thousands. Timestamps mix UTC, BST and numeric offsets, with and
+    without fractional seconds; ages run from hours to a few years; about 3%
+    of releases are failed. Names are unique.
+    """
+    rng = random.Random(seed)
+    now = now or datetime(2024, 10, 1, tzinfo=timezone.utc)
+    seen = set()
+    produced = 0
+    while produced < count:
+        if rng.random() < 0.1:
+            base = rng.choice(SERVICES)
+            names = [base if base not in seen else f"{base}-{rng.randrange(10 ** 4)}"]
+            namespace = rng.choice(NAMESPACES)
+            long_lived = True
+        else:
+            pattern, suffixes = rng.choice(STACKS)
+            root = pattern.format(id=''.join(rng.choice(_ID_CHARS) for _ in range(6)),
+                                  ticket=rng.choice(['bl', 'cu', 'do', 'ed', 'fi', 'om']),
+                                  letter=rng.choice('bcefo'), project=rng.choice(PROJECTS),
+                                  number=rng.randrange(100, 2000), word=rng.choice(WORDS))
+            names = [f"{root}-{suffix}" if suffix else root for suffix in suffixes]
+            # Not every stack still has its root or all of its members
+            names = [name for name in names if rng.random() < 0.9] or names[:1]
+            namespace = 'default'
+            long_lived = False
+        deployed = now - timedelta(seconds=int(rng.expovariate(1 / (120 * 86400))))
+        for name in names:
+            if name in seen or produced >= count:
+                continue
+            seen.add(name)
+            produced += 1
+            when = deployed + timedelta(seconds=rng.randrange(600))
+            chart = f"{name.split('-')[0]}-{rng.randrange(3)}.{rng.randrange(20)}.{rng.randrange(10)}"
+            revision = 1 + int(rng.lognormvariate(5, 2)) % 100000 if long_lived else rng.randrange(1, 10)
+            yield {
+                'name': name,
+                'namespace': namespace,
+                'revision': str(revision),
+                'updated': _helm_time(rng, when),
+                'status': 'failed' if rng.random() < 0.03 else 'deployed',
+                'chart': chart,
+                'app_version': f"{rng.randrange(3)}.{rng.randrange(10)}",
+            }
+
+def write_inventory(path, count, seed=0):
+    """Write a synthetic inventory as a helmoutput-style CSV (every field quoted, as jq @csv does)."""
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SNAPSHOT_FIELDS, quoting=csv.QUOTE_ALL)
+        writer.writeheader()
+        writer.writerows(iter_inventory(count, seed))
+
+class PhaseTimer:
+    """
+    Record wall time and peak RSS for each named phase of one run.
+
+    With `allocations`, tracemalloc also records the peak traced memory and the
+    number of live allocated blocks at the end of each phase. Tracing slows
+    the code down, so allocations are measured in a separate run from timings.
+    """
+
+    def __init__(self, allocations=False):
+        self.allocations = allocations
+        self.phases = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if self.allocations:
+            tracemalloc.start()
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        result = {'phase': name, 'seconds': seconds,
+                  'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+        if self.allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            result['alloc_peak_bytes'] = peak
+            result['alloc_blocks'] = len(tracemalloc.take_snapshot().traces)
+            tracemalloc.stop()
+        self.phases.append(result)
+
+def bench_helmclean(path, timer):
+    import helmclean
+    with timer.phase('read'):
+        with open(path, newline='') as f:
+            releases = list(csv.DictReader(f))
+    with timer.phase('parse+group'):
+        records, counts, latest = helmclean.load_records(releases)
+    now = int(time.time())
+    with timer.phase('decide'):
+        for record in records:
+            helmclean.decide(record, counts, latest, now)
+
+def bench_helmclean_numpy(path, timer):
+    import helmclean
+    with open(path, newline='') as f:
+        records, _, _ = helmclean.load_records(csv.DictReader(f))
+    now = int(time.time())
+    with timer.phase('columns'):
+        inventory = helmcolumns.ColumnarInventory(records)
+    with timer.phase('decide'):
+        helmcolumns.evaluate(inventory, now, helmclean.RETENTION_DAYS)
+
+def bench_delhelm(path, timer):
+    sys.path.insert(0, DELHELM_DIR)
+    import delhelm
+    # Reading is streamed into processing, so the two are one phase
+    with timer.phase('process'), contextlib.redirect_stdout(open(os.devnull, 'w')):
+        delhelm.process_data(delhelm.read_lines([path]))
+
+def bench_newdel(path, timer):
+    sys.path.insert(0, DELHELM_DIR)
+    import newdel
+    from helmrules import RuleSet
+    rules = RuleSet.load(newdel.RULES_FILE)
+    with timer.phase('group'):
+        grouped, failed = newdel.group_deployments(path, rules)
+    with timer.phase('print'), contextlib.redirect_stdout(open(os.devnull, 'w')):
+        newdel.print_grouped_deployments(grouped, failed)
+
+BENCHMARKS = {
+    'helmclean': bench_helmclean,
+    'helmclean-numpy': bench_helmclean_numpy,
+    'delhelm': bench_delhelm,
+    'newdel': bench_newdel,
+}
+
+def available_benchmarks():
+    """Names of the benchmarks that can run here; the NumPy one needs NumPy installed."""
+    return [name for name in BENCHMARKS if name != 'helmclean-numpy' or helmcolumns.np is not None]
+
+def measure(implementation, path, allocations=False):
+    """Run one implementation against an inventory CSV in a fresh interpreter and return its phases."""
+    command = [sys.executable, os.path.abspath(__file__), 'measure', implementation, path]
+    if allocations:
+        command.append('--allocations')
+    result = subprocess.run(command, capture_output=True, text=True, cwd=HERE)
+    if result.returncode != 0:
+        raise RuntimeError(f"{implementation} on {path} failed:\n{result.stderr}")
+    return json.loads(result.stdout)
+
+def run_benchmarks(implementations, sizes, seed=0, repeat=1, allocations=False, workdir=None, progress=sys.stderr):
+    """
+    Benchmark each implementation at each inventory size and return one row per phase.
+
+    Every measurement runs in its own interpreter, so peak RSS belongs to that
+    implementation alone. With `repeat` > 1 the fastest run is kept.
+    """
+    rows = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"helmoutput-{size}.csv")
+            write_inventory(path, size, seed)
+            for implementation in implementations:
+                runs = [measure(implementation, path) for _ in range(max(1, repeat))]
+                best = {}
+                for phases in runs:
+                    for phase in phases:
+                        if phase['phase'] not in best or phase['seconds'] < best[phase['phase']]['seconds']:
+                            best[phase['phase']] = phase
+                if allocations:
+                    for phase in measure(implementation, path, allocations=True):
+                        best[phase['phase']].update(alloc_peak_bytes=phase['alloc_peak_bytes'],
+                                                    alloc_blocks=phase['alloc_blocks'])
+                for phase in best.values():
+                    rows.append(dict(phase, implementation=implementation, size=size))
+                    progress.write(f"{implementation:<15} {size:>8} {phase['phase']:<12} "
+                                   f"{phase['seconds']:>9.3f}s {phase['peak_rss_kb'] / 1024:>8.1f} MB\n")
+    return rows
+
+def save_results(path, rows, seed):
+    results = {
+        'version': BASELINE_VERSION,
+        'created': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'seed': seed,
+        'results': rows,
+    }
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=1)
+
+def compare(rows, baseline_path, tolerance, out=sys.stdout):
+    """
+    Print each phase against a saved baseline and return the regressions.
+
+    A phase regresses if its time or peak RSS grew by more than the
+    `tolerance` factor. Phases missing from the baseline are skipped.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get('version') != BASELINE_VERSION:
+        raise ValueError(f"{baseline_path}: unsupported baseline version {baseline.get('version')!r}")
+    before = {(row['implementation'], row['size'], row['phase']): row for row in baseline['results']}
+    regressions = []
+    out.write(f"{'implementation':<15} {'size':>8} {'phase':<12} {'time':>8} {'rss':>8}\n")
+    for row in rows:
+        old = before.get((row['implementation'], row['size'], row['phase']))
+        if old is None:
+            continue
+        time_ratio = row['seconds'] / old['seconds'] if old['seconds'] else 1.0
+        rss_ratio = row['peak_rss_kb'] / old['peak_rss_kb'] if old['peak_rss_kb'] else 1.0
+        flag = ''
+        if time_ratio > tolerance or rss_ratio > tolerance:
+            regressions.append(row)
+            flag = '  REGRESSION'
+        out.write(f"{row['implementation']:<15} {row['size']:>8} {row['phase']:<12} "
+                  f"{time_ratio:>7.2f}x {rss_ratio:>7.2f}x{flag}\n")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic Helm inventories and benchmark the cleanup scripts.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = commands.add_parser('generate', help="write a synthetic helmoutput CSV")
+    generate_parser.add_argument('output')
+    generate_parser.add_argument('--count', type=int, default=1000, help="number of releases")
+    generate_parser.add_argument('--seed', type=int, default=0)
+
+    run_parser = commands.add_parser('run', help="benchmark the implementations")
+    run_parser.add_argument('--sizes', default='1000,10000,100000',
+                            help="comma-separated inventory sizes (default: 1000,10000,100000)")
+    run_parser.add_argument('--impl', default=','.join(available_benchmarks()),
+                            help=f"comma-separated implementations (default: {','.join(available_benchmarks())})")
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--repeat', type=int, default=1, help="runs per measurement; the fastest is kept")
+    run_parser.add_argument('--allocations', action='store_true', help="also measure allocations with tracemalloc")
+    run_parser.add_argument('--output', help="save the results as a baseline JSON file")
+    run_parser.add_argument('--baseline', help="compare against a saved baseline; exit 1 on a regression")
+    run_parser.add_argument('--tolerance', type=float, default=1.25,
+                            help="slowdown/growth factor counted as a regression (default: 1.25)")
+
+    measure_parser = commands.add_parser('measure', help=argparse.SUPPRESS)
+    measure_parser.add_argument('implementation', choices=list(BENCHMARKS))
+    measure_parser.add_argument('path')
+    measure_parser.add_argument('--allocations', action='store_true')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        write_inventory(args.output, args.count, args.seed)
+        print(f"Wrote {args.count} releases to {args.output}")
+    elif args.command == 'measure':
+        timer = PhaseTimer(args.allocations)
+        BENCHMARKS[args.implementation](args.path, timer)
+        json.dump(timer.phases, sys.stdout)
+    else:
+        implementations = args.impl.split(',')
+        unknown = [name for name in implementations if name not in BENCHMARKS]
+        if unknown:
+            parser.error(f"unknown implementation(s): {', '.join(unknown)}")
+        rows = run_benchmarks(implementations, [int(size) for size in args.sizes.split(',')], args.seed,
+                              args.repeat, args.allocations)
+        if args.output:
+            save_results(args.output, rows, args.seed)
+            print(f"Saved {len(rows)} results to {args.output}")
+        if args.baseline and compare(rows, args.baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import glob
+import hashlib
+import os
+import re
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+
+from helmsnapshots import SNAPSHOT_FIELDS
+from helmstore import connect, list_releases
+from helmstream import read_helm_releases
+
+CACHE_DIR = os.environ.get('HELM_INVENTORY_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'helm-inventory')
+
+def env_ttl(default=300):
+    """Return $HELM_INVENTORY_TTL as whole seconds; `default` if it is unset, or (with a warning) invalid."""
+    value = os.environ.get('HELM_INVENTORY_TTL')
+    if value is None:
+        return default
+    try:
+        ttl = int(value)
+    except ValueError:
+        ttl = -1
+    if ttl < 0:
+        print(f"Warning: ignoring HELM_INVENTORY_TTL={value!r} (expected whole seconds); using {default}",
+              file=sys.stderr)
+        return default
+    return ttl
+
+DEFAULT_TTL = env_ttl()
+
+# Namespace scope meaning every namespace (helm list -A)
+ALL_NAMESPACES = '*'
+
+# magic, format version, created (epoch seconds), rows, context length, scope length
+_HEADER = struct.Struct('<4sBdIHH')
+_MAGIC = b'HINV'
+_VERSION = 1
+
+_CURRENT_CONTEXT = re.compile(r'^current-context:[ \t]*["\']?([^"\'\n]*?)["\']?[ \t]*$', re.MULTILINE)
+
+def current_context():
+    """Return the kubeconfig's current-context (read from the file, without forking kubectl), or 'default'."""
+    paths = os.environ.get('KUBECONFIG') or os.path.join(os.path.expanduser('~'), '.kube', 'config')
+    for path in paths.split(os.pathsep):
+        try:
+            with open(path) as f:
+                m = _CURRENT_CONTEXT.search(f.read())
+        except OSError:
+            continue
+        if m and m.group(1):
+            return m.group(1)
+    return 'default'
+
+def cache_path(context, scope, cache_dir=CACHE_DIR):
+    digest = hashlib.sha256(f"{context}\0{scope}".encode()).hexdigest()[:20]
+    return os.path.join(cache_dir, f"{digest}.inv")
+
+def encode_inventory(releases, context, scope, created):
+    """
+    Pack releases into the cache's binary format.
+
+    Every distinct field value is stored once in a string table, and each
+    release is seven 32-bit indices into it; the body is zlib-compressed. A
+    namespace, status or chart shared by thousands of releases costs four
+    bytes per release.
+    """
+    table = {}
+    indices = array('I')
+    for release in releases:
+        for field in SNAPSHOT_FIELDS:
+            value = release.get(field)
+            value = '' if value is None else str(value)
+            index = table.get(value)
+            if index is None:
+                index = table[value] = len(table)
+            indices.append(index)
+    if sys.byteorder == 'big':
+        indices.byteswap()
+    strings = '\0'.join(table).encode()
+    body = struct.pack('<II', len(table), len(strings)) + strings + indices.tobytes()
+    context, scope = context.encode(), scope.encode()
+    header = _HEADER.pack(_MAGIC, _VERSION, created, len(indices) // len(SNAPSHOT_FIELDS), len(context), len(scope))
+    return header + context + scope + zlib.compress(body, 1)
+
+def decode_inventory(data):
+    """Return (context, scope, created, releases) from `encode_inventory` output. Raises ValueError if unreadable."""
+    try:
+        magic, version, created, rows, context_length, scope_length = _HEADER.unpack_from(data)
+    except struct.error:
+        raise ValueError("Truncated inventory cache file") from None
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("Not an inventory cache file (or an unsupported version)")
+    offset = _HEADER.size
+    context = data[offset:offset + context_length].decode()
+    offset += context_length
+    scope = data[offset:offset + scope_length].decode()
+    try:
+        body = zlib.decompress(data[offset + scope_length:])
+    except zlib.error as e:
+        raise ValueError(f"Corrupt inventory cache file: {e}") from None
+    count, strings_length = struct.unpack_from('<II', body)
+    strings = body[8:8 + strings_length].decode().split('\0') if count else []
+    indices = array('I')
+    indices.frombytes(body[8 + strings_length:])
+    if sys.byteorder == 'big':
+        indices.byteswap()
+    width = len(SNAPSHOT_FIELDS)
+    if len(indices) != rows * width:
+        raise ValueError("Truncated inventory cache file")
+    values = [strings[index] for index in indices]
+    releases = [dict(zip(SNAPSHOT_FIELDS, values[i:i + width])) for i in range(0, len(values), width)]
+    return context, scope, created, releases
+
+def read_cache(context, scope, ttl=DEFAULT_TTL, cache_dir=CACHE_DIR):
+    """Return the cached releases for (context, scope) if younger than `ttl` seconds, else None."""
+    try:
+        with open(cache_path(context, scope, cache_dir), 'rb') as f:
+            cached_context, cached_scope, created, releases = decode_inventory(f.read())
+    except (OSError, ValueError):
+        return None
+    if (cached_context, cached_scope) != (context, scope) or time.time() - created > ttl:
+        return None
+    return releases
+
+def write_cache(releases, context, scope, cache_dir=CACHE_DIR):
+    """Store releases for (context, scope), atomically: readers see the old file or the new one, never half of one."""
+    os.makedirs(cache_dir, exist_ok=True)
+    data = encode_inventory(releases, context, scope, time.time())
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, cache_path(context, scope, cache_dir))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def invalidate(context, scope, cache_dir=CACHE_DIR):
+    """Drop the cached inventory for (context, scope), e.g. after uninstalling releases."""
+    try:
+        os.remove(cache_path(context, scope, cache_dir))
+    except FileNotFoundError:
+        pass
+
+def fetch_inventory(source, scope, context=None, api_server=None):
+    """
+    List releases from helm or the Kubernetes API, bypassing the cache.
+
+    helm lists releases in every status. The api source lists the releases
+    `helmstore.list_releases` does, with its `updated` semantics.
+    """
+    namespace = None if scope == ALL_NAMESPACES else scope
+    if source == 'api':
+        return list_releases(connect(api_server), namespace=namespace)
+    command = ['helm', 'list', '--all', '--output', 'json']
+    command += ['--all-namespaces'] if namespace is None else ['--namespace', namespace]
+    if context:
+        command += ['--kube-context', context]
+    return asyncio.run(read_helm_releases(command))
+
+def inventory_key(source='helm', namespace='default', context=None, api_server=None):
+    """
+    Return the (context, scope) cache key for a listing.
+
+    The api source lists slightly different releases and times than helm
+    does, so its listings are cached under 'api:<server>' rather than shared.
+    """
+    if source == 'api':
+        return f"api:{context or api_server or 'in-cluster'}", namespace or ALL_NAMESPACES
+    return context or current_context(), namespace or ALL_NAMESPACES
+
+def get_inventory(source='helm', namespace='default', context=None, api_server=None, ttl=DEFAULT_TTL,
+                  cache_dir=CACHE_DIR):
+    """
+    Return the releases in `namespace` (None for all), from the shared cache when it is fresh enough.
+
+    This is the one loader all the cleanup tools use, so running them back to
+    back lists the cluster once per `ttl` seconds. Releases are listed in
+    every status (as `helm list --all`; see `fetch_inventory` for the api
+    source), with SNAPSHOT_FIELDS only. A `ttl` of 0 always lists again,
+    and refreshes the cache for the next tool.
+    """
+    cache_context, scope = inventory_key(source, namespace, context, api_server)
+    releases = read_cache(cache_context, scope, ttl, cache_dir) if ttl > 0 else None
+    if releases is None:
+        releases = fetch_inventory(source, scope, context, api_server)
+        write_cache(releases, cache_context, scope, cache_dir)
+    return releases
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or clear the shared Helm inventory cache.")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help=f"cache directory (default: {CACHE_DIR})")
+    parser.add_argument('--clear', action='store_true', help="delete every cached inventory")
+    args = parser.parse_args()
+
+    for path in sorted(glob.glob(os.path.join(args.cache_dir, '*.inv'))):
+        if args.clear:
+            os.remove(path)
+            print(f"Removed {path}")
+            continue
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            context, scope, created, releases = decode_inventory(data)
+        except (OSError, ValueError) as e:
+            print(f"{path}: {e}")
+            continue
+        print(f"{context:<30} {scope:<20} {len(releases):>7} releases  {len(data):>9} bytes  "
+              f"{time.time() - created:>8.0f}s old")
+
+if __name__ == "__main__":
+    main()
@@ -1,116 +1,310 @@
-import json
+import argparse
 import time
-import subprocess
-from datetime import datetime
+
+import helmcolumns
+from helmcache import DEFAULT_TTL, get_inventory, invalidate, inventory_key
+from helmdates import parse_helm_time
+from helmgroups import GroupingEngine
+from helmjournal import UninstallJournal, remaining, replay
+from helmexec import UninstallExecutor, helm_uninstall, print_summary
+from helmmetrics import Metrics
+from helmrecords import make_record
+from helmretention import DEFAULT_POLICY, RETENTION_FILE, RetentionPolicies, RetentionSelector
+from helmstore import connect, list_releases
+from helmstream import stream_helm_releases
 
 def date_to_seconds(date_string):
     """
-    Given a date string in the format '%Y-%m-%d %H:%M:%S %Z', return the corresponding
-    timestamp in seconds since the epoch. If the input string is not in this format,
-    return 0.
+    Given a Helm timestamp such as '2024-09-02 11:37:22.717403877 +0000 UTC' or
+    '2023-08-31 09:05:09.329524 +0100 BST', return the corresponding timestamp in
+    seconds since the epoch, honouring the numeric UTC offset. If the input string
+    is not in this format, return 0.
     """
-    date_string = date_string.split('.')[0].replace(' UTC', '')
     try:
-        dt = datetime.strptime(date_string, '%Y-%m-%d %H:%M:%S')
-        return int(dt.timestamp())
+        return parse_helm_time(date_string)
     except ValueError:
         return 0
 
+# Releases up to this many whole days old are never removed as stale
+RETENTION_DAYS = 7
+
+# Shared with the other cleanup tools; 'helmclean' keeps this script's naming rule
+GROUPING = GroupingEngine('helmclean')
+
 def get_base_name(name):
     """
     Given a Helm release name, return its "base name" (i.e. the part before the
-    incrementing number). For example, if the release name is "myapp-123", the
-    base name is "myapp". If the release name does not end with a number, the
-    base name is the same as the release name.
+    unique suffix). Names with more than four dash-separated parts lose their
+    last part, so "vector-backend-cu-ajt3xw-db" has the base name
+    "vector-backend-cu-ajt3xw"; shorter names are their own base name.
+    """
+    return GROUPING.group(name)[1]
+
+def uninstall_releases(releases, execute=False, workers=8, namespace_limit=4, retries=2, batch_size=10,
+                       uninstall=helm_uninstall, on_results=None, missing_ok=False):
+    """
+    Uninstall a list of (name, namespace) Helm releases.
+
+    By default nothing is uninstalled; the decisions printed by the retention
+    passes are the only output. With `execute` set, the releases are handed to
+    an `UninstallExecutor`, which removes up to `batch_size` releases per
+    `helm uninstall` call, runs up to `workers` calls at once (at most
+    `namespace_limit` per namespace), retries failures with backoff, and prints
+    a summary table when done. `uninstall` runs one helm call; `on_results`
+    and `missing_ok` are passed to the executor. Returns the list of
+    `UninstallResult` (empty for a dry run).
     """
-    parts = name.split('-')
-    if len(parts) > 4:
-        parts = parts[:-1]
-    return '-'.join(parts)
+    if not releases:
+        return []
+    if not execute:
+        print(f"Dry run: {len(releases)} release(s) would be uninstalled. Pass --execute to uninstall them.")
+        return []
+    executor = UninstallExecutor(workers=workers, namespace_limit=namespace_limit, retries=retries,
+                                 batch_size=batch_size, uninstall=uninstall, on_results=on_results,
+                                 missing_ok=missing_ok)
+    results = executor.run(releases)
+    print_summary(results)
+    return results
 
-def uninstall_release(name, namespace):
+def get_helm_releases(source='helm', api_server=None, cache_ttl=None):
     """
-    Uninstall a Helm release.
+    Yield all Helm releases in the default namespace, one release dict at a time.
 
-    This function prints a message indicating that the release is being
-    uninstalled, and then runs the `helm uninstall` command with the
-    appropriate arguments. By default, the command is not actually run,
-    since the line is commented out. To actually uninstall the release,
-    uncomment the line.
+    With the default `helm` source, this function runs the command
+    `helm list --namespace default --all --output json` and decodes the release
+    objects incrementally from the subprocess pipe, so the full listing is never
+    buffered in memory. With the `api` source, the newest revision of each
+    release is read straight from its release Secret's labels via the
+    Kubernetes API (`api_server`, or the in-cluster service account); see
+    `helmstore.list_releases` for how that listing differs from helm's.
+    With `cache_ttl` set, the listing comes from the inventory cache shared
+    with the other cleanup tools when it is at most that many seconds old;
+    it is then read whole before the first release is returned, as it is
+    with the `api` source.
     """
-    #print(f"Uninstalling release {name} in namespace {namespace}")
-    ## Uncomment the following line to actually uninstall
-    #subprocess.run(['helm', 'uninstall', name, '-n', namespace], check=True)
+    if cache_ttl is not None:
+        return iter(get_inventory(source, 'default', api_server=api_server, ttl=cache_ttl))
+    if source == 'api':
+        return iter(list_releases(connect(api_server), namespace='default'))
+    return stream_helm_releases(['helm', 'list', '--namespace', 'default', '--all', '--output', 'json'])
 
-def get_helm_releases():
+def parse_args():
+    parser = argparse.ArgumentParser(description="Uninstall stale Helm releases, keeping the latest of each group.")
+    parser.add_argument('--source', choices=['helm', 'api'], default='helm', help="where to read the release inventory from")
+    parser.add_argument('--api-server', help="API server URL for --source api (default: in-cluster)")
+    parser.add_argument('--cache-ttl', type=int, default=DEFAULT_TTL,
+                        help=f"on a dry run, reuse a cached inventory up to this many seconds old "
+                             f"(default: {DEFAULT_TTL}); --execute always lists releases again")
+    parser.add_argument('--no-cache', action='store_true', help="always list releases, without the shared cache")
+    parser.add_argument('--retention', default=RETENTION_FILE,
+                        help="per-namespace retention policies (default: helmretention.conf next to this script)")
+    parser.add_argument('--execute', action='store_true', help="actually run helm uninstall (default: dry run)")
+    parser.add_argument('--journal', default='helmclean.journal',
+                        help="record the plan and each uninstall outcome here when executing (default: helmclean.journal)")
+    parser.add_argument('--resume', action='store_true',
+                        help="finish the run recorded in --journal instead of listing releases again")
+    parser.add_argument('--workers', type=int, default=8, help="maximum concurrent uninstalls")
+    parser.add_argument('--namespace-limit', type=int, default=4, help="maximum concurrent uninstalls per namespace")
+    parser.add_argument('--retries', type=int, default=2, help="retries per failed uninstall")
+    parser.add_argument('--batch-size', type=int, default=10, help="releases per helm uninstall call")
+    parser.add_argument('--metrics-file', help="write run metrics here (node-exporter textfile collector format)")
+    parser.add_argument('--openmetrics', action='store_true', help="write --metrics-file in OpenMetrics format")
+    parser.add_argument('--pushgateway', help="push run metrics to this Pushgateway URL")
+    parser.add_argument('--job', default='helmclean', help="Pushgateway job name (default: helmclean)")
+    parser.add_argument('--engine', choices=['python', 'numpy'], default='python',
+                        help="evaluate releases one at a time, or all at once as NumPy columns (default: python)")
+    args = parser.parse_args()
+    if args.engine == 'numpy' and helmcolumns.np is None:
+        parser.error("--engine numpy needs NumPy installed")
+    return args
+
+def load_records(releases, base_name_of=get_base_name):
+    """
+    Build release records and per-group statistics in a single pass.
+
+    Each release's `updated` string is parsed once into the record's `epoch`.
+    Returns the list of records plus two dicts keyed by group key: the number
+    of releases in the group and the newest `epoch` seen in it. Releases whose
+    date cannot be parsed are reported and left out.
+
+    Streaming only spares the raw `helm list` output: a group's decisions
+    need its size and newest time, known only once every release has been
+    read, so one record per release is still held here, and every name stays
+    in the GROUPING trie. Memory grows with the number of releases, if much
+    more slowly than with the whole JSON document.
     """
-    Return a list of all Helm releases in the default namespace, as a JSON blob.
+    records = []
+    release_counts = {}
+    latest_times = {}
+    for release in releases:
+        record = make_record(release, base_name_of, date_to_seconds)
+        if record.epoch == 0:
+            print(f"Warning: Could not parse date for release {record.name}. Skipping.")
+            continue
+        records.append(record)
+        key = record.key
+        release_counts[key] = release_counts.get(key, 0) + 1
+        if record.epoch > latest_times.get(key, 0):
+            latest_times[key] = record.epoch
+    return records, release_counts, latest_times
 
-    This function runs the command `helm list --namespace default --all --output json` and
-    returns the result as a JSON object.
+def retained_records(records, policies, current_time):
     """
-    result = subprocess.run(['helm', 'list', '--namespace', 'default', '--all', '--output', 'json'], 
-                            capture_output=True, text=True, check=True)
-    return json.loads(result.stdout)
-
-current_time = int(time.time())
-
-releases = get_helm_releases()
-
-oldest_releases = {}
-release_counts = {}
-
-# First pass: identify the latest release for each base name and namespace and count releases
-for release in releases:
-    name = release['name']
-    namespace = release['namespace']
-    updated = release['updated']
-    base_name = get_base_name(name)
-    key = f"{base_name}__{namespace}"
-    current_oldest = oldest_releases.get(key)
-    release_time = date_to_seconds(updated)
-    if release_time == 0:
-        print(f"Warning: Could not parse date for release {name}. Skipping.")
-        continue
-    if current_oldest is None or release_time > date_to_seconds(current_oldest['updated']):
-        oldest_releases[key] = release
-    release_counts[key] = release_counts.get(key, 0) + 1
-
-# Second pass: process and delete releases
-for release in releases:
-    name = release['name']
-    namespace = release['namespace']
-    release_status = release['status']
-    updated = release['updated']
-    base_name = get_base_name(name)
-    release_time = date_to_seconds(updated)
-    if release_time == 0:
-        print(f"Warning: Could not parse date for release {name}. Skipping.")
-        continue
-    age_days = (current_time - release_time) // 86400
-
-    key = f"{base_name}__{namespace}"
-
-    if release_counts[key] == 1:
-        print(f"Retaining sole instance of {name} (base: {base_name}) in namespace {namespace}")
-        continue
-
-    if release_status == 'failed':
-        print(f"Found failed release {name} in namespace {namespace}")
-        uninstall_release(name, namespace)
-        continue
-
-    if age_days <= 7:
-        print(f"Retaining release {name} (base: {base_name}) in namespace {namespace} (age: {age_days} days)")
-        continue
-
-    oldest_release = oldest_releases.get(key)
-    if oldest_release and release_time == date_to_seconds(oldest_release['updated']):
-        print(f"Retaining latest release {name} (base: {base_name}) in namespace {namespace}")
-        continue
-
-    print(f"Uninstalling release {name} (base: {base_name}) in namespace {namespace} (age: {age_days} days)")
-    uninstall_release(name, namespace)
+    Apply per-namespace retention policies to every group at once.
+
+    Returns a dict mapping each record a policy keeps to its reason
+    ('latest', 'young' or 'revision'), for `decide`. Releases updated at the
+    same time as the Nth newest of their group are all kept, as they always
+    were with keep=1.
+    """
+    selector = RetentionSelector(policies, current_time, keep_ties=True)
+    for record in records:
+        selector.add(record.key, record.namespace, record.epoch, record.revision, record)
+    return {record: reason for key in selector.groups
+            for record, reason in selector.decisions(key) if reason}
+
+def decide(record, release_counts, latest_times, current_time, retained=None):
+    """
+    Return (action, reason, age_days) for one release record.
+
+    `action` is 'retain' or 'uninstall'; `reason` is one of 'sole', 'failed',
+    'young', 'latest', 'revision' or 'stale'. Without `retained` (from
+    `retained_records`), the releases updated at the newest time of each
+    group are kept past RETENTION_DAYS, as helmwatch does. Only dict lookups and integer arithmetic are done here,
+    since everything was parsed when the record was built.
+    """
+    age_days = (current_time - record.epoch) // 86400
+    if release_counts[record.key] == 1:
+        return 'retain', 'sole', age_days
+    if record.status == 'failed':
+        return 'uninstall', 'failed', age_days
+    if age_days <= RETENTION_DAYS:
+        return 'retain', 'young', age_days
+    if retained is not None:
+        reason = retained.get(record)
+        if reason:
+            return 'retain', reason, age_days
+    elif record.epoch == latest_times[record.key]:
+        return 'retain', 'latest', age_days
+    return 'uninstall', 'stale', age_days
+
+def main():
+    args = parse_args()
+    metrics = Metrics('helmclean')
+    try:
+        run(args, metrics)
+        metrics.set('run_success', "1 if the last run completed.", 1)
+    except BaseException:
+        metrics.set('run_success', "1 if the last run completed.", 0)
+        raise
+    finally:
+        metrics.set('last_run_timestamp_seconds', "When the last run finished.", int(time.time()))
+        if args.metrics_file:
+            metrics.write_textfile(args.metrics_file, args.openmetrics)
+        if args.pushgateway:
+            metrics.push(args.pushgateway, args.job)
+
+def resume_releases(path):
+    """Return the releases the run journaled in `path` has yet to uninstall, after saying how far it got."""
+    try:
+        state = replay(path)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Cannot resume: {e}")
+    left = remaining(state)
+    started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(state.created))
+    print(f"Resuming run started {started}: {len(state.done)} of {len(state.releases)} release(s) uninstalled, "
+          f"{len(left)} left ({len(state.failed)} failed before)")
+    return left
+
+def select_releases(args, metrics):
+    """List, group and judge every release, printing each decision; return the (name, namespace) pairs to uninstall."""
+    current_time = int(time.time())
+    to_uninstall = []
+    # Declare every counter up front, so a reason with no releases exports 0
+    # instead of a missing series.
+    for reason in ('sole', 'young', 'latest', 'revision'):
+        metrics.inc('releases_retained', "Releases kept, by reason (sole, young, latest, revision).", 0, reason=reason)
+    metrics.inc('releases_failed', "Failed releases found.", 0)
+    metrics.inc('releases_stale', "Releases selected for uninstall because a newer one in the group exists.", 0)
+
+    # Listing, parsing and grouping are interleaved as releases stream in;
+    # their times are measured separately and 'parse' is what is left over.
+    base_name_of, grouping_seconds = metrics.timed_calls(get_base_name)
+    start = time.perf_counter()
+    # Never uninstall from a cached listing; an executing run streams a fresh one
+    cache_ttl = None if args.no_cache or args.execute else args.cache_ttl
+    # The cache and the api source list everything up front, helm streams as it goes
+    with metrics.span('list'):
+        listing = get_helm_releases(args.source, args.api_server, cache_ttl)
+    releases = metrics.timed_iter('list', listing, 'releases_seen', "Releases listed.")
+    records, release_counts, latest_times = load_records(releases, base_name_of)
+    loaded = time.perf_counter() - start
+    metrics.add_seconds('group', grouping_seconds())
+    metrics.add_seconds('parse', loaded - grouping_seconds() - metrics.seconds('list'))
+
+    with metrics.span('decide'):
+        policies = RetentionPolicies.load(args.retention)
+        if args.engine == 'numpy':
+            if policies.uniform() != DEFAULT_POLICY:
+                raise SystemExit("--engine numpy only supports the default retention policy (keep=1)")
+            decisions = zip(records, helmcolumns.decisions(records, current_time, RETENTION_DAYS))
+        else:
+            retained = retained_records(records, policies, current_time)
+            decisions = ((record, decide(record, release_counts, latest_times, current_time, retained))
+                         for record in records)
+        for record, (action, reason, age_days) in decisions:
+            name, namespace, base_name = record.name, record.namespace, record.base_name
+            if reason == 'sole':
+                print(f"Retaining sole instance of {name} (base: {base_name}) in namespace {namespace}")
+            elif reason == 'failed':
+                print(f"Found failed release {name} in namespace {namespace}")
+            elif reason == 'young':
+                print(f"Retaining release {name} (base: {base_name}) in namespace {namespace} (age: {age_days} days)")
+            elif reason == 'latest':
+                print(f"Retaining latest release {name} (base: {base_name}) in namespace {namespace}")
+            elif reason == 'revision':
+                print(f"Retaining highest revision {name} (base: {base_name}) in namespace {namespace}")
+            else:
+                print(f"Uninstalling release {name} (base: {base_name}) in namespace {namespace} (age: {age_days} days)")
+            if action == 'uninstall':
+                to_uninstall.append((name, namespace))
+            if action == 'retain':
+                metrics.inc('releases_retained', "Releases kept, by reason (sole, young, latest, revision).", reason=reason)
+            elif reason == 'failed':
+                metrics.inc('releases_failed', "Failed releases found.")
+            else:
+                metrics.inc('releases_stale', "Releases selected for uninstall because a newer one in the group exists.")
+    return to_uninstall
+
+def run(args, metrics):
+    # A resumed run takes its releases from the journal, without listing again
+    to_uninstall = resume_releases(args.journal) if args.resume else select_releases(args, metrics)
+    journal = None
+    if args.execute and to_uninstall:
+        journal = UninstallJournal(args.journal)
+        if not args.resume:
+            journal.plan(to_uninstall)
+    try:
+        with metrics.span('uninstall'):
+            results = uninstall_releases(
+                to_uninstall, execute=args.execute, workers=args.workers, namespace_limit=args.namespace_limit,
+                retries=args.retries, batch_size=args.batch_size,
+                uninstall=metrics.observed('uninstall_call_duration_seconds',
+                                           "Duration of helm uninstall calls, by outcome.", helm_uninstall),
+                on_results=journal and journal.record, missing_ok=args.resume)
+    finally:
+        if journal:
+            journal.close()
+    if results:
+        # The cached inventory no longer matches the cluster
+        invalidate(*inventory_key(args.source, 'default', api_server=args.api_server))
+    metrics.inc('releases_uninstalled', "Releases uninstalled.", sum(result.ok for result in results))
+    metrics.inc('uninstall_failures', "Releases that could not be uninstalled.",
+                sum(not result.ok for result in results))
+    metrics.set('dry_run', "1 if the last run only reported what it would uninstall.", int(not args.execute))
+
+if __name__ == "__main__":
+    main()
 
 # Uncomment the following lines if you want to generate a CSV output
 # import csv
@@ -0,0 +1,78 @@
+try:
+    import numpy as np
+except ImportError:  # optional; only the columnar engine needs it
+    np = None
+
+# Status codes for the status column; anything else is 'unknown'
+STATUSES = ('deployed', 'failed', 'pending-install', 'pending-upgrade', 'pending-rollback', 'uninstalling',
+            'superseded', 'uninstalled', 'unknown')
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+FAILED = STATUS_CODES['failed']
+
+# Reason codes, in the order helmclean.decide checks them
+REASONS = ('sole', 'failed', 'young', 'latest', 'stale')
+UNINSTALL_REASONS = ('failed', 'stale')
+
+def require_numpy():
+    if np is None:
+        raise RuntimeError("The columnar engine needs NumPy (pip install numpy)")
+
+class ColumnarInventory:
+    """
+    Release records as parallel NumPy columns.
+
+    `epoch` holds int64 seconds, `group` and `namespace` int32 ids into the
+    interned `groups` and `namespaces` lists, and `status` int8 codes into
+    STATUSES. Row i is `records[i]`, so results map back to records by
+    position.
+    """
+
+    def __init__(self, records):
+        require_numpy()
+        self.records = records
+        count = len(records)
+        group_ids = {}
+        namespace_ids = {}
+        self.epoch = np.fromiter((record.epoch for record in records), np.int64, count)
+        self.group = np.fromiter((group_ids.setdefault(record.key, len(group_ids)) for record in records),
+                                 np.int32, count)
+        self.namespace = np.fromiter((namespace_ids.setdefault(record.namespace, len(namespace_ids))
+                                      for record in records), np.int32, count)
+        unknown = STATUS_CODES['unknown']
+        self.status = np.fromiter((STATUS_CODES.get(record.status, unknown) for record in records), np.int8, count)
+        self.groups = list(group_ids)
+        self.namespaces = list(namespace_ids)
+
+    def __len__(self):
+        return len(self.records)
+
+def evaluate(inventory, current_time, retention_days):
+    """
+    Return (reason codes, age in days) for every release, as arrays.
+
+    Gives the same answer as `helmclean.decide` under the default
+    retention policy (keep=1), for all releases at once: group sizes come
+    from one bincount, the newest time of each group from one grouped
+    maximum, and every check is a mask over the whole inventory. Every
+    release tied at a group's newest time is the latest, as in `decide`.
+    """
+    groups = len(inventory.groups)
+    counts = np.bincount(inventory.group, minlength=groups)
+    latest = np.full(groups, np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(latest, inventory.group, inventory.epoch)
+
+    age_days = (current_time - inventory.epoch) // 86400
+    checks = [
+        counts[inventory.group] == 1,
+        inventory.status == FAILED,
+        age_days <= retention_days,
+        inventory.epoch == latest[inventory.group],
+    ]
+    reasons = np.select(checks, range(len(checks)), default=REASONS.index('stale')).astype(np.int8)
+    return reasons, age_days
+
+def decisions(records, current_time, retention_days):
+    """Return (action, reason, age_days) for each record, in order, like `decide` under the default policy."""
+    reasons, age_days = evaluate(ColumnarInventory(records), current_time, retention_days)
+    actions = ['uninstall' if reason in UNINSTALL_REASONS else 'retain' for reason in REASONS]
+    return [(actions[code], REASONS[code], age) for code, age in zip(reasons.tolist(), age_days.tolist())]
@@ -1,95 +1,249 @@
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+import argparse
+import calendar
+import csv
+import fileinput
+import io
+import json
+import os
 import re
+import sys
 from datetime import datetime, date, timedelta
 
+# Shared helpers live in helm_cleanup_project/, two levels up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from helmcache import DEFAULT_TTL, get_inventory
+from helmgroups import GroupingEngine
+from helmretention import RETENTION_FILE, RetentionPolicies, RetentionSelector
+from helmsnapshots import write_snapshot_csv
+
+# Main group: first two parts. Sub-group: everything up to the last part
+# (which is often a unique identifier).
+GROUPING = GroupingEngine('delhelm')
+
+DATE_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})')
+
 def parse_line(line):
     parts = line.strip().split(',')
     if len(parts) >= 4:
         full_name = parts[0].strip('"')
+        namespace = parts[1].strip('"') or 'default'
+        revision = parts[2].strip('"')
         date_string = parts[3].strip('"')
-        match = re.search(r'(\d{4}-\d{2}-\d{2})', date_string)
+        match = DATE_PATTERN.search(date_string)
         if match:
             release_date = match.group(1)
-            return full_name, release_date
-    return None, None
+            return full_name, namespace, release_date, int(revision) if revision.isdigit() else 0
+    return None, None, None, 0
 
 def get_group_names(full_name):
-    parts = full_name.split('-')
-    if len(parts) <= 2:
-        return full_name, full_name
-    
-    # Main group is always the first two parts
-    main_group = '-'.join(parts[:2])
-    
-    # Sub-group is everything up to the last part (which is often a unique identifier)
-    sub_group = '-'.join(parts[:-1])
-    
-    return main_group, sub_group
-
-def calculate_age(release_date):
+    return GROUPING.group(full_name)
+
+def calculate_age(release_date, today=None):
     release_date = datetime.strptime(release_date, "%Y-%m-%d").date()
-    current_date = date.today()
+    current_date = today or date.today()
     age_days = (current_date - release_date).days
     age_hours = age_days * 24
     return age_days, age_hours
 
-def process_data(data):
-    grouped_deployments = defaultdict(lambda: defaultdict(list))
-    group_dates = defaultdict(lambda: defaultdict(list))
+class AgeTable(dict):
+    """
+    Memoized release date -> (age_days, age_hours), relative to one day.
+
+    Releases share a few hundred distinct dates at most, so each date string
+    is parsed once per run, and every line of a run is aged against the same
+    day even if the run crosses midnight.
+    """
+
+    def __init__(self, today=None):
+        super().__init__()
+        self.today = today or date.today()
+
+    def __missing__(self, release_date):
+        age = self[release_date] = calculate_age(release_date, self.today)
+        return age
+
+def read_lines(paths):
+    """Yield the lines of each file in `paths` in turn ('-' is stdin), one at a time."""
+    with fileinput.input(paths) as lines:
+        yield from lines
+
+# Totals over the reported groups: main groups with more than one sub-group,
+# their sub-groups, and the deployments in them other than each sub-group's latest.
+ReportTotals = namedtuple('ReportTotals', 'main_groups sub_groups deployments')
+
+class TextReport:
+    """
+    Write the report as it is printed on a terminal, one main group at a time (to stdout by default).
+
+    The other formats override the same hooks: `sub_group` starts a
+    sub-group, `release` writes one stale deployment in it, and
+    `end_sub_group`/`end_main_group` close them. `finish` is called once at
+    the end with the totals, which are written only if `totals` is set.
+    """
+
+    def __init__(self, out=None, totals=False):
+        self.out = out or sys.stdout
+        self.totals = totals
+
+    def sub_group(self, main_group, sub_group):
+        self.out.write(f" {sub_group}\n")
+
+    def release(self, main_group, sub_group, name, age_days, release_date):
+        self.out.write(f"  {name} (Age: {age_days} days)\n")
+
+    def end_sub_group(self):
+        self.out.write("\n")
+
+    def end_main_group(self):
+        self.out.write("\n")
+
+    def finish(self, totals):
+        if self.totals:
+            self.out.write(f"\nTotal number of main groups (with multiple sub-groups): {totals.main_groups}\n"
+                           f"Total number of sub-groups: {totals.sub_groups}\n"
+                           f"Total number of deployments (older than 7 days, excluding latest): {totals.deployments}\n")
+
+class MarkdownReport(TextReport):
+    """A heading per main group, a subheading per sub-group and a bullet per deployment."""
+
+    def __init__(self, out=None, totals=False):
+        super().__init__(out, totals)
+        self.main_group = None
+
+    def sub_group(self, main_group, sub_group):
+        if main_group != self.main_group:
+            self.main_group = main_group
+            self.out.write(f"## {main_group}\n\n")
+        self.out.write(f"### {sub_group}\n\n")
+
+    def release(self, main_group, sub_group, name, age_days, release_date):
+        self.out.write(f"- `{name}` ({age_days} days, {release_date})\n")
+
+    def end_main_group(self):
+        self.main_group = None
+
+    def finish(self, totals):
+        if self.totals:
+            self.out.write("| Total | Count |\n|---|---:|\n"
+                           f"| Main groups | {totals.main_groups} |\n"
+                           f"| Sub-groups | {totals.sub_groups} |\n"
+                           f"| Deployments | {totals.deployments} |\n")
 
-    for line in data.strip().split('\n'):
-        full_name, release_date = parse_line(line)
+class _RowReport(TextReport):
+    """Base for the formats with one record per deployment and no group headings."""
+
+    def sub_group(self, main_group, sub_group):
+        pass
+
+    def end_sub_group(self):
+        pass
+
+    def end_main_group(self):
+        pass
+
+class CSVReport(_RowReport):
+    """One row per deployment. The totals, which do not fit the columns, go to stderr."""
+
+    FIELDS = ['main_group', 'sub_group', 'release', 'age_days', 'release_date']
+
+    def __init__(self, out=None, totals=False):
+        super().__init__(out, totals)
+        self.writer = csv.writer(self.out, lineterminator='\n')
+        self.writer.writerow(self.FIELDS)
+
+    def release(self, main_group, sub_group, name, age_days, release_date):
+        self.writer.writerow([main_group, sub_group, name, age_days, release_date])
+
+    def finish(self, totals):
+        if self.totals:
+            TextReport(sys.stderr, True).finish(totals)
+
+class JSONLinesReport(_RowReport):
+    """One JSON object per deployment, then one with the totals."""
+
+    def release(self, main_group, sub_group, name, age_days, release_date):
+        self.out.write(json.dumps({'main_group': main_group, 'sub_group': sub_group, 'release': name,
+                                   'age_days': age_days, 'release_date': release_date}) + "\n")
+
+    def finish(self, totals):
+        if self.totals:
+            self.out.write(json.dumps({'totals': totals._asdict()}) + "\n")
+
+REPORT_FORMATS = {
+    'text': TextReport,
+    'markdown': MarkdownReport,
+    'csv': CSVReport,
+    'jsonl': JSONLinesReport,
+}
+
+def process_data(data, today=None, report=None, policies=None):
+    """
+    Report the stale releases of each group in a helm list CSV, and return the ReportTotals.
+
+    `data` is any iterable of CSV lines (an open file, `read_lines`, ...),
+    or the whole CSV as one string. Lines are consumed as they are read.
+    Releases are grouped per namespace, and which releases of a sub-group
+    are kept is up to that namespace's retention policy (by default, the
+    newest one). Groups outside the default namespace are reported as
+    `namespace/group`. Each main group is written to `report` (a
+    TextReport on stdout by default) as soon as it is sorted, and the
+    totals are counted in the same pass.
+    """
+    if isinstance(data, str):
+        data = io.StringIO(data)
+    if report is None:
+        report = TextReport()
+    ages = AgeTable(today)
+    now = calendar.timegm(ages.today.timetuple())
+    selector = RetentionSelector(policies or RetentionPolicies(), now)
+    grouped_deployments = defaultdict(dict)
+
+    for line in data:
+        full_name, namespace, release_date, revision = parse_line(line)
         if full_name and release_date:
-            age_days, age_hours = calculate_age(release_date)
+            age_days, age_hours = ages[release_date]
             if age_days > 7:  # Only process deployments older than 7 days
                 main_group, sub_group = get_group_names(full_name)
-                grouped_deployments[main_group][sub_group].append((full_name, (age_days, age_hours), release_date))
-                group_dates[main_group][sub_group].append(release_date)
+                group = (namespace, main_group, sub_group)
+                grouped_deployments[namespace, main_group][sub_group] = group
+                selector.add(group, namespace, now - age_days * 86400, revision,
+                             (full_name, (age_days, age_hours), release_date))
 
-    # Remove main groups with only one sub-group
-    grouped_deployments = {main: sub for main, sub in grouped_deployments.items() if len(sub) > 1}
-    group_dates = {main: sub for main, sub in group_dates.items() if len(sub) > 1}
-
-    #print("Grouped Deployments (older than 7 days, with multiple sub-groups, excluding latest):")
-    for main_group, sub_groups in grouped_deployments.items():
+    main_groups = sub_group_count = deployment_count = 0
+    for (namespace, main_group), sub_groups in grouped_deployments.items():
+        prefix = '' if namespace == 'default' else f"{namespace}/"
+        # Main groups with only one sub-group are left out
+        if len(sub_groups) < 2:
+            continue
+        main_groups += 1
+        sub_group_count += len(sub_groups)
         non_empty_sub_groups = False
-        main_group_output = f"\n{main_group}\n"
-        sub_group_output = ""
-
-        for sub_group, deployments in sub_groups.items():
-            sorted_deployments = sorted(deployments, key=lambda x: x[2], reverse=True)
-            
-            # Start from the second deployment if there's more than one
-            start_index = 1 if len(sorted_deployments) > 1 else 0
-            
-            if len(sorted_deployments[start_index:]) > 0:
+
+        for sub_group, group in sub_groups.items():
+            # A sub-group's only deployment is listed as it is; otherwise
+            # the policy decides what stays
+            if selector.count(group) > 1:
+                removable = selector.removable(group)
+                deployment_count += len(removable)
+            else:
+                removable = [item for item, _ in selector.decisions(group)]
+
+            if removable:
                 non_empty_sub_groups = True
-                sub_group_output += f" {sub_group}\n"
-                
-                for deployment, (age_days, age_hours), _ in sorted_deployments[start_index:]:
+                report.sub_group(prefix + main_group, prefix + sub_group)
+                removable.sort(key=lambda x: x[2], reverse=True)
+                for deployment, (age_days, age_hours), release_date in removable:
                     if deployment != sub_group:
-                        sub_group_output += f"  {deployment} (Age: {age_days} days)\n"
-                sub_group_output += "\n"
+                        report.release(prefix + main_group, prefix + sub_group, deployment, age_days, release_date)
+                report.end_sub_group()
 
         if non_empty_sub_groups:
-#            print(main_group_output + sub_group_output)
-            print( sub_group_output)
+            report.end_main_group()
 
-    total_main_groups = sum(1 for sub_groups in grouped_deployments.values() if any(len(deployments) > 1 for deployments in sub_groups.values()))
-    total_sub_groups = sum(sum(1 for deployments in sub_groups.values() if len(deployments) > 1) for sub_groups in grouped_deployments.values())
-    total_deployments = sum(sum(max(0, len(deployments) - 1) for deployments in sub_groups.values()) for sub_groups in grouped_deployments.values())
-
-    #print(f"\nTotal number of main groups (with multiple non-empty sub-groups): {total_main_groups}")
-    #print(f"Total number of non-empty sub-groups: {total_sub_groups}")
-    #print(f"Total number of deployments (older than 7 days, excluding latest): {total_deployments}")
-
-    total_main_groups = len(grouped_deployments)
-    total_sub_groups = sum(len(sub_groups) for sub_groups in grouped_deployments.values())
-    total_deployments = sum(sum(len(deployments) - 1 for deployments in sub_groups.values()) for sub_groups in grouped_deployments.values())
-
-    #print(f"\nTotal number of main groups (with multiple sub-groups): {total_main_groups}")
-    #print(f"Total number of sub-groups: {total_sub_groups}")
-    #print(f"Total number of deployments (older than 7 days, excluding latest): {total_deployments}")
+    totals = ReportTotals(main_groups, sub_group_count, deployment_count)
+    report.finish(totals)
+    return totals
 
 # Sample data
 sample_data = '''
@@ -330,7 +484,31 @@ sample_data = '''
 '''
 
 if __name__ == "__main__":
-    process_data(sample_data)
+    parser = argparse.ArgumentParser(description="Report stale Helm releases grouped by name.")
+    parser.add_argument('files', nargs='*',
+                        help="helm list CSV files to report on ('-' for stdin; default: the sample data)")
+    parser.add_argument('--cluster', action='store_true',
+                        help="report on the cluster's releases (all namespaces) instead of the sample data")
+    parser.add_argument('--cache-ttl', type=int, default=DEFAULT_TTL,
+                        help=f"with --cluster, reuse a cached inventory up to this many seconds old (default: {DEFAULT_TTL})")
+    parser.add_argument('--retention', default=RETENTION_FILE,
+                        help="per-namespace retention policies (default: helmretention.conf)")
+    parser.add_argument('--format', choices=sorted(REPORT_FORMATS), default='text', help="report format (default: text)")
+    parser.add_argument('--totals', action='store_true', help="finish the report with group and deployment totals")
+    args = parser.parse_args()
+
+    report = REPORT_FORMATS[args.format](sys.stdout, args.totals)
+    policies = RetentionPolicies.load(args.retention)
+
+    if args.cluster:
+        buffer = io.StringIO()
+        write_snapshot_csv(get_inventory('helm', None, ttl=args.cache_ttl), buffer)
+        buffer.seek(0)
+        process_data(buffer, report=report, policies=policies)
+    elif args.files:
+        process_data(read_lines(args.files), report=report, policies=policies)
+    else:
+        process_data(sample_data, report=report, policies=policies)
 
 
 
@@ -1,8 +1,37 @@
+import argparse
 import csv
+import hashlib
+import os
 import sys
 import subprocess
 from collections import defaultdict
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+
+# Shared helpers live in helm_cleanup_project/, two levels up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from helmcache import DEFAULT_TTL, get_inventory
+from helmexec import uninstall_commands
+from helmgroups import GroupingEngine
+from helmplan import PlanEntry, write_plan
+from helmretention import RETENTION_FILE, RetentionPolicies, RetentionSelector
+from helmrules import RuleSet
+from helmsnapshots import (diff_snapshots, load_state, previous_snapshot, read_snapshot, save_state,
+                           snapshot_key, state_path, write_snapshot_csv)
+
+# Main group: first two parts of the name. Sub group: first three parts.
+GROUPING = GroupingEngine('newdel')
+
+# Releases per printed uninstall command
+BATCH_SIZE = 10
+
+# Releases must be older than this many days to be cleaned up
+AGE_THRESHOLD = 8
+
+# Statuses plain `helm list` shows without --all
+HELM_LIST_STATUSES = ('deployed', 'failed')
+
+# Protect/exclude rules, compiled once
+RULES_FILE = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'helmrules.conf'))
 
 # Get the current date in YYYYMMDD format
 current_date = datetime.now().strftime("%Y%m%d")
@@ -10,60 +39,185 @@ current_date = datetime.now().strftime("%Y%m%d")
 # Construct the filename
 filename = f"helmoutput{current_date}.csv"
 
-# Construct the command
-command = """
-helm list -n default -o json | jq -r '(["name","namespace","revision","updated","status","chart","app_version"] | @csv), (.[] | [.name, .namespace, .revision, .updated, .status, .chart, .app_version] | @csv)'
-"""
-
-# Run the command and capture the output
-result = subprocess.run(command, shell=True, capture_output=True, text=True)
+def write_snapshot(filename, cache_ttl=DEFAULT_TTL):
+    """
+    Write today's `helm list` inventory to `filename` as CSV.
 
-# Check if the command was successful
-if result.returncode == 0:
-    # Write the output to the file
-    with open(filename, 'w') as f:
-        f.write(result.stdout)
+    The listing comes from the inventory cache shared with the other cleanup
+    tools when it is at most `cache_ttl` seconds old. The cache holds every
+    status; only deployed and failed releases are kept, as plain `helm list`
+    shows (pending, uninstalling and uninstalled releases need --all).
+    """
+    try:
+        releases = [release for release in get_inventory('helm', 'default', ttl=cache_ttl)
+                    if release['status'] in HELM_LIST_STATUSES]
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+        print("Error running the command:")
+        print(getattr(e, 'stderr', None) or e)
+        return
+    with open(filename, 'w', newline='') as f:
+        write_snapshot_csv(releases, f)
     print(f"CSV file created: {filename}")
-else:
-    print("Error running the command:")
-    print(result.stderr)
 
-def group_deployments(file_path):
-    deployments = defaultdict(lambda: defaultdict(list))
-    current_time = datetime.now(timezone.utc)
-    failed_deployments = []
-    
+def read_rows(file_path):
     with open(file_path, 'r') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            name = row['name']
-            name_parts = name.split('-')
-            
-            if len(name_parts) >= 3:
-                main_group = '-'.join(name_parts[:2])
-                sub_group = '-'.join(name_parts[:3])
-            else:
-                main_group = sub_group = name
-            
-            updated_time = datetime.strptime(row['updated'].split()[0], '%Y-%m-%d').replace(tzinfo=timezone.utc)
-            age = (current_time - updated_time).days
-            
-            if row['status'] == 'failed':
-                failed_deployments.append((name, row['namespace']))
-            elif age > 8 and sub_group != main_group and sub_group != "vector-email-processing" and main_group != "vector-address" and main_group != "raft-ship":
-                deployments[main_group][sub_group].append((row['name'], row['namespace'], row['status'], age))
-    
-    # Sort deployments by age and remove the latest from each subgroup
-    for main_group in deployments:
-        for sub_group in deployments[main_group]:
-            deployments[main_group][sub_group].sort(key=lambda x: x[3], reverse=True)
-            if deployments[main_group][sub_group]:
-                deployments[main_group][sub_group] = deployments[main_group][sub_group][1:]
-    
-    # Remove empty groups and subgroups
-    return {k: {sk: sv for sk, sv in v.items() if sv} for k, v in deployments.items() if len(v) > 1 and any(sv for sv in v.values())}, failed_deployments
+        return list(csv.DictReader(csvfile))
+
+def evaluate_rows(rows, rules, current_time, policies=None):
+    """
+    Evaluate releases and return the decisions for each main group.
+
+    The result maps main group to a dict with 'subs' (sub group -> releases
+    to uninstall, as (name, namespace, status, age, updated_day) tuples),
+    'failed' ((name, namespace) pairs) and 'recheck', the first day on which
+    a release in the group that is still too young will cross AGE_THRESHOLD
+    (or None). Which stale releases of a sub group are kept is up to the
+    namespace's retention policy (by default, the newest one), applied to
+    each namespace's releases of the sub group separately. Decisions depend
+    only on the rows of their own main group.
+    """
+    selector = RetentionSelector(policies or RetentionPolicies(), current_time.timestamp())
+    deployments = defaultdict(dict)  # main group -> sub group -> [(namespace, main group, sub group)]
+    failed = defaultdict(list)
+    recheck = {}
+
+    for row in rows:
+        name = row['name']
+        main_group, sub_group = GROUPING.group(name)
+
+        updated_day = row['updated'].split()[0]
+        updated_time = datetime.strptime(updated_day, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        age = (current_time - updated_time).days
+        deployments[main_group]  # every group gets an entry, even with nothing to do
+
+        if rules.is_protected(name, row['namespace'], row['chart']):
+            continue
+        if row['status'] == 'failed':
+            failed[main_group].append((name, row['namespace']))
+        elif age > AGE_THRESHOLD and sub_group != main_group and not rules.is_excluded(name, row['namespace'], row['chart']):
+            group = (row['namespace'], main_group, sub_group)
+            groups = deployments[main_group].setdefault(sub_group, [])
+            if group not in groups:
+                groups.append(group)
+            selector.add(group, row['namespace'], updated_time.timestamp(),
+                         int(row['revision'] or 0), (row['name'], row['namespace'], row['status'], age, updated_day))
+        elif age <= AGE_THRESHOLD:
+            crosses = (updated_time + timedelta(days=AGE_THRESHOLD + 1)).strftime('%Y-%m-%d')
+            recheck[main_group] = min(crosses, recheck.get(main_group, crosses))
+
+    # One sort of every removable release, oldest first as printed, dealt
+    # out to the sub groups in that order
+    removable = sorted(((deployment, main_group, sub_group)
+                        for main_group, sub_groups in deployments.items()
+                        for sub_group, groups in sub_groups.items()
+                        for group in groups
+                        for deployment in selector.removable(group)),
+                       key=lambda x: x[0][3], reverse=True)
+    subs = {main_group: {sub_group: [] for sub_group in sub_groups} for main_group, sub_groups in deployments.items()}
+    for deployment, main_group, sub_group in removable:
+        subs[main_group][sub_group].append(deployment)
+
+    decisions = {}
+    for main_group, group_subs in subs.items():
+        if not (len(group_subs) > 1 and any(group_subs.values())):
+            group_subs = {}
+        decisions[main_group] = {
+            'subs': {sk: sv for sk, sv in group_subs.items() if sv},
+            'failed': failed[main_group],
+            'recheck': recheck.get(main_group),
+        }
+    return decisions
 
-def print_grouped_deployments(grouped_deployments, failed_deployments):
+def flatten_decisions(decisions):
+    """Turn per-group decisions into the (grouped_deployments, failed_deployments) pair printed below."""
+    grouped = {}
+    failed_deployments = []
+    for main_group, decision in decisions.items():
+        if decision['subs']:
+            grouped[main_group] = {sub_group: [deployment[:4] for deployment in deployments]
+                                   for sub_group, deployments in decision['subs'].items()}
+        failed_deployments.extend(decision['failed'])
+    return grouped, failed_deployments
+
+def carry_forward(saved, current_time):
+    """Rebuild a group's saved decisions, recomputing each release's age for today."""
+    subs = {}
+    for sub_group, deployments in saved['subs'].items():
+        subs[sub_group] = []
+        for name, namespace, status, _, updated_day in deployments:
+            updated_time = datetime.strptime(updated_day, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+            subs[sub_group].append((name, namespace, status, (current_time - updated_time).days, updated_day))
+    return {'subs': subs, 'failed': [tuple(pair) for pair in saved['failed']], 'recheck': saved['recheck']}
+
+def group_deployments(file_path, rules, retention_file=RETENTION_FILE):
+    decisions = evaluate_rows(read_rows(file_path), rules, datetime.now(timezone.utc),
+                              RetentionPolicies.load(retention_file))
+    # Saved so that a later --diff run can start from these decisions
+    save_state(file_path, {'config': decision_config(retention_file), 'groups': decisions})
+    return flatten_decisions(decisions)
+
+def _digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def decision_config(retention_file=RETENTION_FILE):
+    """Everything besides the inventory that decisions depend on; saved decisions are reused only if it matches."""
+    return {'version': 2, 'age_threshold': AGE_THRESHOLD, 'grouping': list(GROUPING.rule),
+            'rules': _digest(RULES_FILE), 'retention': _digest(retention_file)}
+
+def group_deployments_diff(file_path, rules, previous_path=None, retention_file=RETENTION_FILE):
+    """
+    Like `group_deployments`, but only re-evaluate what changed since the previous snapshot.
+
+    The new inventory is sort-merged against `previous_path` (by default the
+    newest older helmoutputYYYYMMDD.csv next to `file_path`). Main groups with
+    an added, removed or changed release, or with a release that has aged
+    past AGE_THRESHOLD since, are evaluated again; every other group carries
+    its decisions forward from the previous run, with ages brought up to
+    date. Decisions are saved next to the snapshot for the next run. Without
+    usable saved decisions this falls back to a full evaluation.
+    """
+    current_time = datetime.now(timezone.utc)
+    today = current_time.strftime('%Y-%m-%d')
+    config = decision_config(retention_file)
+    policies = RetentionPolicies.load(retention_file)
+    rows = read_rows(file_path)
+    previous_path = previous_path or previous_snapshot(file_path)
+    state = load_state(previous_path) if previous_path else None
+
+    if state is None or state.get('config') != config:
+        print("No reusable decisions from a previous snapshot; evaluating everything.")
+        decisions = evaluate_rows(rows, rules, current_time, policies)
+    else:
+        main_of = {row['name']: GROUPING.group(row['name'])[0] for row in rows}
+        dirty = set()
+        changes = 0
+        for change, old, new in diff_snapshots(read_snapshot(previous_path), sorted(rows, key=snapshot_key)):
+            if change != 'same':
+                changes += 1
+                for row in (old, new):
+                    if row is not None:
+                        dirty.add(main_of.get(row['name']) or GROUPING.group(row['name'])[0])
+        saved_groups = state['groups']
+        dirty.update(main_group for main_group, saved in saved_groups.items()
+                     if saved['recheck'] is not None and saved['recheck'] <= today)
+        print(f"Differential run against {previous_path}: {changes} changed release(s), "
+              f"{len(dirty)} of {len(set(main_of.values()))} group(s) to re-evaluate.")
+
+        fresh = evaluate_rows([row for row in rows if main_of[row['name']] in dirty], rules, current_time, policies)
+        decisions = {}
+        # Keep the snapshot's group order, as a full run would
+        for main_group in dict.fromkeys(main_of.values()):
+            if main_group in fresh:
+                decisions[main_group] = fresh[main_group]
+            elif main_group in saved_groups:
+                decisions[main_group] = carry_forward(saved_groups[main_group], current_time)
+
+    save_state(file_path, {'config': config, 'groups': decisions})
+    return flatten_decisions(decisions)
+
+def print_grouped_deployments(grouped_deployments, failed_deployments, batch_size=BATCH_SIZE):
+    to_uninstall = []
     for main_group, subgroups in grouped_deployments.items():
         print(f"\n## {main_group}")
         for sub_group, deployments in subgroups.items():
@@ -71,23 +225,60 @@ def print_grouped_deployments(grouped_deployments, failed_deployments):
                 print(f"\n\t### {sub_group}")
                 for name, namespace, status, age in deployments:
                     print(f"\t- {name} (Namespace: {namespace}, Status: {status}, Age: {age} days)")
-                    print(f"\thel uninstall {name} -n {namespace}")
-    
+                    to_uninstall.append((name, namespace))
+
+    if to_uninstall:
+        print("\n## Uninstall Commands")
+        for command in uninstall_commands(to_uninstall, batch_size, helm='hel'):
+            print(command)
+
     if failed_deployments:
         print("\n## Failed Deployments to Uninstall")
-        for name, namespace in failed_deployments:
-            print(f"hel uninstall {name} -n {namespace}")
+        for command in uninstall_commands(failed_deployments, batch_size, helm='hel'):
+            print(command)
+
+def plan_entries(grouped_deployments, failed_deployments, rows):
+    """Plan entries for everything print_grouped_deployments would uninstall, at the snapshot's revisions."""
+    revisions = {(row['name'], row['namespace']): int(row['revision']) for row in rows}
+    entries = [PlanEntry(name, namespace, revisions[name, namespace], 'stale')
+               for subgroups in grouped_deployments.values()
+               for deployments in subgroups.values()
+               for name, namespace, _, _ in deployments]
+    entries.extend(PlanEntry(name, namespace, revisions[name, namespace], 'failed')
+                   for name, namespace in failed_deployments)
+    return entries
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Group stale Helm releases from today's helm list snapshot.")
+    parser.add_argument('--diff', action='store_true', help="only re-evaluate groups that changed since the previous snapshot")
+    parser.add_argument('--previous', help="snapshot to diff against (default: newest older helmoutputYYYYMMDD.csv)")
+    parser.add_argument('--retention', default=RETENTION_FILE,
+                        help="per-namespace retention policies (default: helmretention.conf)")
+    parser.add_argument('--plan', help="also write the uninstalls to this plan file, for helmplan.py apply")
+    parser.add_argument('--cache-ttl', type=int, default=DEFAULT_TTL,
+                        help=f"reuse a cached inventory up to this many seconds old; 0 lists again (default: {DEFAULT_TTL})")
+    args = parser.parse_args()
+
+    write_snapshot(filename, args.cache_ttl)
     file_path = filename
+    rules = RuleSet.load(RULES_FILE)
     
-    grouped_deployments, failed_deployments = group_deployments(file_path)
+    if args.diff:
+        grouped_deployments, failed_deployments = group_deployments_diff(file_path, rules, args.previous, args.retention)
+    else:
+        grouped_deployments, failed_deployments = group_deployments(file_path, rules, args.retention)
     print_grouped_deployments(grouped_deployments, failed_deployments)
+    if args.plan:
+        entries = plan_entries(grouped_deployments, failed_deployments, read_rows(file_path))
+        write_plan(args.plan, entries, source=os.path.abspath(file_path))
+        print(f"\nWrote {len(entries)} release(s) to plan {args.plan}")
+    print("\n## Rule Matches")
+    rules.report()
     # After processing the CSV file
     print(f"Would you like to retain the CSV file: {filename}")
     user_input = input("Enter 'n' to delete the file, any other key to retain: ")
     if user_input.lower() == 'n':
-        subprocess.run(["rm", filename])
+        subprocess.run(["rm", "-f", filename, state_path(filename)])
         print(f"File {filename} has been deleted.")
     else:
         print(f"File {filename} has been retained.")
@@ -0,0 +1,294 @@
+import argparse
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+UninstallResult = namedtuple('UninstallResult', 'name namespace ok attempts seconds error')
+
+def helm_uninstall(names, namespace, timeout=300):
+    """
+    Run a single `helm uninstall` for one or more releases in the same namespace.
+
+    Raises `subprocess.CalledProcessError` (or `subprocess.TimeoutExpired`) if
+    helm fails, so the caller can decide whether to retry. The timeout scales
+    with the number of releases in the call.
+    """
+    subprocess.run(['helm', 'uninstall', *names, '-n', namespace],
+                   capture_output=True, text=True, check=True, timeout=timeout * len(names))
+
+def batch_by_namespace(releases, batch_size):
+    """
+    Group (name, namespace) pairs into (namespace, [names]) batches.
+
+    Each batch holds at most `batch_size` names from a single namespace, since
+    one `helm uninstall` call can only target one namespace. Duplicate names are
+    dropped and the input order is otherwise preserved.
+    """
+    by_namespace = defaultdict(dict)
+    for name, namespace in releases:
+        by_namespace[namespace][name] = None
+    batch_size = max(1, batch_size)
+    batches = []
+    for namespace, names in by_namespace.items():
+        names = list(names)
+        for i in range(0, len(names), batch_size):
+            batches.append((namespace, names[i:i + batch_size]))
+    return batches
+
+def uninstall_commands(releases, batch_size, helm='helm'):
+    """Return the batched `helm uninstall` command lines for (name, namespace) pairs."""
+    return [f"{helm} uninstall {' '.join(names)} -n {namespace}"
+            for namespace, names in batch_by_namespace(releases, batch_size)]
+
+def interleave_by_namespace(batches):
+    """
+    Reorder (namespace, names) batches round-robin across namespaces.
+
+    Submitting work in this order stops one large namespace from filling every
+    worker while the per-namespace cap leaves them waiting.
+    """
+    by_namespace = defaultdict(list)
+    for namespace, names in batches:
+        by_namespace[namespace].append((namespace, names))
+    queues = list(by_namespace.values())
+    ordered = []
+    for i in range(max((len(q) for q in queues), default=0)):
+        for q in queues:
+            if i < len(q):
+                ordered.append(q[i])
+    return ordered
+
+# helm's error for a release name that does not exist
+_NOT_FOUND = re.compile(r'Release not loaded: ([^:\s]+): release: not found')
+
+def _is_not_found(exc):
+    return 'release: not found' in (getattr(exc, 'stderr', None) or '')
+
+def _split_failed_batch(names, exc):
+    """
+    Return (name, may_be_gone) for each release of a failed batch, to retry one at a time.
+
+    helm uninstalls a batch's releases in order and stops at the first error,
+    so the releases ahead of the one that failed may already be gone. When
+    helm names the release it could not find, that release and those after
+    it were never touched, so a later 'not found' for them is a real failure
+    (a typo, or a release that never existed). Otherwise any of them may be gone.
+    """
+    m = _NOT_FOUND.search(getattr(exc, 'stderr', None) or '')
+    if not m or m.group(1) not in names:
+        return [(name, True) for name in names]
+    cut = names.index(m.group(1))
+    return [(name, i < cut) for i, name in enumerate(names)]
+
+def _error_text(exc):
+    stderr = (getattr(exc, 'stderr', None) or '').strip()
+    if stderr:
+        return stderr.splitlines()[-1]
+    return str(exc)
+
+class UninstallExecutor:
+    """
+    Uninstall many Helm releases concurrently, several releases per helm call.
+
+    Releases are grouped per namespace into batches of up to `batch_size` names,
+    and each batch is removed with one `helm uninstall` invocation. At most
+    `workers` invocations run at once, and at most `namespace_limit` of those in
+    any single namespace. If a batch fails, its releases are retried one at a
+    time, so one bad release does not hold back the rest. A failed single
+    uninstall is retried up to `retries` more times; before retry number n
+    (from 1) it waits `backoff * 2**(n - 1)` seconds times a random factor
+    between 1 and 2, so concurrent retries do not line up. Progress is written
+    to `progress` while the run is in flight, and each finished batch's results
+    are passed to `on_results` (such as `UninstallJournal.record`) in the
+    calling thread. With `missing_ok`, a release helm reports as not found
+    counts as uninstalled, as when resuming a run that may have removed it.
+    """
+
+    def __init__(self, workers=8, namespace_limit=4, retries=2, backoff=1.0, batch_size=1,
+                 uninstall=helm_uninstall, progress=sys.stderr, on_results=None, missing_ok=False):
+        self.workers = max(1, workers)
+        self.namespace_limit = max(1, namespace_limit)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.batch_size = max(1, batch_size)
+        self.uninstall = uninstall
+        self.progress = progress
+        self.on_results = on_results
+        self.missing_ok = missing_ok
+        self._lock = threading.Lock()
+        self._namespace_slots = defaultdict(lambda: threading.BoundedSemaphore(self.namespace_limit))
+        self._counts = {'done': 0, 'ok': 0, 'failed': 0, 'retries': 0, 'total': 0}
+
+    def _slot(self, namespace):
+        with self._lock:
+            return self._namespace_slots[namespace]
+
+    def _uninstall_one(self, name, namespace, may_be_gone=False):
+        start = time.monotonic()
+        slot = self._slot(namespace)
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                with self._lock:
+                    self._counts['retries'] += 1
+                # Back off outside the namespace slot so other releases can use it
+                time.sleep(self.backoff * (2 ** (attempt - 1)) * (1 + random.random()))
+            with slot:
+                try:
+                    self.uninstall([name], namespace)
+                except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as exc:
+                    # Not found only means done if an earlier call may have removed it
+                    if not ((may_be_gone or self.missing_ok) and _is_not_found(exc)):
+                        error = _error_text(exc)
+                        continue
+            return [UninstallResult(name, namespace, True, attempt + 1, time.monotonic() - start, None)]
+        return [UninstallResult(name, namespace, False, self.retries + 1, time.monotonic() - start, error)]
+
+    def _uninstall_batch(self, namespace, names, may_be_gone=False):
+        """
+        Return (results, None), or (None, retries) if the batch failed and needs splitting.
+
+        `retries` holds (name, may_be_gone) pairs from `_split_failed_batch`;
+        `may_be_gone` applies to a batch of one.
+        """
+        if len(names) == 1:
+            return self._uninstall_one(names[0], namespace, may_be_gone), None
+        start = time.monotonic()
+        with self._slot(namespace):
+            try:
+                self.uninstall(names, namespace)
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as exc:
+                return None, _split_failed_batch(names, exc)
+        seconds = (time.monotonic() - start) / len(names)
+        return [UninstallResult(name, namespace, True, 1, seconds, None) for name in names], None
+
+    def _report(self, result):
+        with self._lock:
+            counts = self._counts
+            counts['done'] += 1
+            counts['ok' if result.ok else 'failed'] += 1
+            if self.progress is None:
+                return
+            if self.progress.isatty():
+                self.progress.write(f"\r[{counts['done']}/{counts['total']}] ok: {counts['ok']}  "
+                                    f"failed: {counts['failed']}  retries: {counts['retries']}")
+                if counts['done'] == counts['total']:
+                    self.progress.write("\n")
+            else:
+                state = 'ok' if result.ok else f"FAILED ({result.error})"
+                self.progress.write(f"[{counts['done']}/{counts['total']}] {result.namespace}/{result.name}: {state}\n")
+            self.progress.flush()
+
+    def expect(self, total):
+        """Set how many releases the progress display counts towards."""
+        with self._lock:
+            self._counts['total'] = total
+
+    def uninstall_now(self, namespace, names):
+        """
+        Uninstall one namespace's batch of releases in the calling thread.
+
+        Like a batch inside `run`, a failed batch is retried one release at a
+        time. Returns the list of `UninstallResult`, after reporting progress.
+        """
+        results, retries = self._uninstall_batch(namespace, names)
+        if results is None:
+            results = [result for name, may_be_gone in retries
+                       for result in self._uninstall_one(name, namespace, may_be_gone)]
+        for result in results:
+            self._report(result)
+        if self.on_results:
+            self.on_results(results)
+        return results
+
+    def skip(self, name, namespace, reason):
+        """Record a release that was deliberately not attempted, as a failed result."""
+        result = UninstallResult(name, namespace, False, 0, 0.0, reason)
+        self._report(result)
+        return result
+
+    def run(self, releases):
+        """
+        Uninstall every (name, namespace) pair in `releases`.
+
+        Returns a list of `UninstallResult` in completion order.
+        """
+        batches = interleave_by_namespace(batch_by_namespace(releases, self.batch_size))
+        self.expect(sum(len(names) for _, names in batches))
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {pool.submit(self._uninstall_batch, namespace, names): (namespace, names)
+                       for namespace, names in batches}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    namespace, names = pending.pop(future)
+                    batch_results, retries = future.result()
+                    if batch_results is None:
+                        for name, may_be_gone in retries:
+                            retry = pool.submit(self._uninstall_batch, namespace, [name], may_be_gone)
+                            pending[retry] = (namespace, [name])
+                        continue
+                    for result in batch_results:
+                        self._report(result)
+                        results.append(result)
+                    if self.on_results:
+                        self.on_results(batch_results)
+        return results
+
+def print_summary(results, out=sys.stdout):
+    """Print a per-namespace table of uninstall outcomes, followed by any failures."""
+    rows = defaultdict(lambda: [0, 0, 0, 0.0])
+    for result in results:
+        row = rows[result.namespace]
+        row[0 if result.ok else 1] += 1
+        row[2] += max(0, result.attempts - 1)
+        row[3] += result.seconds
+    width = max([len('namespace')] + [len(ns) for ns in rows])
+    out.write(f"{'namespace':<{width}}  {'ok':>6}  {'failed':>6}  {'retries':>7}  {'seconds':>8}\n")
+    for namespace in sorted(rows):
+        ok, failed, retries, seconds = rows[namespace]
+        out.write(f"{namespace:<{width}}  {ok:>6}  {failed:>6}  {retries:>7}  {seconds:>8.1f}\n")
+    for result in results:
+        if not result.ok:
+            out.write(f"Failed to uninstall {result.name} in namespace {result.namespace}: {result.error}\n")
+
+def read_names(paths):
+    """Yield release names from files (or stdin), one per line, skipping blanks and comments."""
+    for path in paths or ['-']:
+        f = sys.stdin if path == '-' else open(path)
+        with f:
+            for line in f:
+                name = line.strip()
+                if name and not name.startswith('#'):
+                    yield name
+
+def main():
+    parser = argparse.ArgumentParser(description="Uninstall the Helm releases listed in files (or stdin), in batches.")
+    parser.add_argument('paths', nargs='*', help="files with one release name per line (default: stdin)")
+    parser.add_argument('-n', '--namespace', default='default', help="namespace of the listed releases")
+    parser.add_argument('--execute', action='store_true', help="actually run helm uninstall (default: print the commands)")
+    parser.add_argument('--batch-size', type=int, default=10, help="releases per helm uninstall call")
+    parser.add_argument('--workers', type=int, default=8, help="maximum concurrent helm calls")
+    parser.add_argument('--namespace-limit', type=int, default=4, help="maximum concurrent helm calls per namespace")
+    parser.add_argument('--retries', type=int, default=2, help="retries per failed uninstall")
+    args = parser.parse_args()
+
+    releases = [(name, args.namespace) for name in read_names(args.paths)]
+    if not args.execute:
+        for command in uninstall_commands(releases, args.batch_size):
+            print(command)
+        return
+    executor = UninstallExecutor(workers=args.workers, namespace_limit=args.namespace_limit,
+                                 retries=args.retries, batch_size=args.batch_size)
+    results = executor.run(releases)
+    print_summary(results)
+    sys.exit(0 if all(result.ok for result in results) else 1)
+
+if __name__ == "__main__":
+    main()
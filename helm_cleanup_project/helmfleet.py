@@ -0,0 +1,136 @@
+import argparse
+import asyncio
+import csv
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+from helmproc import ProcessRunner
+from helmsnapshots import SNAPSHOT_FIELDS
+from helmstream import read_helm_releases
+
+# One (kube-context, namespace) pair to list releases from.
+Target = namedtuple('Target', 'context namespace')
+
+# Outcome of listing one target. `releases` is empty when ok is False.
+TargetResult = namedtuple('TargetResult', 'context namespace ok releases seconds error')
+
+INVENTORY_FIELDS = ['cluster'] + SNAPSHOT_FIELDS
+
+def _error_text(exc, timeout):
+    if isinstance(exc, subprocess.TimeoutExpired):
+        return f"timed out after {timeout}s"
+    if isinstance(exc, subprocess.CalledProcessError):
+        return (exc.stderr or '').strip() or f"exit status {exc.returncode}"
+    return str(exc)
+
+async def list_target(target, runner, helm='helm'):
+    """List every release in one (context, namespace) target."""
+    command = [helm, 'list', '--kube-context', target.context, '--namespace', target.namespace,
+               '--all', '--output', 'json']
+    start = time.monotonic()
+    try:
+        releases = await read_helm_releases(command, runner)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError, ValueError) as e:
+        return TargetResult(target.context, target.namespace, False, [], time.monotonic() - start,
+                            _error_text(e, runner.timeout))
+    return TargetResult(target.context, target.namespace, True, releases, time.monotonic() - start, None)
+
+async def list_contexts(runner, kubectl='kubectl'):
+    """Return the names of every context in the kubeconfig."""
+    return (await runner.run([kubectl, 'config', 'get-contexts', '--output', 'name'])).stdout.split()
+
+async def list_namespaces(context, runner, kubectl='kubectl'):
+    """Return the namespaces in one context."""
+    command = [kubectl, 'get', 'namespaces', '--context', context, '--output',
+               'jsonpath={.items[*].metadata.name}']
+    return (await runner.run(command)).stdout.split()
+
+async def discover_targets(contexts=None, namespaces=None, concurrency=16, timeout=30, kubectl='kubectl'):
+    """
+    Build the (context, namespace) targets to scan.
+
+    Without `contexts`, every context in the kubeconfig is used. Without
+    `namespaces`, each context's namespaces are listed (concurrently). A
+    context whose namespaces cannot be listed is reported and skipped.
+    """
+    runner = ProcessRunner(concurrency, timeout)
+    contexts = contexts or await list_contexts(runner, kubectl)
+    if namespaces:
+        return [Target(context, namespace) for context in contexts for namespace in namespaces]
+    found = await asyncio.gather(*(list_namespaces(context, runner, kubectl) for context in contexts),
+                                 return_exceptions=True)
+    targets = []
+    for context, names in zip(contexts, found):
+        if isinstance(names, Exception):
+            print(f"Skipping context {context}: {_error_text(names, timeout)}", file=sys.stderr)
+            continue
+        targets.extend(Target(context, namespace) for namespace in names)
+    return targets
+
+async def collect(targets, concurrency=16, timeout=60, helm='helm'):
+    """
+    List all targets concurrently and return a TargetResult per target, in target order.
+
+    At most `concurrency` helm processes run at once across the whole fleet,
+    and each target gets `timeout` seconds, so a scan takes roughly as long as
+    its slowest target rather than the sum of all of them.
+    """
+    runner = ProcessRunner(concurrency, timeout)
+    return await asyncio.gather(*(list_target(target, runner, helm) for target in targets))
+
+def merge_inventory(results):
+    """Flatten successful TargetResults into release dicts with a `cluster` column."""
+    inventory = []
+    for result in results:
+        for release in result.releases:
+            inventory.append(dict(release, cluster=result.context))
+    return inventory
+
+def write_inventory(inventory, out):
+    writer = csv.DictWriter(out, fieldnames=INVENTORY_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    writer.writerows(inventory)
+
+def print_results(results, out=sys.stderr):
+    """Print one line per target: status, release count and time taken."""
+    for result in sorted(results, key=lambda r: (r.ok, r.context, r.namespace)):
+        status = 'ok' if result.ok else f"FAILED: {result.error}"
+        out.write(f"{result.context:<30} {result.namespace:<25} {len(result.releases):>5} {result.seconds:>7.2f}s  {status}\n")
+
+async def scan(args):
+    targets = await discover_targets(args.context, args.namespace, args.concurrency, args.timeout)
+    start = time.monotonic()
+    results = await collect(targets, args.concurrency, args.timeout)
+    print_results(results)
+    failed = sum(not result.ok for result in results)
+    print(f"Listed {len(targets)} target(s) in {time.monotonic() - start:.2f}s, {failed} failed", file=sys.stderr)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="List Helm releases across every kube context and namespace at once.")
+    parser.add_argument('--context', action='append', help="kube context to scan (repeatable; default: all contexts)")
+    parser.add_argument('-n', '--namespace', action='append',
+                        help="namespace to scan in each context (repeatable; default: all namespaces)")
+    parser.add_argument('--concurrency', type=int, default=16, help="maximum helm/kubectl processes at once")
+    parser.add_argument('--timeout', type=float, default=60, help="seconds allowed per target")
+    parser.add_argument('-o', '--output', help="CSV file to write the merged inventory to (default: stdout)")
+    args = parser.parse_args()
+
+    try:
+        results = asyncio.run(scan(args))
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+        # Only listing the contexts can fail outright; each target's failure is in its result
+        sys.exit(f"Could not list kube contexts: {_error_text(e, args.timeout)}")
+    inventory = merge_inventory(results)
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            write_inventory(inventory, f)
+    else:
+        write_inventory(inventory, sys.stdout)
+    if not all(result.ok for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import re
+from collections import namedtuple
+
+# Release name suffixes that mark a member of a preview stack, e.g.
+# vector-backend-cu-ajt3xw-db next to vector-backend-cu-ajt3xw.
+STACK_SUFFIXES = ('audit', 'be', 'db', 'db-be', 'db-email', 'e', 'elasticsearch', 'fe',
+                  'frontend', 'rabbitmq', 'redis', 'unleash-proxy')
+
+# The last segment of a preview stack root: a generated id such as ajt3xw or
+# eqpcna, or a ticket number such as 543. Long-lived releases (vector-frontend,
+# raft-ship-ext) end in a word and are never stack roots, even when a release
+# such as vector-frontend-unleash-proxy ends in a stack suffix.
+PREVIEW_ID = re.compile(r'[a-z0-9]{6}|[a-z0-9]*[0-9][a-z0-9]*')
+
+# How a release name maps to its (main group, sub group). Each side is a spec:
+#   'name'      the full release name
+#   'prefix:N'  the first N dash segments
+#   'parent:N'  drop the last segment if the name has more than N segments
+#   'stack'     the stack root the release belongs to (or the name itself)
+GroupingRule = namedtuple('GroupingRule', 'main sub')
+
+GROUPING_RULES = {
+    # helmclean.get_base_name: drop the last part of names with more than 4 parts
+    'helmclean': GroupingRule('parent:4', 'parent:4'),
+    # delhelm: first two parts / everything up to the last part
+    'delhelm': GroupingRule('prefix:2', 'parent:2'),
+    # newdel: first two parts / first three parts
+    'newdel': GroupingRule('prefix:2', 'prefix:3'),
+    # Whole preview environments: vector-backend / vector-backend-cu-ajt3xw
+    'stack': GroupingRule('prefix:2', 'stack'),
+}
+
+class _Node:
+    __slots__ = ('parent', 'segment', 'children', 'path', 'depth', 'terminal', 'stack_root')
+
+    def __init__(self, parent, segment, path, depth):
+        self.parent = parent
+        self.segment = segment
+        self.children = {}
+        self.path = path
+        self.depth = depth
+        self.terminal = False
+        self.stack_root = None
+
+class GroupingEngine:
+    """
+    Group Helm release names using a trie of their dash-separated segments.
+
+    Every name is split once, when it is added; all grouping rules are then
+    answered by walking trie nodes instead of re-splitting strings. Rules that
+    only look at the name itself ('name', 'prefix', 'parent') can be asked as
+    soon as a name is added. The 'stack' rule depends on which other names
+    exist, so add every name before asking for it.
+    """
+
+    def __init__(self, rule='helmclean', suffixes=STACK_SUFFIXES):
+        self.rule = GROUPING_RULES[rule] if isinstance(rule, str) else rule
+        self.suffixes = {tuple(suffix.split('-')) for suffix in suffixes}
+        self._longest_suffix = max((len(suffix) for suffix in self.suffixes), default=0)
+        self._root = _Node(None, '', '', 0)
+        self._names = {}
+        self._stacks_built = False
+
+    def add(self, name):
+        """Insert a release name into the trie (adding it again is a no-op)."""
+        if name in self._names:
+            return
+        node = self._root
+        for segment in name.split('-'):
+            child = node.children.get(segment)
+            if child is None:
+                path = f"{node.path}-{segment}" if node.path else segment
+                child = node.children[segment] = _Node(node, segment, path, node.depth + 1)
+            node = child
+        node.terminal = True
+        self._names[name] = node
+        self._stacks_built = False
+
+    def add_all(self, names):
+        for name in names:
+            self.add(name)
+        return self
+
+    def _stack_root_of(self, node):
+        # Try the longest suffix first, so vector-email-serv-6eyf2u-db-be belongs
+        # to vector-email-serv-6eyf2u and not to a '-db' root of its own. Only
+        # the last few segments are looked at, so this is O(1) per name. A root
+        # has at least three segments and ends in a preview id.
+        segments = []
+        ancestor = node
+        for _ in range(self._longest_suffix):
+            if ancestor.depth <= 2:
+                break
+            segments.append(ancestor.segment)
+            ancestor = ancestor.parent
+        for length in range(len(segments), 0, -1):
+            if tuple(reversed(segments[:length])) in self.suffixes:
+                root = node
+                for _ in range(length):
+                    root = root.parent
+                if root.depth > 2 and PREVIEW_ID.fullmatch(root.segment):
+                    return root
+        return None
+
+    def _build_stacks(self):
+        for node in self._names.values():
+            node.stack_root = None
+        for node in self._names.values():
+            root = self._stack_root_of(node)
+            if root is not None:
+                node.stack_root = root
+                if root.terminal:
+                    root.stack_root = root
+        self._stacks_built = True
+
+    def _resolve(self, node, spec):
+        kind, _, arg = spec.partition(':')
+        if kind == 'name':
+            return node.path
+        if kind == 'prefix':
+            while node.depth > int(arg):
+                node = node.parent
+            return node.path
+        if kind == 'parent':
+            return node.parent.path if node.depth > int(arg) else node.path
+        if kind == 'stack':
+            if not self._stacks_built:
+                self._build_stacks()
+            return node.stack_root.path if node.stack_root else node.path
+        raise ValueError(f"Unknown grouping spec {spec!r}")
+
+    def group(self, name):
+        """Return (main_group, sub_group) for a release name, adding it if needed."""
+        node = self._names.get(name)
+        if node is None:
+            self.add(name)
+            node = self._names[name]
+        return self._resolve(node, self.rule.main), self._resolve(node, self.rule.sub)
+
+    def stacks(self):
+        """Return {stack root: [member names]} for every stack with at least one suffixed member."""
+        if not self._stacks_built:
+            self._build_stacks()
+        stacks = {}
+        for name, node in self._names.items():
+            if node.stack_root is not None:
+                stacks.setdefault(node.stack_root.path, []).append(name)
+        return stacks
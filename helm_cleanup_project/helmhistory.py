@@ -0,0 +1,136 @@
+import argparse
+import csv
+import glob
+import hashlib
+import os
+import sqlite3
+import sys
+from datetime import date
+
+from helmdates import parse_helm_times
+from helmsnapshots import SNAPSHOT_FIELDS, snapshot_date
+
+DEFAULT_DB = 'helmhistory.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    snapshot_date TEXT NOT NULL,
+    sha256 TEXT NOT NULL UNIQUE,
+    rows INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS releases (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots(id),
+    snapshot_date TEXT NOT NULL,
+    name TEXT NOT NULL,
+    namespace TEXT NOT NULL,
+    revision INTEGER,
+    updated TEXT,
+    updated_epoch INTEGER,
+    status TEXT,
+    chart TEXT,
+    app_version TEXT
+);
+CREATE INDEX IF NOT EXISTS releases_namespace_name ON releases (namespace, name, snapshot_date);
+CREATE INDEX IF NOT EXISTS releases_chart ON releases (chart);
+CREATE INDEX IF NOT EXISTS releases_status ON releases (status);
+CREATE INDEX IF NOT EXISTS releases_updated ON releases (updated_epoch);
+CREATE INDEX IF NOT EXISTS releases_snapshot_date ON releases (snapshot_date);
+"""
+
+def connect(path=DEFAULT_DB):
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    db.executescript(SCHEMA)
+    return db
+
+def file_date(path):
+    """Snapshot date for a CSV: YYYY-MM-DD from a helmoutputYYYYMMDD.csv name, else the file's mtime."""
+    dated = snapshot_date(path)
+    if dated:
+        return f"{dated[:4]}-{dated[4:6]}-{dated[6:]}"
+    return date.fromtimestamp(os.path.getmtime(path)).isoformat()
+
+def ingest(db, path, when=None):
+    """
+    Load one helmoutput CSV into the database in a single transaction.
+
+    Files are identified by content hash, so re-running over the same
+    directory only appends snapshots that are new. Returns the number of
+    rows loaded (0 if the file was already ingested).
+    """
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    if db.execute('SELECT 1 FROM snapshots WHERE sha256 = ?', (digest,)).fetchone():
+        return 0
+    with open(path, newline='') as f:
+        rows = [[row[field] for field in SNAPSHOT_FIELDS] for row in csv.DictReader(f)]
+    epochs = parse_helm_times(row[3] for row in rows)
+    when = when or file_date(path)
+    with db:
+        snapshot_id = db.execute('INSERT INTO snapshots (path, snapshot_date, sha256, rows) VALUES (?, ?, ?, ?)',
+                                 (os.path.abspath(path), when, digest, len(rows))).lastrowid
+        db.executemany(
+            'INSERT INTO releases (snapshot_id, snapshot_date, name, namespace, revision, updated, updated_epoch,'
+            ' status, chart, app_version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            ((snapshot_id, when, name, namespace, int(revision or 0), updated, epoch or None, status, chart, app_version)
+             for (name, namespace, revision, updated, status, chart, app_version), epoch in zip(rows, epochs)))
+    return len(rows)
+
+def first_seen(db, name, namespace=None):
+    """Return [(namespace, first snapshot date, last snapshot date, snapshots)] for a release name."""
+    query = ('SELECT namespace, MIN(snapshot_date), MAX(snapshot_date), COUNT(DISTINCT snapshot_id)'
+             ' FROM releases WHERE name = ?')
+    params = [name]
+    if namespace:
+        query += ' AND namespace = ?'
+        params.append(namespace)
+    return db.execute(query + ' GROUP BY namespace ORDER BY namespace', params).fetchall()
+
+def report(db, out=sys.stdout):
+    """Print release, failed and namespace counts per snapshot."""
+    out.write(f"{'snapshot':<10}  {'releases':>8}  {'failed':>6}  {'namespaces':>10}  path\n")
+    rows = db.execute(
+        "SELECT s.snapshot_date, COUNT(*), SUM(r.status = 'failed'), COUNT(DISTINCT r.namespace), s.path"
+        ' FROM snapshots s JOIN releases r ON r.snapshot_id = s.id'
+        ' GROUP BY s.id ORDER BY s.snapshot_date, s.id')
+    for when, total, failed, namespaces, path in rows:
+        out.write(f"{when:<10}  {total:>8}  {failed:>6}  {namespaces:>10}  {path}\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep every helm list snapshot in an indexed SQLite history.")
+    parser.add_argument('--db', default=DEFAULT_DB, help=f"database file (default: {DEFAULT_DB})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = commands.add_parser('ingest', help="load helmoutput*.csv snapshots")
+    ingest_parser.add_argument('paths', nargs='*', help="CSV files or directories (default: helmoutput*.csv here)")
+    ingest_parser.add_argument('--date', help="snapshot date (YYYY-MM-DD) to use for every file given")
+
+    seen_parser = commands.add_parser('first-seen', help="when a release first and last appeared")
+    seen_parser.add_argument('name')
+    seen_parser.add_argument('-n', '--namespace')
+
+    commands.add_parser('report', help="per-snapshot summary")
+    args = parser.parse_args()
+
+    db = connect(args.db)
+    if args.command == 'ingest':
+        paths = []
+        for path in args.paths or ['.']:
+            paths.extend(sorted(glob.glob(os.path.join(path, 'helmoutput*.csv'))) if os.path.isdir(path) else [path])
+        for path in paths:
+            loaded = ingest(db, path, args.date)
+            print(f"{path}: {loaded} rows" if loaded else f"{path}: already ingested")
+    elif args.command == 'first-seen':
+        found = first_seen(db, args.name, args.namespace)
+        if not found:
+            print(f"{args.name} does not appear in any snapshot")
+        for namespace, first, last, count in found:
+            print(f"{args.name} in {namespace}: first seen {first}, last seen {last} ({count} snapshots)")
+    else:
+        report(db)
+
+if __name__ == "__main__":
+    main()
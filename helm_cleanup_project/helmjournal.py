@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+# What a journal says about its latest run: the planned (name, namespace)
+# pairs, the set of those uninstalled, and {(name, namespace): error} for
+# those whose last attempt failed.
+JournalState = namedtuple('JournalState', 'created releases done failed')
+
+def _end_last_line(path, chunk=4096):
+    """Make `path` end in a newline: drop a torn last line, or terminate a complete one."""
+    try:
+        f = open(path, 'r+b')
+    except FileNotFoundError:
+        return
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        tail = b''
+        while end and b'\n' not in tail:
+            start = max(0, end - chunk)
+            f.seek(start)
+            tail = f.read(end - start) + tail
+            end = start
+        if not tail or tail.endswith(b'\n'):
+            return
+        cut = end + tail.rfind(b'\n') + 1
+        try:
+            json.loads(tail[cut - end:])
+        except ValueError:
+            f.truncate(cut)
+        else:
+            f.seek(0, os.SEEK_END)
+            f.write(b'\n')
+
+class UninstallJournal:
+    """
+    Append-only record of an uninstall run, one JSON object per line.
+
+    A run starts with a 'plan' line listing every release it means to
+    uninstall, followed by one 'result' line per release as batches finish.
+    Each write is flushed and fsync'd before returning, so after a crash the
+    journal holds the plan and every outcome that was reported, and
+    `replay` can tell what is left. Earlier runs stay in the file; only the
+    last plan counts. Opening a journal whose last line was torn by a
+    crash cuts that line off first, so new entries start on a line of
+    their own.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        _end_last_line(path)
+        self._file = open(path, 'a')
+        self._lock = threading.Lock()
+
+    def _append(self, entries):
+        with self._lock:
+            for entry in entries:
+                self._file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def plan(self, releases, created=None):
+        """Start a run that will uninstall the (name, namespace) pairs in `releases`."""
+        created = int(time.time()) if created is None else created
+        self._append([{'event': 'plan', 'created': created, 'releases': [list(release) for release in releases]}])
+
+    def record(self, results):
+        """Append a batch of `UninstallResult`, with a single fsync."""
+        self._append([{'event': 'result', 'name': result.name, 'namespace': result.namespace, 'ok': result.ok,
+                       'attempts': result.attempts, 'error': result.error} for result in results])
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def replay(path):
+    """
+    Return the JournalState of the last run recorded in `path`.
+
+    A torn final line, left by a crash in the middle of a write, is ignored.
+    Raises ValueError if the journal holds no plan, or is unreadable before
+    its last line.
+    """
+    state = None
+    with open(path) as f:
+        lines = f.readlines()
+    for number, line in enumerate(lines, 1):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            if number == len(lines):
+                break
+            raise ValueError(f"{path}:{number}: unreadable journal entry") from None
+        if entry.get('event') == 'plan':
+            state = JournalState(entry['created'], [tuple(release) for release in entry['releases']], set(), {})
+        elif entry.get('event') == 'result' and state is not None:
+            release = (entry['name'], entry['namespace'])
+            if entry['ok']:
+                state.done.add(release)
+                state.failed.pop(release, None)
+            else:
+                state.failed[release] = entry['error']
+    if state is None:
+        raise ValueError(f"{path}: no uninstall plan in journal")
+    return state
+
+def remaining(state):
+    """Return the planned (name, namespace) pairs not yet uninstalled, in plan order."""
+    return [release for release in state.releases if release not in state.done]
@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds (seconds) for uninstall call latency; helm uninstall of a batch
+# usually takes seconds, and a hung one runs into the 300s timeout.
+LATENCY_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+    return '{' + pairs + '}'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metrics:
+    """
+    Phase timings, counters and histograms for one cleanup run.
+
+    Everything is kept in plain dicts and rendered in the Prometheus or
+    OpenMetrics text format, to a node-exporter textfile or as a Pushgateway
+    payload. Metric names get `prefix` in front. Updates are thread-safe, so
+    the uninstall workers can record into the same object.
+    """
+
+    def __init__(self, prefix='helmclean'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._values = {}  # name -> {label tuple: value}
+        self._histograms = {}  # name -> (buckets, {label tuple: (counts, sum, count)})
+
+    def _declare(self, name, kind, help_text):
+        name = f"{self.prefix}_{name}"
+        if name not in self._types:
+            self._types[name] = kind
+            self._help[name] = help_text
+            self._values.setdefault(name, {})
+        return name
+
+    def inc(self, name, help_text, amount=1, **labels):
+        """Add `amount` to counter `name` (reported as <prefix>_<name>_total)."""
+        name = self._declare(name, 'counter', help_text)
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[name][key] = self._values[name].get(key, 0) + amount
+
+    def set(self, name, help_text, value, **labels):
+        """Set gauge `name` to `value`."""
+        name = self._declare(name, 'gauge', help_text)
+        with self._lock:
+            self._values[name][tuple(sorted(labels.items()))] = value
+
+    def add_seconds(self, phase, seconds):
+        """Add time spent in a phase to the phase duration gauge."""
+        name = self._declare('phase_duration_seconds', 'gauge', "Wall time spent in each phase of the last run.")
+        key = (('phase', phase),)
+        with self._lock:
+            self._values[name][key] = self._values[name].get(key, 0.0) + seconds
+
+    @contextmanager
+    def span(self, phase):
+        """Time the body of a `with` block as (part of) `phase`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_seconds(phase, time.perf_counter() - start)
+
+    def seconds(self, phase):
+        """Return the time recorded for `phase` so far."""
+        with self._lock:
+            return self._values.get(f"{self.prefix}_phase_duration_seconds", {}).get((('phase', phase),), 0.0)
+
+    def timed_iter(self, phase, iterable, counter=None, help_text=None):
+        """
+        Yield from `iterable`, counting only the time spent producing items towards `phase`.
+
+        With `counter`, the number of items produced is added to that counter.
+        """
+        iterator = iter(iterable)
+        clock = time.perf_counter
+        spent = 0.0
+        produced = 0
+        try:
+            while True:
+                start = clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    spent += clock() - start
+                    return
+                spent += clock() - start
+                produced += 1
+                yield item
+        finally:
+            self.add_seconds(phase, spent)
+            if counter:
+                self.inc(counter, help_text, produced)
+
+    @staticmethod
+    def timed_calls(func):
+        """
+        Wrap `func` to total the time spent in it.
+
+        Returns (wrapper, seconds), where calling `seconds()` gives the total
+        so far. For functions called once per release, where a span per call
+        would cost more than the call itself. Not thread-safe.
+        """
+        clock = time.perf_counter
+        spent = [0.0]
+
+        def wrapper(*args):
+            start = clock()
+            try:
+                return func(*args)
+            finally:
+                spent[0] += clock() - start
+
+        def seconds():
+            return spent[0]
+
+        return wrapper, seconds
+
+    def observe(self, name, help_text, value, buckets=LATENCY_BUCKETS, **labels):
+        """Record one observation in histogram `name`."""
+        name = f"{self.prefix}_{name}"
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = (tuple(buckets), {})
+                self._types[name] = 'histogram'
+                self._help[name] = help_text
+            buckets, series = self._histograms[name]
+            counts, total, count = series.get(key) or ([0] * (len(buckets) + 1), 0.0, 0)
+            counts[bisect_left(buckets, value)] += 1
+            series[key] = (counts, total + value, count + 1)
+
+    def observed(self, name, help_text, func, buckets=LATENCY_BUCKETS):
+        """Wrap `func` so that every call's duration is observed in histogram `name`, labelled by outcome."""
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                result = func(*args, **kwargs)
+                outcome = 'ok'
+                return result
+            finally:
+                self.observe(name, help_text, time.perf_counter() - start, buckets, outcome=outcome)
+        return wrapper
+
+    def render(self, openmetrics=False):
+        """
+        Return every metric in the Prometheus text format, or OpenMetrics with `openmetrics`.
+
+        The two differ only in how counters are declared (OpenMetrics names the
+        family without `_total`) and in the closing `# EOF` line. node-exporter's
+        textfile collector and the Pushgateway both read the Prometheus format.
+        """
+        lines = []
+        with self._lock:
+            for name in sorted(self._types):
+                kind = self._types[name]
+                family = name if openmetrics or kind != 'counter' else f"{name}_total"
+                lines.append(f"# HELP {family} {self._help[name]}")
+                lines.append(f"# TYPE {family} {kind}")
+                if kind == 'histogram':
+                    buckets, series = self._histograms[name]
+                    for key, (counts, total, count) in sorted(series.items()):
+                        labels = dict(key)
+                        cumulative = 0
+                        for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+                            cumulative += bucket_count
+                            le = '+Inf' if bound == float('inf') else _number(float(bound))
+                            lines.append(f"{name}_bucket{_labels(dict(labels, le=le))} {cumulative}")
+                        lines.append(f"{name}_count{_labels(labels)} {count}")
+                        lines.append(f"{name}_sum{_labels(labels)} {_number(float(total))}")
+                    continue
+                suffix = '_total' if kind == 'counter' else ''
+                for key, value in sorted(self._values[name].items()):
+                    lines.append(f"{name}{suffix}{_labels(dict(key))} {_number(value)}")
+        if openmetrics:
+            lines.append("# EOF")
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path, openmetrics=False):
+        """
+        Write the metrics to a file, by default for node-exporter's textfile collector.
+
+        The file is written next to `path` and renamed into place, so the
+        collector never reads a half-written file.
+        """
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(self.render(openmetrics))
+        os.replace(tmp, path)
+
+    def push(self, gateway, job, instance=None, timeout=10):
+        """
+        Replace this job's metrics on a Prometheus Pushgateway (HTTP PUT).
+
+        `gateway` is the base URL, e.g. http://pushgateway:9091.
+        """
+        path = f"/metrics/job/{urllib.parse.quote(job, safe='')}"
+        if instance:
+            path += f"/instance/{urllib.parse.quote(instance, safe='')}"
+        request = urllib.request.Request(gateway.rstrip('/') + path, data=self.render().encode(), method='PUT',
+                                         headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
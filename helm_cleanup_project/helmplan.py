@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from helmexec import UninstallExecutor, print_summary, read_names, uninstall_commands
+from helmsnapshots import read_snapshot
+from helmstream import stream_helm_releases
+
+PLAN_VERSION = 1
+
+# One release to uninstall. `revision` is the revision the decision was made
+# on; `reason` says why it is in the plan (e.g. 'stale', 'failed', 'listed').
+PlanEntry = namedtuple('PlanEntry', 'name namespace revision reason')
+
+def write_plan(path, entries, source=None):
+    """
+    Write a deletion plan as compact JSON, atomically.
+
+    Releases are stored as rows of PlanEntry fields under 'releases', with
+    'version' checked by `read_plan` so an old tool never applies a plan it
+    does not understand.
+    """
+    plan = {
+        'version': PLAN_VERSION,
+        'created': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'source': source,
+        'fields': list(PlanEntry._fields),
+        'releases': [list(entry) for entry in entries],
+    }
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(plan, f, separators=(',', ':'))
+        f.write('\n')
+    os.replace(tmp, path)
+
+def read_plan(path):
+    """Return (plan metadata, [PlanEntry]) from a plan file. Raises ValueError for an unknown version."""
+    with open(path) as f:
+        plan = json.load(f)
+    if plan.get('version') != PLAN_VERSION or plan.get('fields') != list(PlanEntry._fields):
+        raise ValueError(f"{path}: unsupported plan version {plan.get('version')!r} (expected {PLAN_VERSION})")
+    return plan, [PlanEntry(*row) for row in plan.pop('releases')]
+
+def current_revisions(namespaces, helm='helm'):
+    """Return {(name, namespace): revision} for every release in `namespaces`, one helm list per namespace."""
+    revisions = {}
+    for namespace in namespaces:
+        for release in stream_helm_releases([helm, 'list', '--namespace', namespace, '--all', '--output', 'json']):
+            revisions[release['name'], namespace] = int(release['revision'])
+    return revisions
+
+def check_plan(entries, revisions):
+    """
+    Split plan entries into (still valid, [(entry, reason)] to skip).
+
+    An entry is skipped if its release is gone, or if it has a different
+    revision from the one the plan was made on (it was upgraded or rolled
+    back since, so the decision may no longer hold).
+    """
+    valid, skipped = [], []
+    for entry in entries:
+        revision = revisions.get((entry.name, entry.namespace))
+        if revision is None:
+            skipped.append((entry, "no longer installed"))
+        elif revision != entry.revision:
+            skipped.append((entry, f"revision changed ({entry.revision} -> {revision})"))
+        else:
+            valid.append(entry)
+    return valid, skipped
+
+def names_to_entries(names, namespace, inventory):
+    """Plan entries for listed release names, taking their revisions from an inventory snapshot."""
+    revisions = {(row['name'], row['namespace']): int(row['revision']) for row in inventory}
+    entries, missing = [], []
+    for name in dict.fromkeys(names):
+        revision = revisions.get((name, namespace))
+        if revision is None:
+            missing.append(name)
+        else:
+            entries.append(PlanEntry(name, namespace, revision, 'listed'))
+    return entries, missing
+
+def main():
+    parser = argparse.ArgumentParser(description="Write Helm deletion plans, and apply them later.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    plan_parser = commands.add_parser('plan', help="write a plan from release names and an inventory snapshot")
+    plan_parser.add_argument('plan', help="plan file to write")
+    plan_parser.add_argument('paths', nargs='*', help="files with one release name per line (default: stdin)")
+    plan_parser.add_argument('-n', '--namespace', default='default', help="namespace of the listed releases")
+    plan_parser.add_argument('--inventory', required=True, help="helmoutput CSV the revisions are taken from")
+
+    show_parser = commands.add_parser('show', help="print a plan's uninstall commands")
+    show_parser.add_argument('plan')
+    show_parser.add_argument('--batch-size', type=int, default=10, help="releases per helm uninstall call")
+
+    apply_parser = commands.add_parser('apply', help="uninstall the releases in a plan, after checking their revisions "
+                                                     "with one helm list per namespace in the plan")
+    apply_parser.add_argument('plan')
+    apply_parser.add_argument('--execute', action='store_true', help="actually run helm uninstall (default: dry run)")
+    apply_parser.add_argument('--no-verify', action='store_true',
+                              help="skip the revision check, and the helm list it runs for each namespace "
+                                   "in the plan")
+    apply_parser.add_argument('--batch-size', type=int, default=10, help="releases per helm uninstall call")
+    apply_parser.add_argument('--workers', type=int, default=8, help="maximum concurrent helm calls")
+    apply_parser.add_argument('--namespace-limit', type=int, default=4, help="maximum concurrent helm calls per namespace")
+    apply_parser.add_argument('--retries', type=int, default=2, help="retries per failed uninstall")
+    args = parser.parse_args()
+
+    if args.command == 'plan':
+        entries, missing = names_to_entries(read_names(args.paths), args.namespace, read_snapshot(args.inventory))
+        for name in missing:
+            print(f"Not in {args.inventory}, left out of the plan: {name}", file=sys.stderr)
+        write_plan(args.plan, entries, source=os.path.abspath(args.inventory))
+        print(f"Wrote {len(entries)} release(s) to {args.plan}")
+        return
+
+    plan, entries = read_plan(args.plan)
+    print(f"Plan {args.plan}: {len(entries)} release(s), created {plan['created']} from {plan['source']}")
+    if args.command == 'show':
+        for command in uninstall_commands([(entry.name, entry.namespace) for entry in entries], args.batch_size):
+            print(command)
+        return
+
+    # Verifying costs one full `helm list --all` per namespace in the plan,
+    # however few of its releases are planned; --no-verify skips it
+    if not args.no_verify:
+        try:
+            revisions = current_revisions(dict.fromkeys(entry.namespace for entry in entries))
+        except (subprocess.CalledProcessError, OSError) as e:
+            sys.exit(f"Could not list releases to verify the plan: {e}")
+        entries, skipped = check_plan(entries, revisions)
+        for entry, reason in skipped:
+            print(f"Skipping {entry.name} in namespace {entry.namespace}: {reason}")
+    releases = [(entry.name, entry.namespace) for entry in entries]
+    if not args.execute:
+        print(f"Dry run: {len(releases)} release(s) would be uninstalled. Pass --execute to uninstall them.")
+        for command in uninstall_commands(releases, args.batch_size):
+            print(command)
+        return
+    executor = UninstallExecutor(workers=args.workers, namespace_limit=args.namespace_limit,
+                                 retries=args.retries, batch_size=args.batch_size)
+    results = executor.run(releases)
+    print_summary(results)
+    sys.exit(0 if all(result.ok for result in results) else 1)
+
+if __name__ == "__main__":
+    main()
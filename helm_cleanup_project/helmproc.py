@@ -0,0 +1,84 @@
+import asyncio
+import codecs
+import subprocess
+import time
+from collections import namedtuple
+
+ProcessResult = namedtuple('ProcessResult', 'argv returncode stdout stderr seconds')
+
+class ProcessRunner:
+    """
+    Run external commands from asyncio, as argument vectors only.
+
+    No shell is ever involved, so release names and namespaces are passed to
+    helm as they are, never re-parsed. At most `limit` processes run at once
+    and each gets `timeout` seconds unless a call says otherwise. Failures
+    raise `subprocess.CalledProcessError` (with the captured stderr) and
+    timeouts `subprocess.TimeoutExpired`, as `subprocess.run(check=True)`
+    does, so callers handle them the same way as synchronous code.
+    """
+
+    def __init__(self, limit=8, timeout=60):
+        self.limit = asyncio.Semaphore(max(1, limit))
+        self.timeout = timeout
+
+    async def run(self, argv, timeout=None, check=True):
+        """Run a command to completion and return a ProcessResult with decoded stdout and stderr."""
+        timeout = timeout or self.timeout
+        async with self.limit:
+            start = time.monotonic()
+            process = await asyncio.create_subprocess_exec(*argv, stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.PIPE)
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise subprocess.TimeoutExpired(argv, timeout) from None
+        result = ProcessResult(argv, process.returncode, stdout.decode('utf-8'),
+                               stderr.decode('utf-8', 'replace'), time.monotonic() - start)
+        if check and result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, argv, result.stdout, result.stderr)
+        return result
+
+    async def stream(self, argv, timeout=None, chunk_size=65536):
+        """
+        Run a command and yield its stdout as text chunks while it runs.
+
+        stderr is collected on the side and attached to the
+        CalledProcessError raised if the command exits non-zero, after the
+        output has been consumed. If the consumer stops early, the process is
+        killed.
+        """
+        timeout = timeout or self.timeout
+        async with self.limit:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            process = await asyncio.create_subprocess_exec(*argv, stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.PIPE)
+            stderr = asyncio.ensure_future(process.stderr.read())
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            try:
+                while True:
+                    chunk = await asyncio.wait_for(process.stdout.read(chunk_size), deadline - loop.time())
+                    text = decoder.decode(chunk, final=not chunk)
+                    if text:
+                        yield text
+                    if not chunk:
+                        break
+                returncode = await asyncio.wait_for(process.wait(), max(0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                raise subprocess.TimeoutExpired(argv, timeout) from None
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                error_output = (await stderr).decode('utf-8', 'replace')
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, argv, stderr=error_output)
+
+def run_command(argv, timeout=60):
+    """Run one command from synchronous code and return its stdout; raises like `ProcessRunner.run`."""
+    async def run():
+        return await ProcessRunner(1, timeout).run(argv)
+    return asyncio.run(run()).stdout
@@ -0,0 +1,165 @@
+import argparse
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from helmstore import METADATA_ACCEPT, connect, list_release_secrets, secrets_path
+
+# One revision Secret of a release, and the payload bytes it stores.
+Revision = namedtuple('Revision', 'revision status bytes')
+
+# What pruning one release means: the revisions kept and those deleted.
+PrunePlan = namedtuple('PrunePlan', 'namespace name keep delete')
+
+# Outcome of pruning one release. `deleted` lists the revisions the API
+# server actually removed, which can be fewer than `plan.delete`; `error`
+# is None on success.
+PruneResult = namedtuple('PruneResult', 'plan deleted error')
+
+def secret_bytes(secret):
+    """Return the bytes a release Secret stores: its data values as the API server keeps them (base64)."""
+    return sum(len(value) for value in (secret.get('data') or {}).values())
+
+def release_histories(api, namespace=None, page_size=100):
+    """
+    Return {(namespace, release): [Revision, ...]} for every Helm release Secret.
+
+    Secrets are read whole, a page at a time, only to measure them; each
+    payload is dropped as soon as its size is known.
+    """
+    histories = {}
+    for secret in list_release_secrets(api, namespace, statuses=None, page_size=page_size, with_data=True):
+        metadata = secret['metadata']
+        labels = metadata.get('labels', {})
+        revision = Revision(int(labels.get('version') or 0), labels.get('status', ''), secret_bytes(secret))
+        histories.setdefault((metadata['namespace'], labels['name']), []).append(revision)
+    return histories
+
+def plan_prune(histories, max_history=10, keep=5):
+    """
+    Return a PrunePlan for each release with more than `max_history` revisions.
+
+    The `keep` newest revisions (at least one) and every deployed revision are
+    kept, whatever their age; all other revisions are deleted.
+    """
+    keep = max(1, keep)
+    plans = []
+    for (namespace, name), revisions in sorted(histories.items()):
+        if len(revisions) <= max_history:
+            continue
+        revisions = sorted(revisions, key=lambda r: r.revision, reverse=True)
+        kept = [r for i, r in enumerate(revisions) if i < keep or r.status == 'deployed']
+        deleted = [r for i, r in enumerate(revisions) if not (i < keep or r.status == 'deployed')]
+        if deleted:
+            plans.append(PrunePlan(namespace, name, kept, deleted))
+    return plans
+
+def _versions(items):
+    return {int(item['metadata'].get('labels', {}).get('version') or 0) for item in items}
+
+def delete_revisions(api, plan, batch_size=50):
+    """
+    Delete a plan's revision Secrets, one delete-collection call per `batch_size` revisions.
+
+    Each call selects the release's Secrets by label, so it needs the
+    `deletecollection` verb on secrets. The selector also excludes deployed
+    revisions, so a release that was rolled back since it was planned keeps
+    its live revision. Only the revisions the server reports as deleted are
+    counted; if it answers with a Status instead of the deleted list, the
+    batch's revisions are listed again to see which are gone. Returns a
+    PruneResult.
+    """
+    deleted = []
+    for start in range(0, len(plan.delete), batch_size):
+        batch = plan.delete[start:start + batch_size]
+        versions = f"version in ({','.join(str(r.revision) for r in batch)})"
+        release = f"owner=helm,name={plan.name}"
+        try:
+            response = api.delete(secrets_path(plan.namespace),
+                                  {'labelSelector': f"{release},status!=deployed,{versions}"})
+            if 'items' in response:
+                gone = _versions(response['items'])
+            else:
+                left = api.get(secrets_path(plan.namespace), {'labelSelector': f"{release},{versions}"},
+                               accept=METADATA_ACCEPT)
+                gone = {r.revision for r in batch} - _versions(left.get('items', []))
+        except OSError as e:
+            return PruneResult(plan, deleted, str(e))
+        deleted.extend(r for r in batch if r.revision in gone)
+    return PruneResult(plan, deleted, None)
+
+def prune(api, plans, execute=False, workers=4, batch_size=50):
+    """
+    Prune every plan, up to `workers` releases at once, and return a PruneResult per plan.
+
+    Without `execute`, nothing is deleted and each result reports what would be.
+    """
+    if not execute:
+        return [PruneResult(plan, plan.delete, None) for plan in plans]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(lambda plan: delete_revisions(api, plan, batch_size), plans))
+
+def _size(count):
+    for unit in ('B', 'KiB', 'MiB'):
+        if count < 1024:
+            return f"{count:.0f} {unit}" if unit == 'B' else f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.1f} GiB"
+
+def print_report(results, out=sys.stdout):
+    """Print revisions and stored bytes per release before and after pruning, largest first, with totals."""
+    out.write(f"{'namespace':<20} {'release':<40} {'revisions':>15} {'before':>11} {'after':>11}\n")
+    total_before = total_after = total_revisions = total_deleted = 0
+    rows = []
+    for result in results:
+        plan = result.plan
+        before = sum(r.bytes for r in plan.keep) + sum(r.bytes for r in plan.delete)
+        after = before - sum(r.bytes for r in result.deleted)
+        revisions = len(plan.keep) + len(plan.delete)
+        rows.append((before, plan, revisions, after, result))
+        total_before += before
+        total_after += after
+        total_revisions += revisions
+        total_deleted += len(result.deleted)
+    for before, plan, revisions, after, result in sorted(rows, key=lambda row: row[0], reverse=True):
+        counts = f"{revisions} -> {revisions - len(result.deleted)}"
+        line = f"{plan.namespace:<20} {plan.name:<40} {counts:>15} {_size(before):>11} {_size(after):>11}"
+        if result.error:
+            line += f"  FAILED: {result.error}"
+        out.write(line + "\n")
+    counts = f"{total_revisions} -> {total_revisions - total_deleted}"
+    out.write(f"{'total':<20} {f'{len(rows)} release(s)':<40} {counts:>15} {_size(total_before):>11} "
+              f"{_size(total_after):>11}\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete old Helm revision Secrets from releases with long histories.")
+    parser.add_argument('--api-server', help="API server URL, e.g. http://127.0.0.1:8001 from `kubectl proxy` (default: in-cluster)")
+    parser.add_argument('--token', default=os.environ.get('KUBE_TOKEN'), help="bearer token (default: $KUBE_TOKEN)")
+    parser.add_argument('--ca-file', help="CA bundle for the API server certificate")
+    parser.add_argument('-n', '--namespace', help="namespace to prune (default: all namespaces)")
+    parser.add_argument('--max-history', type=int, default=10,
+                        help="prune releases with more revisions than this (default: 10)")
+    parser.add_argument('--keep', type=int, default=5,
+                        help="newest revisions to keep, besides the deployed one (default: 5)")
+    parser.add_argument('--batch-size', type=int, default=50, help="revisions per delete call")
+    parser.add_argument('--workers', type=int, default=4, help="releases pruned at once")
+    parser.add_argument('--page-size', type=int, default=100, help="Secrets per list request")
+    parser.add_argument('--execute', action='store_true', help="actually delete revisions (default: dry run)")
+    args = parser.parse_args()
+
+    api = connect(args.api_server, args.token, args.ca_file)
+    plans = plan_prune(release_histories(api, args.namespace, args.page_size), args.max_history, args.keep)
+    if not plans:
+        print(f"No release has more than {args.max_history} revisions to prune.")
+        return
+    results = prune(api, plans, args.execute, args.workers, args.batch_size)
+    print_report(results)
+    if not args.execute and plans:
+        print(f"Dry run: {sum(len(plan.delete) for plan in plans)} revision(s) would be deleted. "
+              "Pass --execute to delete them.")
+    if any(result.error for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import csv
+import os
+import sys
+import time
+
+from helmcache import DEFAULT_TTL, get_inventory, invalidate, inventory_key
+from helmclean import uninstall_releases
+from helmdates import parse_helm_time
+from helmexec import read_names
+
+# The hand-curated list this tool was written for
+DELETELIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'helmdel', 'delhelm', 'deletelist')
+
+# Releases in these states are already on their way out
+GONE_STATUSES = ('uninstalled', 'uninstalling')
+
+# `helm uninstall` options a pasted command may carry that do not change which
+# releases it names: switches, and options followed by a value
+UNINSTALL_SWITCHES = ('--dry-run', '--wait', '--keep-history', '--no-hooks', '--ignore-not-found', '--debug')
+UNINSTALL_OPTIONS = ('--timeout', '--cascade', '--description', '--burst-limit', '--qps')
+
+def parse_entry(line, namespace='default'):
+    """
+    Return the (name, namespace) pairs named by one deletelist line.
+
+    A line is a release name, optionally written 'namespace/name', or a
+    pasted uninstall command: either `helm uninstall "name","namespace",...`
+    (a row of helmoutput CSV, as delhelm.sh takes) or
+    `helm uninstall a b -n namespace` (as newdel.py prints, `hel` included;
+    `-n=namespace`, `-nnamespace` and `--namespace=namespace` work too).
+    Names without a namespace are in `namespace`. Other uninstall options,
+    such as --wait or --timeout 5m, are skipped along with their values;
+    any other option (--kube-context among them, as it would point at
+    another cluster than the inventory) raises ValueError.
+    """
+    words = line.split(None, 2)
+    if len(words) > 1 and words[0] in ('helm', 'hel') and words[1] == 'uninstall':
+        rest = words[2] if len(words) > 2 else ''
+        if rest.startswith('"'):
+            row = next(csv.reader([rest]))
+            return [(row[0], row[1] if len(row) > 1 and row[1] else namespace)]
+        names = []
+        words = iter(rest.split())
+        for word in words:
+            if word in ('-n', '--namespace'):
+                namespace = next(words, namespace)
+            elif word.startswith(('-n=', '--namespace=')):
+                namespace = word.partition('=')[2]
+            elif word.startswith('-n'):
+                namespace = word[2:]
+            elif word in UNINSTALL_SWITCHES or word.startswith(tuple(f"{option}=" for option in UNINSTALL_OPTIONS)):
+                continue
+            elif word in UNINSTALL_OPTIONS:
+                next(words, None)
+            elif word.startswith('-'):
+                raise ValueError(f"unsupported option '{word}' in '{line}'")
+            else:
+                names.append(word)
+        return [(name, namespace) for name in names]
+    prefix, _, name = line.rpartition('/')
+    return [(name, prefix or namespace)]
+
+def read_deletelist(paths, namespace='default'):
+    """
+    Read deletelist files (or stdin) into unique (name, namespace) pairs.
+
+    Returns (entries in first-seen order, number of duplicate lines dropped).
+    """
+    entries = {}
+    listed = 0
+    for line in read_names(paths):
+        for entry in parse_entry(line, namespace):
+            listed += 1
+            entries[entry] = None
+    return list(entries), listed - len(entries)
+
+def reconcile(entries, inventory):
+    """
+    Join deletelist entries against one inventory snapshot.
+
+    The inventory is indexed once by (name, namespace), so each entry costs a
+    dict lookup rather than a `helm status` call. Returns (present, missing):
+    `present` pairs each surviving entry with its release dict, and
+    `missing` lists the entries no longer installed, including releases
+    that are uninstalled or being uninstalled; both keep list order.
+    """
+    installed = {(release['name'], release['namespace']): release for release in inventory}
+    present, missing = [], []
+    for entry in entries:
+        release = installed.get(entry)
+        if release is None or release.get('status') in GONE_STATUSES:
+            missing.append(entry)
+        else:
+            present.append((entry, release))
+    return present, missing
+
+def age_days(release, now):
+    """Return a release's age in whole days from its `updated` time, or None if it cannot be parsed."""
+    try:
+        return (now - parse_helm_time(release.get('updated', ''))) // 86400
+    except ValueError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check a list of Helm releases against the cluster and uninstall the ones still there.")
+    parser.add_argument('paths', nargs='*', default=[DELETELIST],
+                        help="deletelist files, '-' for stdin (default: helmdel/delhelm/deletelist)")
+    parser.add_argument('-n', '--namespace', default='default', help="namespace of names listed without one")
+    parser.add_argument('--source', choices=['helm', 'api'], default='helm', help="where to read the release inventory from")
+    parser.add_argument('--api-server', help="API server URL for --source api (default: in-cluster)")
+    parser.add_argument('--cache-ttl', type=int, default=DEFAULT_TTL,
+                        help=f"on a dry run, reuse a cached inventory up to this many seconds old "
+                             f"(default: {DEFAULT_TTL}); --execute always lists releases again")
+    parser.add_argument('--no-cache', action='store_true', help="always list releases, refreshing the shared cache")
+    parser.add_argument('--execute', action='store_true', help="actually run helm uninstall (default: dry run)")
+    parser.add_argument('--workers', type=int, default=8, help="maximum concurrent uninstalls")
+    parser.add_argument('--namespace-limit', type=int, default=4, help="maximum concurrent uninstalls per namespace")
+    parser.add_argument('--retries', type=int, default=2, help="retries per failed uninstall")
+    parser.add_argument('--batch-size', type=int, default=10, help="releases per helm uninstall call")
+    args = parser.parse_args()
+
+    try:
+        entries, duplicates = read_deletelist(args.paths, args.namespace)
+    except ValueError as e:
+        raise SystemExit(f"Cannot read the deletelist: {e}")
+    # One listing covers the whole list: its namespace, or every namespace if it names several
+    namespaces = {namespace for _, namespace in entries}
+    scope = namespaces.pop() if len(namespaces) == 1 else None
+    # Only a dry run may reconcile against a cached listing
+    inventory = get_inventory(args.source, scope, api_server=args.api_server,
+                              ttl=0 if args.no_cache or args.execute else args.cache_ttl)
+    present, missing = reconcile(entries, inventory)
+
+    now = int(time.time())
+    for (name, namespace), release in present:
+        age = age_days(release, now)
+        age = 'unknown age' if age is None else f"{age} days old"
+        print(f"Uninstalling {name} in namespace {namespace} ({release.get('status', 'unknown')}, {age})")
+    for name, namespace in missing:
+        print(f"Not installed, nothing to do: {name} in namespace {namespace}")
+    print(f"{len(entries) + duplicates} listed, {duplicates} duplicate(s), {len(missing)} no longer installed, "
+          f"{len(present)} to uninstall")
+
+    results = uninstall_releases([entry for entry, _ in present], execute=args.execute, workers=args.workers,
+                                 namespace_limit=args.namespace_limit, retries=args.retries,
+                                 batch_size=args.batch_size)
+    if results:
+        # The cached inventory no longer matches the cluster
+        invalidate(*inventory_key(args.source, scope, api_server=args.api_server))
+    sys.exit(0 if all(result.ok for result in results) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import sys
+from collections import namedtuple
+
+# One release, reduced to what the retention passes look at. `epoch` is the
+# parsed `updated` time in seconds and `key` the interned group key, both
+# computed once when the record is built.
+ReleaseRecord = namedtuple('ReleaseRecord', 'name namespace status revision epoch base_name key')
+
+def group_key(base_name, namespace):
+    """Return the interned `base__namespace` key used to group releases."""
+    return sys.intern(f"{base_name}__{namespace}")
+
+def make_record(release, base_name_of, parse_time):
+    """
+    Build a `ReleaseRecord` from a `helm list` release dict.
+
+    `base_name_of` maps a release name to its group base name and `parse_time`
+    maps the `updated` string to epoch seconds (0 if it cannot be parsed).
+    """
+    name = release['name']
+    namespace = sys.intern(release['namespace'])
+    base_name = base_name_of(name)
+    return ReleaseRecord(name, namespace, sys.intern(release['status']), int(release.get('revision') or 0),
+                         parse_time(release['updated']), base_name, group_key(base_name, namespace))
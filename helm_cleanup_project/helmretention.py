@@ -0,0 +1,160 @@
+import fnmatch
+import heapq
+import os
+from collections import namedtuple
+
+# keep: how many of the newest releases of each group to keep (0 for none).
+# newer_than_days: also keep every release younger than this many days (None: off).
+# highest_revision: also keep the release with the highest revision in the group.
+Policy = namedtuple('Policy', 'keep newer_than_days highest_revision')
+
+DEFAULT_POLICY = Policy(1, None, False)
+
+# Per-namespace policies shared by the cleanup tools
+RETENTION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'helmretention.conf')
+
+def parse_policy(options, where='policy'):
+    """Parse 'keep=2 newer-than=14 highest-revision' into a Policy."""
+    keep, newer_than_days, highest_revision = DEFAULT_POLICY
+    for option in options.split():
+        name, _, value = option.partition('=')
+        try:
+            if name == 'keep':
+                keep = int(value)
+                if keep < 0:
+                    raise ValueError
+            elif name == 'newer-than':
+                newer_than_days = int(value)
+            elif name == 'highest-revision' and not value:
+                highest_revision = True
+            else:
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"{where}: bad option '{option}' (expected keep=<N>, newer-than=<days> "
+                             "or highest-revision)") from None
+    return Policy(keep, newer_than_days, highest_revision)
+
+class RetentionPolicies:
+    """
+    Retention policies by namespace: the first entry whose glob matches wins.
+
+    Namespaces matching no entry get `default`. Lookups are cached, since a
+    fleet has far fewer namespaces than releases.
+    """
+
+    def __init__(self, entries=(), default=DEFAULT_POLICY):
+        self.entries = list(entries)  # (namespace glob, Policy)
+        self.default = default
+        self._cache = {}
+
+    @classmethod
+    def load(cls, path=RETENTION_FILE):
+        """
+        Read policies from a file of `<namespace glob> <options>` lines.
+
+        Options are keep=<N>, newer-than=<days> and highest-revision. Blank
+        lines and lines starting with '#' are ignored.
+        """
+        entries = []
+        with open(path) as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                pattern, _, options = line.partition(' ')
+                entries.append((pattern, parse_policy(options, f"{path}:{number}")))
+        return cls(entries)
+
+    def uniform(self):
+        """Return the policy if every namespace gets the same one, else None."""
+        policies = {policy for _, policy in self.entries}
+        if not self.entries or self.entries[-1][0] != '*':
+            policies.add(self.default)
+        return policies.pop() if len(policies) == 1 else None
+
+    def for_namespace(self, namespace):
+        policy = self._cache.get(namespace)
+        if policy is None:
+            policy = next((policy for pattern, policy in self.entries if fnmatch.fnmatchcase(namespace, pattern)),
+                          self.default)
+            self._cache[namespace] = policy
+        return policy
+
+class _Group:
+    __slots__ = ('policy', 'items', 'newest', 'highest', 'young')
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.items = []  # (seq, epoch, item), in arrival order
+        self.newest = []  # min-heap of at most policy.keep (epoch, -seq)
+        self.highest = None  # (revision, -seq) of the highest revision so far
+        self.young = set()
+
+class RetentionSelector:
+    """
+    Decide which releases of each group a policy keeps, in one pass.
+
+    Releases are added one at a time. Each group keeps a min-heap of at most
+    `keep` (epoch, arrival) pairs, so finding the N newest costs O(log N) per
+    release instead of a sort of the whole group; the highest revision and
+    the age cutoff are tracked as releases arrive. Among releases updated at
+    the same time, the one added first counts as the newer, as with a stable
+    newest-first sort. With `keep_ties`, every release updated at the same
+    time as the Nth newest is kept too, so keep=1 keeps all releases tied at
+    the group's newest time.
+    """
+
+    def __init__(self, policies, now, keep_ties=False):
+        self.policies = policies
+        self.now = now
+        self.keep_ties = keep_ties
+        self.groups = {}
+
+    def add(self, group, namespace, epoch, revision, item):
+        state = self.groups.get(group)
+        if state is None:
+            state = self.groups[group] = _Group(self.policies.for_namespace(namespace))
+        policy = state.policy
+        seq = len(state.items)
+        state.items.append((seq, epoch, item))
+        if policy.keep:
+            entry = (epoch, -seq)
+            if len(state.newest) < policy.keep:
+                heapq.heappush(state.newest, entry)
+            elif entry > state.newest[0]:
+                heapq.heapreplace(state.newest, entry)
+        if policy.highest_revision and (state.highest is None or (revision, -seq) > state.highest):
+            state.highest = (revision, -seq)
+        if policy.newer_than_days is not None and self.now - epoch < policy.newer_than_days * 86400:
+            state.young.add(seq)
+
+    def count(self, group):
+        """Return how many releases have been added to `group`."""
+        return len(self.groups[group].items)
+
+    def decisions(self, group):
+        """
+        Yield (item, reason) for every release of `group`, in the order added.
+
+        `reason` says why the release is kept: 'latest' (among the N newest),
+        'young' (newer than the cutoff) or 'revision' (highest revision); it
+        is None for a release the policy does not keep.
+        """
+        state = self.groups[group]
+        newest = {-seq for _, seq in state.newest}
+        # The heap's root is the Nth newest time (or the oldest, with fewer releases)
+        cutoff = state.newest[0][0] if self.keep_ties and state.newest else None
+        highest = -state.highest[1] if state.highest else None
+        for seq, epoch, item in state.items:
+            if seq in newest or cutoff is not None and epoch >= cutoff:
+                yield item, 'latest'
+            elif seq in state.young:
+                yield item, 'young'
+            elif seq == highest:
+                yield item, 'revision'
+            else:
+                yield item, None
+
+    def removable(self, group):
+        """Return the items of `group` the policy does not keep, in the order added."""
+        return [item for item, reason in self.decisions(group) if reason is None]
@@ -0,0 +1,145 @@
+import fnmatch
+import re
+import sys
+from collections import Counter, namedtuple
+
+# action: 'protect' (never uninstall) or 'exclude' (leave out of grouping and
+# age-based cleanup; failed releases are still reported).
+# kind: one of RULE_KINDS. line: where the rule came from, for reports.
+Rule = namedtuple('Rule', 'action kind pattern line')
+
+ACTIONS = ('protect', 'exclude')
+RULE_KINDS = ('name', 'prefix', 'glob', 'regex', 'namespace', 'chart')
+
+# Inline flags at the start of a pattern, e.g. '(?i)'
+_LEADING_FLAGS = re.compile(r'\(\?([aiLmsux]+)\)')
+# A numbered backreference (\1) or numbered conditional ((?(1)...)); an
+# escaped backslash is matched first so '\\1' is not mistaken for one.
+_NUMBERED_REF = re.compile(r'\\(?:\\|([1-9]))|\(\?\((\d+)\)')
+
+def _user_regex(rule):
+    """
+    Validate a regex rule on its own and return it ready to join an alternation.
+
+    Leading inline flags such as '(?i)' only work at the very start of a
+    whole pattern, so they are rewritten as a scoped group '(?i:...)'.
+    Numbered backreferences would point at the wrong group once the rules
+    are joined, so they are rejected; use a named group and (?P=name).
+    """
+    try:
+        re.compile(rule.pattern)
+    except re.error as e:
+        raise ValueError(f"{rule.line}: bad regex {rule.pattern!r}: {e}") from None
+    for m in _NUMBERED_REF.finditer(rule.pattern):
+        if m.group(1) or m.group(2):
+            raise ValueError(f"{rule.line}: numbered group reference {m.group(0)!r} in {rule.pattern!r} is not "
+                             "supported; use a named group and (?P=name)")
+    pattern, flags = rule.pattern, ''
+    while True:
+        m = _LEADING_FLAGS.match(pattern)
+        if not m:
+            break
+        flags += m.group(1)
+        pattern = pattern[m.end():]
+    if flags:
+        # A verbose-mode comment would swallow the closing parenthesis
+        pattern = f"(?{flags}:{pattern}\n)" if 'x' in flags else f"(?{flags}:{pattern})"
+    return pattern
+
+def _rule_regex(rule):
+    """Translate one rule into a regex anchored to match the whole field."""
+    if rule.kind == 'name':
+        return re.escape(rule.pattern) + r'\Z'
+    if rule.kind == 'prefix':
+        # Dash-segment prefix: 'raft-ship' matches raft-ship and raft-ship-ext-consumer,
+        # but not raft-shipping.
+        return re.escape(rule.pattern) + r'(?:-.*)?\Z'
+    if rule.kind == 'regex':
+        return f".*?(?:{_user_regex(rule)})"
+    # glob, namespace and chart patterns are shell-style globs
+    return fnmatch.translate(rule.pattern)
+
+def _field(rule):
+    return rule.kind if rule.kind in ('namespace', 'chart') else 'name'
+
+class RuleSet:
+    """
+    Protect/exclude rules compiled into one regex per (action, field).
+
+    All rules for an action that look at the same field (release name,
+    namespace or chart) are joined into a single alternation, so checking a
+    release costs one regex match per field however many rules there are. Each
+    alternative is a named group, so the matching rule is known without
+    re-testing, and `hits` counts how often each rule matched.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.hits = Counter()
+        self._compiled = {}
+        for action in ACTIONS:
+            for field in ('name', 'namespace', 'chart'):
+                alternatives = [f"(?P<r{i}>{_rule_regex(rule)})" for i, rule in enumerate(self.rules)
+                                if rule.action == action and _field(rule) == field]
+                if not alternatives:
+                    continue
+                try:
+                    self._compiled[action, field] = re.compile('|'.join(alternatives), re.DOTALL)
+                except re.error as e:
+                    # e.g. two regex rules defining the same group name
+                    raise ValueError(f"[{action}] rules on {field} cannot be combined: {e}") from None
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read rules from a file of `[protect]` / `[exclude]` sections.
+
+        Each line in a section is `<kind> <pattern>`, where kind is one of
+        name, prefix, glob, regex, namespace or chart. Blank lines and lines
+        starting with '#' are ignored.
+        """
+        rules = []
+        action = None
+        with open(path) as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                where = f"{path}:{number}"
+                if line.startswith('[') and line.endswith(']'):
+                    action = line[1:-1].strip()
+                    if action not in ACTIONS:
+                        raise ValueError(f"{where}: unknown section [{action}]")
+                    continue
+                kind, _, pattern = line.partition(' ')
+                pattern = pattern.strip()
+                if action is None:
+                    raise ValueError(f"{where}: rule outside a [protect] or [exclude] section")
+                if kind not in RULE_KINDS or not pattern:
+                    raise ValueError(f"{where}: expected '<kind> <pattern>' with kind one of {', '.join(RULE_KINDS)}")
+                rules.append(Rule(action, kind, pattern, where))
+        return cls(rules)
+
+    def match(self, action, name, namespace='', chart=''):
+        """Return the first `action` rule matching the release, or None. Counts the hit."""
+        for field, value in (('name', name), ('namespace', namespace), ('chart', chart)):
+            pattern = self._compiled.get((action, field))
+            if pattern is None:
+                continue
+            m = pattern.match(value)
+            if m:
+                rule = self.rules[int(m.lastgroup[1:])]
+                self.hits[rule] += 1
+                return rule
+        return None
+
+    def is_protected(self, name, namespace='', chart=''):
+        return self.match('protect', name, namespace, chart) is not None
+
+    def is_excluded(self, name, namespace='', chart=''):
+        return self.match('exclude', name, namespace, chart) is not None
+
+    def report(self, out=sys.stdout):
+        """Print how many releases each rule matched, in file order."""
+        for rule in self.rules:
+            out.write(f"{self.hits[rule]:>6}  {rule.action:<8} {rule.kind:<9} {rule.pattern}  ({rule.line})\n")
@@ -0,0 +1,86 @@
+import csv
+import glob
+import json
+import os
+import re
+
+SNAPSHOT_FIELDS = ["name", "namespace", "revision", "updated", "status", "chart", "app_version"]
+
+# helmoutputYYYYMMDD.csv, as written by newdel.py
+_DATED_SNAPSHOT = re.compile(r'helmoutput(\d{8})\.csv$')
+
+def write_snapshot_csv(releases, out):
+    """
+    Write `helm list` release dicts to `out` as a helmoutput CSV.
+
+    The output matches what `jq -r '... | @csv'` produced before: every
+    field quoted, missing fields empty, '\n' line endings.
+    """
+    writer = csv.writer(out, quoting=csv.QUOTE_ALL, lineterminator='\n')
+    writer.writerow(SNAPSHOT_FIELDS)
+    for release in releases:
+        writer.writerow([release.get(field, '') for field in SNAPSHOT_FIELDS])
+
+def snapshot_key(row):
+    return row['namespace'], row['name']
+
+def read_snapshot(path):
+    """Read a helmoutput CSV and return its rows sorted by (namespace, name)."""
+    with open(path, newline='') as f:
+        return sorted(csv.DictReader(f), key=snapshot_key)
+
+def diff_snapshots(old_rows, new_rows):
+    """
+    Sort-merge two snapshots and yield (change, old_row, new_row).
+
+    Both inputs must be sorted by (namespace, name), as `read_snapshot`
+    returns them. `change` is 'added', 'removed', 'changed' (revision, updated
+    or status differ) or 'same'; the missing side is None.
+    """
+    old_iter, new_iter = iter(old_rows), iter(new_rows)
+    old = next(old_iter, None)
+    new = next(new_iter, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and snapshot_key(old) < snapshot_key(new)):
+            yield 'removed', old, None
+            old = next(old_iter, None)
+        elif old is None or snapshot_key(new) < snapshot_key(old):
+            yield 'added', None, new
+            new = next(new_iter, None)
+        else:
+            same = all(old[field] == new[field] for field in ('revision', 'updated', 'status'))
+            yield ('same' if same else 'changed'), old, new
+            old = next(old_iter, None)
+            new = next(new_iter, None)
+
+def snapshot_date(path):
+    """Return the YYYYMMDD date in a dated snapshot's file name, or None."""
+    m = _DATED_SNAPSHOT.search(os.path.basename(path))
+    return m.group(1) if m else None
+
+def previous_snapshot(path):
+    """Return the newest dated helmoutput snapshot next to `path` that is older than it, or None."""
+    current = snapshot_date(path)
+    older = [candidate for candidate in glob.glob(os.path.join(os.path.dirname(path) or '.', 'helmoutput*.csv'))
+             if snapshot_date(candidate) and (current is None or snapshot_date(candidate) < current)]
+    return max(older, key=snapshot_date) if older else None
+
+def state_path(snapshot):
+    """Where the decisions made for a snapshot are stored."""
+    return os.path.splitext(snapshot)[0] + '.decisions.json'
+
+def load_state(snapshot):
+    """Return the decisions saved for `snapshot`, or None if there are none."""
+    try:
+        with open(state_path(snapshot)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_state(snapshot, state):
+    """Write the decisions for `snapshot` atomically."""
+    path = state_path(snapshot)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
@@ -0,0 +1,163 @@
+import argparse
+import sys
+from collections import defaultdict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from helmexec import UninstallExecutor, print_summary, read_names, uninstall_commands
+from helmgroups import GroupingEngine
+from helmsnapshots import read_snapshot
+
+# Stack members are torn down tier by tier: whatever serves traffic first,
+# then the app itself, and the stores it writes to last, so nothing is left
+# running against a database that has already gone.
+FRONTEND_SUFFIXES = {'fe', 'frontend', 'unleash-proxy'}
+DATA_SUFFIXES = {'db', 'db-be', 'db-email', 'elasticsearch', 'rabbitmq', 'redis'}
+TIERS = ('frontend', 'app', 'data')
+
+# stages: [(tier, [names])] in deletion order; each stage waits for the one before it.
+StackPlan = namedtuple('StackPlan', 'root namespace stages')
+
+def tier_of(root, name):
+    """Return the tier of a stack member from the suffix it adds to the stack root."""
+    suffix = name[len(root) + 1:]
+    if suffix in FRONTEND_SUFFIXES:
+        return 'frontend'
+    if suffix in DATA_SUFFIXES:
+        return 'data'
+    return 'app'
+
+def plan_stacks(releases):
+    """
+    Turn (name, namespace) pairs into one StackPlan per stack.
+
+    Releases are grouped into stacks per namespace with the 'stack' grouping
+    rule, e.g. vector-backend-bl-dhtr3n with its -frontend, -audit, -db,
+    -rabbitmq and -redis members. A release that is not part of a stack is a
+    stack of its own with a single stage. Plans come back in input order.
+    """
+    by_namespace = defaultdict(dict)
+    for name, namespace in releases:
+        by_namespace[namespace][name] = None
+    plans = []
+    for namespace, names in by_namespace.items():
+        engine = GroupingEngine('stack').add_all(names)
+        members = defaultdict(list)
+        for name in names:
+            members[engine.group(name)[1]].append(name)
+        for root, stack in members.items():
+            tiers = defaultdict(list)
+            for name in stack:
+                tiers[tier_of(root, name)].append(name)
+            plans.append(StackPlan(root, namespace, [(tier, tiers[tier]) for tier in TIERS if tier in tiers]))
+    return plans
+
+def expand_stacks(releases, inventory):
+    """
+    Widen (name, namespace) pairs to every member of their stacks in `inventory`.
+
+    `inventory` is a list of snapshot rows (see helmsnapshots.read_snapshot).
+    A stack's root release is only included if it was listed itself, so
+    tearing down a preview's -db never takes the root with it unasked. Names
+    missing from the inventory are kept as they are.
+    """
+    engines = defaultdict(lambda: GroupingEngine('stack'))
+    for row in inventory:
+        engines[row['namespace']].add(row['name'])
+    listed = set(releases)
+    wanted = {(namespace, engines[namespace].group(name)[1]) for name, namespace in releases}
+    expanded = []
+    for row in inventory:
+        release = (row['name'], row['namespace'])
+        root = engines[row['namespace']].group(row['name'])[1]
+        if (row['namespace'], root) in wanted and (row['name'] != root or release in listed):
+            expanded.append(release)
+    known = set(expanded)
+    return expanded + [release for release in releases if release not in known]
+
+def print_plan(plans, batch_size, out=sys.stdout):
+    """Print the helm uninstall commands of each stack, stage by stage."""
+    for plan in plans:
+        total = sum(len(names) for _, names in plan.stages)
+        out.write(f"Stack {plan.root} ({plan.namespace}): {total} release(s)\n")
+        for number, (tier, names) in enumerate(plan.stages, 1):
+            for command in uninstall_commands([(name, plan.namespace) for name in names], batch_size):
+                out.write(f"  {number}. {tier}: {command}\n")
+
+def run_stacks(plans, executor, parallel=8):
+    """
+    Tear down every planned stack, running independent stacks in parallel.
+
+    A stage's releases are split into `executor.batch_size` batches that run
+    concurrently; the next stage of that stack starts only when all of them
+    are done. If any release in a stage fails, the rest of that stack is not
+    attempted and is reported as skipped. At most `parallel` batches run at
+    once (the executor still caps each namespace). Returns every
+    UninstallResult, in completion order.
+    """
+    executor.expect(sum(len(names) for plan in plans for _, names in plan.stages))
+    results = []
+    # index of a plan -> [stage, batches still running, stage ok so far]
+    state = {}
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as pool:
+        pending = {}
+
+        def start(index, stage):
+            plan = plans[index]
+            names = plan.stages[stage][1]
+            batches = [names[i:i + executor.batch_size] for i in range(0, len(names), executor.batch_size)]
+            state[index] = [stage, len(batches), True]
+            for batch in batches:
+                pending[pool.submit(executor.uninstall_now, plan.namespace, batch)] = index
+
+        for index in range(len(plans)):
+            start(index, 0)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                batch_results = future.result()
+                results.extend(batch_results)
+                progress = state[index]
+                progress[1] -= 1
+                progress[2] = progress[2] and all(result.ok for result in batch_results)
+                if progress[1]:
+                    continue
+                plan, stage = plans[index], progress[0]
+                if not progress[2]:
+                    tier = plan.stages[stage][0]
+                    for _, names in plan.stages[stage + 1:]:
+                        for name in names:
+                            results.append(executor.skip(name, plan.namespace,
+                                                         f"skipped: {tier} tier of {plan.root} failed"))
+                elif stage + 1 < len(plan.stages):
+                    start(index, stage + 1)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Uninstall Helm releases stack by stack: app tiers first, data tiers last.")
+    parser.add_argument('paths', nargs='*', help="files with one release name per line (default: stdin)")
+    parser.add_argument('-n', '--namespace', default='default', help="namespace of the listed releases")
+    parser.add_argument('--inventory',
+                        help="helmoutput CSV; also tear down the other members (not the root) of each listed release's stack")
+    parser.add_argument('--execute', action='store_true', help="actually run helm uninstall (default: print the plan)")
+    parser.add_argument('--batch-size', type=int, default=10, help="releases per helm uninstall call")
+    parser.add_argument('--workers', type=int, default=8, help="maximum concurrent helm calls")
+    parser.add_argument('--namespace-limit', type=int, default=4, help="maximum concurrent helm calls per namespace")
+    parser.add_argument('--retries', type=int, default=2, help="retries per failed uninstall")
+    args = parser.parse_args()
+
+    releases = [(name, args.namespace) for name in read_names(args.paths)]
+    if args.inventory:
+        releases = expand_stacks(releases, read_snapshot(args.inventory))
+    plans = plan_stacks(releases)
+    if not args.execute:
+        print_plan(plans, args.batch_size)
+        return
+    executor = UninstallExecutor(workers=args.workers, namespace_limit=args.namespace_limit,
+                                 retries=args.retries, batch_size=args.batch_size)
+    results = run_stacks(plans, executor, parallel=args.workers)
+    print_summary(results)
+    sys.exit(0 if all(result.ok for result in results) else 1)
+
+if __name__ == "__main__":
+    main()
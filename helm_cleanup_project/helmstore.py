@@ -0,0 +1,220 @@
+import argparse
+import base64
+import gzip
+import json
+import os
+import ssl
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+
+SERVICE_ACCOUNT_DIR = '/var/run/secrets/kubernetes.io/serviceaccount'
+
+# Statuses a release's newest revision can have. Older revisions are
+# 'superseded', so selecting on these skips the bulk of the history.
+LATEST_STATUSES = ('deployed', 'failed', 'pending-install', 'pending-upgrade', 'pending-rollback', 'uninstalling')
+
+# Ask for metadata only; helm keeps everything the retention passes need in
+# the labels, so the (large, gzipped) release payload never leaves the server.
+METADATA_ACCEPT = 'application/json;as=PartialObjectMetadataList;g=meta.k8s.io;v=v1,application/json'
+# The same for a watch, whose events carry one object each
+METADATA_WATCH_ACCEPT = 'application/json;as=PartialObjectMetadata;g=meta.k8s.io;v=v1,application/json'
+
+class WatchError(Exception):
+    """A watch ended with an error event, e.g. 410 Gone when its resourceVersion is too old; list again."""
+
+    def __init__(self, status):
+        super().__init__(status.get('message') or f"watch failed with code {status.get('code')}")
+        self.code = status.get('code')
+
+class KubeAPI:
+    """
+    Minimal client for the Kubernetes API server: reads, watches, and the
+    deletes used to prune release history.
+
+    Works against `kubectl proxy` (no credentials), or a server URL with a
+    bearer token and CA bundle, such as the in-cluster service account.
+    """
+
+    def __init__(self, server, token=None, ca_file=None, timeout=30):
+        self.server = server.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+        self.context = ssl.create_default_context(cafile=ca_file) if self.server.startswith('https') else None
+
+    @classmethod
+    def in_cluster(cls):
+        """Build a client from the pod's service account, as a CronJob would run."""
+        host = os.environ['KUBERNETES_SERVICE_HOST']
+        port = os.environ.get('KUBERNETES_SERVICE_PORT', '443')
+        with open(os.path.join(SERVICE_ACCOUNT_DIR, 'token')) as f:
+            token = f.read().strip()
+        return cls(f"https://{host}:{port}", token=token, ca_file=os.path.join(SERVICE_ACCOUNT_DIR, 'ca.crt'))
+
+    def _request(self, path, params, accept):
+        url = self.server + path
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        request = urllib.request.Request(url, headers={'Accept': accept})
+        if self.token:
+            request.add_header('Authorization', f"Bearer {self.token}")
+        return request
+
+    def get(self, path, params=None, accept='application/json'):
+        request = self._request(path, params, accept)
+        with urllib.request.urlopen(request, timeout=self.timeout, context=self.context) as response:
+            return json.load(response)
+
+    def delete(self, path, params=None):
+        """Send a DELETE (with `params`, a delete of every matching object) and return the response."""
+        request = self._request(path, params, 'application/json')
+        request.method = 'DELETE'
+        with urllib.request.urlopen(request, timeout=self.timeout, context=self.context) as response:
+            return json.load(response)
+
+    def watch(self, path, params=None, accept='application/json', timeout_seconds=300):
+        """
+        Yield the events of a watch on `path`, as dicts with `type` and `object`.
+
+        The server ends the watch after about `timeout_seconds`, and the caller
+        resumes from the last resourceVersion it saw. An error event (or a
+        410 response) raises `WatchError`, after which the caller must list
+        again.
+        """
+        params = dict(params or {}, watch='1', timeoutSeconds=timeout_seconds)
+        request = self._request(path, params, accept)
+        try:
+            response = urllib.request.urlopen(request, timeout=timeout_seconds + self.timeout, context=self.context)
+        except urllib.error.HTTPError as e:
+            if e.code == 410:
+                raise WatchError({'code': 410, 'message': e.reason}) from None
+            raise
+        with response:
+            for line in response:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event.get('type') == 'ERROR':
+                    raise WatchError(event.get('object') or {})
+                yield event
+
+def secrets_path(namespace=None):
+    if namespace:
+        return f"/api/v1/namespaces/{urllib.parse.quote(namespace)}/secrets"
+    return '/api/v1/secrets'
+
+def release_selector(statuses=LATEST_STATUSES):
+    """Return the label selector matching Helm release Secrets in one of `statuses` (None: any status)."""
+    if statuses is None:
+        return 'owner=helm'
+    return f"owner=helm,status in ({','.join(statuses)})"
+
+def list_release_secrets(api, namespace=None, statuses=LATEST_STATUSES, page_size=500, with_data=False):
+    """
+    Yield the metadata of Helm release Secrets, one page at a time from the server.
+
+    Only Secrets labelled `owner=helm` with one of `statuses` are returned, and
+    the list is paged with `limit`/`continue` so no single response grows with
+    the size of the cluster. With `with_data`, whole Secrets are yielded,
+    release payload included.
+    """
+    params = {
+        'labelSelector': release_selector(statuses),
+        'limit': page_size,
+    }
+    accept = 'application/json' if with_data else METADATA_ACCEPT
+    while True:
+        page = api.get(secrets_path(namespace), params, accept=accept)
+        for item in page.get('items', []):
+            yield item if with_data else item['metadata']
+        token = page.get('metadata', {}).get('continue')
+        if not token:
+            return
+        params['continue'] = token
+
+def helm_time(timestamp):
+    """Render an RFC 3339 API timestamp the way `helm list` prints `updated`."""
+    dt = datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+    return dt.strftime('%Y-%m-%d %H:%M:%S +0000 UTC')
+
+def decode_release(secret):
+    """
+    Decode the release payload of a full Helm release Secret.
+
+    Helm stores the release as gzipped JSON, base64 encoded, inside the Secret's
+    (also base64 encoded) `release` key.
+    """
+    data = base64.b64decode(base64.b64decode(secret['data']['release']))
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+    return json.loads(data)
+
+def release_chart(api, namespace, secret_name):
+    """Fetch one release Secret and return its (chart, app_version) strings."""
+    secret = api.get(f"{secrets_path(namespace)}/{urllib.parse.quote(secret_name)}")
+    metadata = decode_release(secret).get('chart', {}).get('metadata', {})
+    return f"{metadata.get('name', '')}-{metadata.get('version', '')}", metadata.get('appVersion', '')
+
+def list_releases(api, namespace=None, statuses=LATEST_STATUSES, page_size=500, with_chart=False):
+    """
+    Return Helm releases read from release Secrets, shaped like `helm list --output json`.
+
+    Only the newest revision of each release is kept. `chart` and `app_version`
+    are not stored in labels, so they are left empty unless `with_chart` is
+    set, in which case only the newest revision of each release is fetched and
+    decoded.
+
+    This is not quite `helm list --all`. Only releases whose newest revision
+    is in one of `statuses` are listed, so by default uninstalled releases
+    kept with --keep-history are left out. `updated` is when the newest
+    revision's Secret was created, which is when that revision was deployed
+    but, unlike helm's last-deployed time, does not move when the revision's
+    status changes later.
+    """
+    latest = {}
+    for metadata in list_release_secrets(api, namespace, statuses, page_size):
+        labels = metadata.get('labels', {})
+        key = (metadata['namespace'], labels['name'])
+        revision = int(labels['version'])
+        current = latest.get(key)
+        if current is None or revision > current[0]:
+            latest[key] = (revision, labels['status'], metadata['creationTimestamp'], metadata['name'])
+
+    releases = []
+    for (release_namespace, name), (revision, status, created, secret_name) in sorted(latest.items()):
+        chart, app_version = release_chart(api, release_namespace, secret_name) if with_chart else ('', '')
+        releases.append({
+            'name': name,
+            'namespace': release_namespace,
+            'revision': str(revision),
+            'updated': helm_time(created),
+            'status': status,
+            'chart': chart,
+            'app_version': app_version,
+        })
+    return releases
+
+def connect(api_server=None, token=None, ca_file=None):
+    """Return a `KubeAPI` for `api_server`, or for the in-cluster service account if none is given."""
+    if api_server:
+        return KubeAPI(api_server, token=token, ca_file=ca_file)
+    return KubeAPI.in_cluster()
+
+def main():
+    parser = argparse.ArgumentParser(description="List Helm releases from the Kubernetes API, like `helm list -o json`.")
+    parser.add_argument('--api-server', help="API server URL, e.g. http://127.0.0.1:8001 from `kubectl proxy` (default: in-cluster)")
+    parser.add_argument('--token', default=os.environ.get('KUBE_TOKEN'), help="bearer token (default: $KUBE_TOKEN)")
+    parser.add_argument('--ca-file', help="CA bundle for the API server certificate")
+    parser.add_argument('-n', '--namespace', help="namespace to list (default: all namespaces)")
+    parser.add_argument('--page-size', type=int, default=500, help="Secrets per list request")
+    parser.add_argument('--with-chart', action='store_true', help="decode chart and app_version from the newest revision")
+    args = parser.parse_args()
+
+    api = connect(args.api_server, args.token, args.ca_file)
+    json.dump(list_releases(api, args.namespace, page_size=args.page_size, with_chart=args.with_chart), sys.stdout)
+    sys.stdout.write('\n')
+
+if __name__ == "__main__":
+    main()
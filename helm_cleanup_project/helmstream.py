@@ -0,0 +1,119 @@
+import json
+import subprocess
+import tempfile
+
+from helmproc import ProcessRunner
+
+_decoder = json.JSONDecoder()
+
+class JSONArrayDecoder:
+    """
+    Incrementally decode the elements of a top-level JSON array.
+
+    Text is passed in with `feed` as it arrives, in chunks of any size, and
+    each call returns the elements completed so far. Only the unfinished tail
+    of the input is buffered. An empty input is treated as an empty array.
+    """
+
+    def __init__(self):
+        self._buf = ''
+        self._pos = 0
+        self._started = False
+        self.done = False
+
+    def _skip(self, chars):
+        buf, pos = self._buf, self._pos
+        while pos < len(buf) and buf[pos] in chars:
+            pos += 1
+        self._pos = pos
+
+    def feed(self, text, eof=False):
+        """Add `text` and return the newly completed elements. Pass eof=True with the last chunk."""
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        items = []
+        while not self.done:
+            self._skip(' \t\r\n,' if self._started else ' \t\r\n')
+            buf, pos = self._buf, self._pos
+            if pos >= len(buf):
+                if eof:
+                    if self._started:
+                        raise ValueError("Unexpected end of input inside JSON array")
+                    self.done = True
+                break
+            if not self._started:
+                if buf[pos] != '[':
+                    raise ValueError(f"Expected a JSON array, got {buf[pos:pos + 20]!r}")
+                self._started = True
+                self._pos = pos + 1
+                continue
+            if buf[pos] == ']':
+                self.done = True
+                break
+            try:
+                item, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                break
+            # A value is only complete once a delimiter follows it: a number
+            # split across chunks ('-15' + '00.5') decodes early otherwise.
+            if end == len(buf) or buf[end] not in ' \t\r\n,]':
+                if not eof:
+                    break
+                if end < len(buf):
+                    raise ValueError(f"Unexpected {buf[end:end + 20]!r} in JSON array")
+            self._pos = end
+            items.append(item)
+        return items
+
+def iter_json_array(stream, chunk_size=65536):
+    """
+    Yield the elements of a top-level JSON array read from a text stream.
+
+    The stream is read in chunks of `chunk_size` characters and each element is
+    decoded as soon as it is complete, so only one element (plus one chunk) is
+    held in memory at a time. An empty stream is treated as an empty array.
+    """
+    decoder = JSONArrayDecoder()
+    while not decoder.done:
+        chunk = stream.read(chunk_size)
+        yield from decoder.feed(chunk, eof=not chunk)
+
+def stream_helm_releases(command):
+    """
+    Run a `helm list ... --output json` command and yield its releases one at a time.
+
+    Releases are decoded straight from the subprocess pipe instead of buffering
+    the whole stdout. Raises `subprocess.CalledProcessError` if helm exits
+    non-zero once the output has been consumed.
+    """
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr, text=True)
+        try:
+            yield from iter_json_array(process.stdout)
+        finally:
+            process.stdout.close()
+            if process.poll() is None:
+                # The consumer stopped early, or parsing failed; don't leave helm running.
+                process.kill()
+            returncode = process.wait()
+        # Only reached when the output was read to the end.
+        if returncode != 0:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(returncode, command, stderr=stderr.read().decode('utf-8', 'replace'))
+
+async def read_helm_releases(command, runner=None):
+    """
+    Run a `helm list ... --output json` command with a ProcessRunner and return its releases.
+
+    The releases are decoded as the output streams in. Raises like
+    `ProcessRunner.stream` if helm fails or times out.
+    """
+    runner = runner or ProcessRunner()
+    decoder = JSONArrayDecoder()
+    releases = []
+    async for text in runner.stream(command):
+        releases.extend(decoder.feed(text))
+    releases.extend(decoder.feed('', eof=True))
+    return releases
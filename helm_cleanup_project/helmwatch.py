@@ -0,0 +1,350 @@
+import argparse
+import calendar
+import heapq
+import json
+import queue
+import sys
+import threading
+import time
+
+from helmclean import RETENTION_DAYS, decide, get_base_name, uninstall_releases
+from helmrecords import make_record
+from helmstore import (LATEST_STATUSES, METADATA_ACCEPT, METADATA_WATCH_ACCEPT, WatchError, connect,
+                       release_selector, secrets_path)
+
+# A release stops being 'young' once it is this many seconds old
+RETENTION_SECONDS = (RETENTION_DAYS + 1) * 86400
+
+def api_epoch(timestamp):
+    """Return epoch seconds for an RFC 3339 API timestamp such as '2024-09-02T11:37:22Z' (0 if unparseable)."""
+    try:
+        return calendar.timegm(time.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ'))
+    except (TypeError, ValueError):
+        return 0
+
+def secret_record(metadata):
+    """Build a `ReleaseRecord` from the metadata of a Helm release Secret."""
+    labels = metadata.get('labels', {})
+    release = {
+        'name': labels['name'],
+        'namespace': metadata['namespace'],
+        'status': labels.get('status', ''),
+        'revision': labels.get('version'),
+        'updated': metadata.get('creationTimestamp'),
+    }
+    return make_record(release, get_base_name, api_epoch)
+
+class ReleaseIndex:
+    """
+    The newest revision of every release, and per-group statistics, kept current one event at a time.
+
+    `counts` and `latest` have the shape `helmclean.load_records` returns, so
+    `decide` works on them unchanged. Every update touches one release and
+    its group only; nothing is ever rebuilt from a full listing.
+    """
+
+    def __init__(self):
+        self.revisions = {}  # (namespace, name) -> {revision: ReleaseRecord}
+        self.records = {}  # (namespace, name) -> ReleaseRecord of the newest revision
+        self.members = {}  # group key -> set of (namespace, name)
+        self.counts = {}
+        self.latest = {}
+
+    def _attach(self, record):
+        self.members.setdefault(record.key, set()).add((record.namespace, record.name))
+        self.counts[record.key] = self.counts.get(record.key, 0) + 1
+        if record.epoch > self.latest.get(record.key, 0):
+            self.latest[record.key] = record.epoch
+
+    def _detach(self, record):
+        key = record.key
+        members = self.members[key]
+        members.discard((record.namespace, record.name))
+        self.counts[key] -= 1
+        if not members:
+            del self.members[key], self.counts[key], self.latest[key]
+        elif record.epoch == self.latest[key]:
+            self.latest[key] = max(self.records[release].epoch for release in members)
+
+    def _refresh(self, release):
+        """Make the newest remaining revision of `release` current; return the group key touched, or None."""
+        old = self.records.get(release)
+        revisions = self.revisions.get(release)
+        new = revisions[max(revisions)] if revisions else None
+        if new == old:
+            return None
+        if old:
+            self._detach(old)
+            del self.records[release]
+        if new:
+            self.records[release] = new
+            self._attach(new)
+        return (new or old).key
+
+    def update(self, record):
+        """Add or replace one revision; return the group key whose state changed, or None."""
+        release = (record.namespace, record.name)
+        self.revisions.setdefault(release, {})[record.revision] = record
+        return self._refresh(release)
+
+    def remove(self, namespace, name, revision):
+        """Forget one revision; return the group key whose state changed, or None."""
+        release = (namespace, name)
+        revisions = self.revisions.get(release)
+        if revisions is None:
+            return None
+        revisions.pop(revision, None)
+        if not revisions:
+            del self.revisions[release]
+        return self._refresh(release)
+
+class CleanupController:
+    """
+    Uninstall releases when `helmclean.decide` would, as Secret events arrive.
+
+    Each release that will become removable gets an expiry time: now for a
+    failed release, and `updated` plus the retention window for one that is
+    not the newest of its group. Expiry times are kept in a min-heap, so the
+    controller sleeps until the earliest one or the next event, whichever
+    comes first. Heap entries are never removed in place; an entry that no
+    longer matches `scheduled` is dropped when it reaches the top.
+    """
+
+    def __init__(self, execute=False, workers=8, namespace_limit=4, retries=2, batch_size=10,
+                 retry_delay=300, clock=time.time, out=sys.stdout):
+        self.index = ReleaseIndex()
+        self.heap = []  # (expiry, namespace, name, revision)
+        self.scheduled = {}  # (namespace, name) -> (expiry, revision)
+        self.fired = {}  # (namespace, name) -> revision already handed to uninstall
+        self.uninstall_options = dict(execute=execute, workers=workers, namespace_limit=namespace_limit,
+                                      retries=retries, batch_size=batch_size)
+        self.retry_delay = retry_delay
+        self.clock = clock
+        self.out = out
+
+    def expiry(self, record):
+        """Return when `record` becomes removable under the current group state, or None if it never will."""
+        if self.index.counts[record.key] == 1:
+            return None
+        if record.status == 'failed':
+            return 0
+        if record.epoch == self.index.latest[record.key]:
+            return None
+        return record.epoch + RETENTION_SECONDS
+
+    def _schedule(self, release, when, revision):
+        self.scheduled[release] = (when, revision)
+        heapq.heappush(self.heap, (when, release[0], release[1], revision))
+
+    def _reschedule(self, key):
+        """Recompute the expiry of every release in group `key`."""
+        for release in self.index.members.get(key, ()):
+            record = self.index.records[release]
+            if self.fired.get(release) == record.revision:
+                continue
+            when = self.expiry(record)
+            if when is None:
+                self.scheduled.pop(release, None)
+            elif self.scheduled.get(release) != (when, record.revision):
+                self._schedule(release, when, record.revision)
+
+    def _forget(self, release):
+        if release not in self.index.records:
+            self.scheduled.pop(release, None)
+            self.fired.pop(release, None)
+
+    def _record(self, metadata):
+        record = secret_record(metadata)
+        if record.epoch == 0:
+            print(f"Warning: Could not parse date for release {record.name}. Skipping.", file=self.out)
+            return None
+        return record
+
+    def apply(self, event_type, metadata):
+        """Apply one ADDED, MODIFIED or DELETED event for a release Secret."""
+        labels = metadata.get('labels', {})
+        if 'name' not in labels:
+            return
+        release = (metadata['namespace'], labels['name'])
+        revision = int(labels.get('version') or 0)
+        # A revision that is superseded no longer matches the watch's selector
+        record = None
+        if event_type != 'DELETED' and labels.get('status') in LATEST_STATUSES:
+            record = self._record(metadata)
+        if record is None:
+            key = self.index.remove(*release, revision)
+        else:
+            key = self.index.update(record)
+        self._forget(release)
+        if key:
+            self._reschedule(key)
+
+    def sync(self, items):
+        """Replace all state with a fresh listing of release Secret metadata."""
+        self.index = ReleaseIndex()
+        self.heap = []
+        self.scheduled = {}
+        for metadata in items:
+            if metadata.get('labels', {}).get('status') in LATEST_STATUSES:
+                record = self._record(metadata)
+                if record:
+                    self.index.update(record)
+        records = self.index.records
+        self.fired = {release: revision for release, revision in self.fired.items()
+                      if release in records and records[release].revision == revision}
+        for key in list(self.index.members):
+            self._reschedule(key)
+
+    def next_expiry(self):
+        return self.heap[0][0] if self.heap else None
+
+    def fire(self, now):
+        """Uninstall every release whose expiry has passed. Returns the (name, namespace) pairs handed over."""
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            when, namespace, name, revision = heapq.heappop(self.heap)
+            release = (namespace, name)
+            if self.scheduled.get(release) != (when, revision):
+                continue
+            del self.scheduled[release]
+            record = self.index.records[release]
+            action, reason, age_days = decide(record, self.index.counts, self.index.latest, int(now))
+            if action != 'uninstall':
+                continue
+            if reason == 'failed':
+                print(f"Found failed release {name} in namespace {namespace}", file=self.out)
+            else:
+                print(f"Uninstalling release {name} (base: {record.base_name}) in namespace {namespace} "
+                      f"(age: {age_days} days)", file=self.out)
+            self.fired[release] = revision
+            due.append((name, namespace))
+        if not due:
+            return due
+        for result in uninstall_releases(due, **self.uninstall_options):
+            release = (result.namespace, result.name)
+            record = self.index.records.get(release)
+            if not result.ok and record and self.fired.pop(release, None) == record.revision:
+                self._schedule(release, now + self.retry_delay, record.revision)
+        return due
+
+    def run(self, events):
+        """
+        Consume `events` until they run out, uninstalling releases as they expire.
+
+        `events` yields ('SYNC', [metadata, ...]) to replace all state, or
+        (event type, metadata) for one Secret. It is read in a background
+        thread, so a blocking watch never delays an expiry.
+        """
+        inbox = queue.Queue()
+
+        def read():
+            try:
+                for event in events:
+                    inbox.put(event)
+            except Exception as e:
+                inbox.put(e)
+            else:
+                inbox.put(None)
+
+        threading.Thread(target=read, daemon=True).start()
+        while True:
+            when = self.next_expiry()
+            try:
+                event = inbox.get(timeout=None if when is None else max(0, when - self.clock()))
+            except queue.Empty:
+                event = ()
+            if event is None:
+                self.fire(self.clock())
+                return
+            if isinstance(event, Exception):
+                raise event
+            if event:
+                event_type, payload = event
+                if event_type == 'SYNC':
+                    self.sync(payload)
+                else:
+                    self.apply(event_type, payload)
+            self.fire(self.clock())
+
+def list_secrets(api, namespace=None, page_size=500):
+    """Return (metadata list, resourceVersion) for all release Secrets, for a watch to start from."""
+    params = {'labelSelector': release_selector(), 'limit': page_size}
+    items = []
+    while True:
+        page = api.get(secrets_path(namespace), params, accept=METADATA_ACCEPT)
+        items.extend(item['metadata'] for item in page.get('items', []))
+        token = page.get('metadata', {}).get('continue')
+        if not token:
+            return items, page.get('metadata', {}).get('resourceVersion')
+        params['continue'] = token
+
+def api_events(api, namespace=None, timeout_seconds=300, reconnect_delay=5):
+    """
+    Yield controller events from the Kubernetes API: a SYNC from one listing, then the watch that follows it.
+
+    The watch is resumed from the last resourceVersion seen whenever the
+    server closes it, and the Secrets are listed again (with a new SYNC) only
+    when the server can no longer resume it.
+    """
+    params = {'labelSelector': release_selector(), 'allowWatchBookmarks': 'true'}
+    while True:
+        items, version = list_secrets(api, namespace)
+        yield 'SYNC', items
+        while True:
+            try:
+                resume = dict(params, resourceVersion=version) if version else params
+                for event in api.watch(secrets_path(namespace), resume, accept=METADATA_WATCH_ACCEPT,
+                                       timeout_seconds=timeout_seconds):
+                    metadata = event['object']['metadata']
+                    version = metadata.get('resourceVersion', version)
+                    if event['type'] != 'BOOKMARK':
+                        yield event['type'], metadata
+            except WatchError as e:
+                print(f"Watch expired ({e}); listing release Secrets again", file=sys.stderr)
+                break
+            except OSError as e:
+                print(f"Watch interrupted ({e}); reconnecting in {reconnect_delay}s", file=sys.stderr)
+                time.sleep(reconnect_delay)
+
+def file_events(path):
+    """Yield controller events from a file of watch events, one JSON object per line, as a stand-in for the API."""
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event['type'] == 'SYNC':
+                yield 'SYNC', [item['metadata'] for item in event['object']['items']]
+            elif event['type'] != 'BOOKMARK':
+                yield event['type'], event['object']['metadata']
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Watch Helm release Secrets and uninstall stale or failed releases as soon as they qualify.")
+    parser.add_argument('-n', '--namespace', default='default', help="namespace to watch (default: default)")
+    parser.add_argument('-A', '--all-namespaces', action='store_true', help="watch every namespace")
+    parser.add_argument('--api-server', help="API server URL (default: in-cluster)")
+    parser.add_argument('--events', help="replay watch events from this JSON-lines file instead of the API, then exit")
+    parser.add_argument('--execute', action='store_true', help="actually run helm uninstall (default: dry run)")
+    parser.add_argument('--workers', type=int, default=8, help="maximum concurrent uninstalls")
+    parser.add_argument('--namespace-limit', type=int, default=4, help="maximum concurrent uninstalls per namespace")
+    parser.add_argument('--retries', type=int, default=2, help="retries per failed uninstall")
+    parser.add_argument('--batch-size', type=int, default=10, help="releases per helm uninstall call")
+    parser.add_argument('--retry-delay', type=int, default=300,
+                        help="seconds before a release that could not be uninstalled is tried again")
+    args = parser.parse_args()
+
+    namespace = None if args.all_namespaces else args.namespace
+    if args.events:
+        events = file_events(args.events)
+    else:
+        events = api_events(connect(args.api_server), namespace)
+    controller = CleanupController(execute=args.execute, workers=args.workers, namespace_limit=args.namespace_limit,
+                                   retries=args.retries, batch_size=args.batch_size, retry_delay=args.retry_delay)
+    try:
+        controller.run(events)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
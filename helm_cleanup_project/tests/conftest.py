@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# The tools are flat modules run from helm_cleanup_project/, and newdel/delhelm
+# live in helmdel/delhelm/; make both importable the way the scripts see them.
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'helmdel', 'delhelm'))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from fakekube import FakeKube
+
+@pytest.fixture
+def kube():
+    fake = FakeKube()
+    yield fake
+    fake.close()
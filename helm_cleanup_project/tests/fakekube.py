@@ -0,0 +1,165 @@
+import base64
+import gzip
+import json
+import re
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_COLLECTION = re.compile(r'^/api/v1(?:/namespaces/([^/]+))?/secrets(?:/([^/]+))?$')
+
+def release_secret(namespace, name, revision, status, created='2024-01-01T00:00:00Z', chart='app-1.0.0',
+                   app_version='1.0', manifest=''):
+    """Build a Helm release Secret the way helm stores it: gzipped JSON, base64 twice."""
+    chart_name, _, chart_version = chart.rpartition('-')
+    release = {
+        'name': name,
+        'namespace': namespace,
+        'version': revision,
+        'info': {'status': status},
+        'chart': {'metadata': {'name': chart_name, 'version': chart_version, 'appVersion': app_version}},
+        'manifest': manifest,
+    }
+    payload = base64.b64encode(base64.b64encode(gzip.compress(json.dumps(release).encode()))).decode()
+    return {
+        'metadata': {
+            'name': f'sh.helm.release.v1.{name}.v{revision}',
+            'namespace': namespace,
+            'creationTimestamp': created,
+            'labels': {'owner': 'helm', 'name': name, 'status': status, 'version': str(revision)},
+        },
+        'type': 'helm.sh/release.v1',
+        'data': {'release': payload},
+    }
+
+def _split_selector(selector):
+    return [term for term in re.split(r',(?![^()]*\))', selector) if term]
+
+def selector_matches(selector, labels):
+    """Evaluate the subset of label selector syntax the tools use: =, !=, in (...), notin (...)."""
+    for term in _split_selector(selector or ''):
+        m = re.match(r'^\s*(\S+)\s+(in|notin)\s+\((.*)\)\s*$', term)
+        if m:
+            values = {value.strip() for value in m.group(3).split(',')}
+            if (labels.get(m.group(1)) in values) != (m.group(2) == 'in'):
+                return False
+        elif '!=' in term:
+            key, value = term.split('!=')
+            if labels.get(key) == value:
+                return False
+        elif '=' in term:
+            key, value = term.split('=')
+            if labels.get(key) != value:
+                return False
+        elif term not in labels:
+            return False
+    return True
+
+class FakeKube:
+    """
+    A local stand-in for the parts of the Kubernetes API the tools call.
+
+    Serves Secret lists (label selectors, limit/continue paging, metadata-only
+    responses), single Secrets, single and collection deletes, and watches.
+    Each watch request takes the next script from `watches`: a list of events
+    to stream before closing, or an HTTP status code to answer with instead.
+    Every request is logged in `requests` as (method, path, params).
+    """
+
+    def __init__(self, secrets=()):
+        self.secrets = []
+        self.version = 0
+        self.watches = []
+        self.requests = []
+        self.lock = threading.Lock()
+        for secret in secrets:
+            self.add(secret)
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                fake._handle(self, 'GET')
+
+            def do_DELETE(self):
+                fake._handle(self, 'DELETE')
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add(self, secret):
+        with self.lock:
+            self.version += 1
+            secret['metadata']['resourceVersion'] = str(self.version)
+            self.secrets.append(secret)
+        return secret
+
+    def _select(self, namespace, params):
+        return [secret for secret in self.secrets
+                if (namespace is None or secret['metadata']['namespace'] == namespace)
+                and selector_matches(params.get('labelSelector'), secret['metadata']['labels'])]
+
+    def _handle(self, handler, method):
+        url = urllib.parse.urlparse(handler.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        self.requests.append((method, url.path, params))
+        m = _COLLECTION.match(url.path)
+        if not m:
+            return self._reply(handler, 404, {'code': 404})
+        namespace, name = m.groups()
+        with self.lock:
+            if name:
+                matches = [secret for secret in self.secrets if secret['metadata']['name'] == name
+                           and secret['metadata']['namespace'] == namespace]
+                if not matches:
+                    return self._reply(handler, 404, {'code': 404})
+                if method == 'DELETE':
+                    self.secrets.remove(matches[0])
+                return self._reply(handler, 200, matches[0])
+            if method == 'DELETE':
+                deleted = self._select(namespace, params)
+                for secret in deleted:
+                    self.secrets.remove(secret)
+                return self._reply(handler, 200, {'kind': 'SecretList', 'items': deleted})
+            if params.get('watch'):
+                script = self.watches.pop(0) if self.watches else []
+            else:
+                script = None
+                items = self._select(namespace, params)
+                start = int(params.get('continue') or 0)
+                limit = int(params.get('limit') or 0) or len(items)
+                page = items[start:start + limit]
+                more = start + limit < len(items)
+                version = str(self.version)
+        if script is not None:
+            return self._stream(handler, script)
+        if 'PartialObjectMetadataList' in handler.headers.get('Accept', ''):
+            page = [{'metadata': secret['metadata']} for secret in page]
+        self._reply(handler, 200, {'items': page, 'metadata': {'continue': str(start + limit) if more else '',
+                                                                'resourceVersion': version}})
+
+    def _reply(self, handler, code, body):
+        data = json.dumps(body).encode()
+        handler.send_response(code)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _stream(self, handler, script):
+        if isinstance(script, int):
+            return self._reply(handler, script, {'code': script})
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/json')
+        handler.end_headers()
+        for event in script:
+            handler.wfile.write((json.dumps(event) + '\n').encode())
+        handler.wfile.flush()
+        handler.close_connection = True
@@ -0,0 +1,53 @@
+import io
+import json
+from datetime import date
+
+from delhelm import CSVReport, JSONLinesReport, TextReport, process_data
+
+TODAY = date(2024, 9, 20)
+
+HELM_LIST = '''"name","namespace","revision","updated","status","chart","app_version"
+"vector-backend-cu-aaa111","default","3","2024-08-01 10:00:00 +0000 UTC","deployed","vector-backend-0.1.0","1.0"
+"vector-backend-cu-bbb222","default","2","2024-08-05 10:00:00 +0000 UTC","deployed","vector-backend-0.1.0","1.0"
+"vector-backend-bl-ccc333","default","1","2024-08-03 10:00:00 +0000 UTC","deployed","vector-backend-0.1.0","1.0"
+"vector-backend-bl-ddd444","default","1","2024-09-18 10:00:00 +0000 UTC","deployed","vector-backend-0.1.0","1.0"
+'''
+
+def report(report_class):
+    out = io.StringIO()
+    totals = process_data(HELM_LIST, today=TODAY, report=report_class(out, totals=True))
+    return out.getvalue(), totals
+
+def test_text_report():
+    text, totals = report(TextReport)
+    assert text.startswith(" vector-backend-cu\n  vector-backend-cu-aaa111 (Age: 50 days)\n\n"
+                           " vector-backend-bl\n  vector-backend-bl-ccc333 (Age: 48 days)\n\n\n")
+    assert tuple(totals) == (1, 2, 1)
+
+def test_csv_report_writes_rows_only_and_totals_to_stderr(capsys):
+    text, _ = report(CSVReport)
+    assert text.splitlines() == [
+        'main_group,sub_group,release,age_days,release_date',
+        'vector-backend,vector-backend-cu,vector-backend-cu-aaa111,50,2024-08-01',
+        'vector-backend,vector-backend-bl,vector-backend-bl-ccc333,48,2024-08-03',
+    ]
+    assert 'Total number of deployments (older than 7 days, excluding latest): 1' in capsys.readouterr().err
+
+def test_jsonl_report_ends_with_totals():
+    text, _ = report(JSONLinesReport)
+    rows = [json.loads(line) for line in text.splitlines()]
+    assert [row.get('release') for row in rows[:-1]] == ['vector-backend-cu-aaa111', 'vector-backend-bl-ccc333']
+    assert rows[-1] == {'totals': {'main_groups': 1, 'sub_groups': 2, 'deployments': 1}}
+
+def test_same_names_in_other_namespaces_are_grouped_apart():
+    # Each namespace keeps its own newest release, and is named in the report
+    other = HELM_LIST.replace('"default"', '"staging"').split('\n', 1)[1]
+    text = io.StringIO()
+    totals = process_data(HELM_LIST + other, today=TODAY, report=CSVReport(text))
+    assert text.getvalue().splitlines()[1:] == [
+        'vector-backend,vector-backend-cu,vector-backend-cu-aaa111,50,2024-08-01',
+        'vector-backend,vector-backend-bl,vector-backend-bl-ccc333,48,2024-08-03',
+        'staging/vector-backend,staging/vector-backend-cu,vector-backend-cu-aaa111,50,2024-08-01',
+        'staging/vector-backend,staging/vector-backend-bl,vector-backend-bl-ccc333,48,2024-08-03',
+    ]
+    assert tuple(totals) == (2, 4, 2)
@@ -0,0 +1,36 @@
+import io
+import json
+
+import pytest
+
+from helmbench import compare, iter_inventory, run_benchmarks, save_results
+from helmdates import parse_helm_time
+from helmsnapshots import SNAPSHOT_FIELDS
+
+def test_inventory_is_deterministic_and_well_formed():
+    rows = list(iter_inventory(2000, seed=3))
+    assert rows == list(iter_inventory(2000, seed=3))
+    assert rows != list(iter_inventory(2000, seed=4))
+    assert len(rows) == 2000
+    assert len({row['name'] for row in rows}) == 2000
+    assert all(list(row) == SNAPSHOT_FIELDS for row in rows)
+    assert all(parse_helm_time(row['updated']) for row in rows)
+    failed = sum(row['status'] == 'failed' for row in rows)
+    assert 20 < failed < 120
+
+def test_run_and_compare_against_a_baseline(tmp_path):
+    rows = run_benchmarks(['delhelm'], [100], workdir=str(tmp_path), progress=io.StringIO())
+    assert [(row['implementation'], row['size'], row['phase']) for row in rows] == [('delhelm', 100, 'process')]
+    baseline = str(tmp_path / 'baseline.json')
+    save_results(baseline, rows, seed=0)
+    slower = [dict(row, seconds=row['seconds'] * 3) for row in rows]
+    out = io.StringIO()
+    assert compare(rows, baseline, tolerance=1.5, out=out) == []
+    assert compare(slower, baseline, tolerance=1.5, out=out) == slower
+    assert 'REGRESSION' in out.getvalue()
+
+def test_compare_refuses_an_unknown_baseline_version(tmp_path):
+    path = tmp_path / 'baseline.json'
+    path.write_text(json.dumps({'version': 99, 'results': []}))
+    with pytest.raises(ValueError, match='unsupported baseline version 99'):
+        compare([], str(path), 1.5)
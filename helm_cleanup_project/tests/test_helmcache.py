@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import helmcache
+
+@pytest.mark.parametrize('value, expected', [(None, 300), ('0', 0), ('60', 60), ('5m', 300), ('-1', 300)])
+def test_env_ttl(monkeypatch, capsys, value, expected):
+    if value is None:
+        monkeypatch.delenv('HELM_INVENTORY_TTL', raising=False)
+    else:
+        monkeypatch.setenv('HELM_INVENTORY_TTL', value)
+    assert helmcache.env_ttl() == expected
+    warned = 'ignoring HELM_INVENTORY_TTL' in capsys.readouterr().err
+    assert warned == (value in ('5m', '-1'))
+
+def test_bad_ttl_does_not_break_importers():
+    result = subprocess.run([sys.executable, '-c', 'import helmcache; print(helmcache.DEFAULT_TTL)'],
+                            capture_output=True, text=True, cwd=os.path.dirname(helmcache.__file__),
+                            env={'HELM_INVENTORY_TTL': 'soon', 'PATH': ''})
+    assert result.returncode == 0
+    assert result.stdout == '300\n'
+    assert "ignoring HELM_INVENTORY_TTL='soon'" in result.stderr
+
+def test_api_listings_are_cached_apart_from_helm_ones(monkeypatch, tmp_path):
+    def fetch(source, scope, context, api_server):
+        return [dict(dict.fromkeys(helmcache.SNAPSHOT_FIELDS, ''), name=source)]
+    monkeypatch.setattr(helmcache, 'fetch_inventory', fetch)
+    for source in ('helm', 'api'):
+        helmcache.get_inventory(source, 'default', context='prod', ttl=0, cache_dir=str(tmp_path))
+    for source in ('helm', 'api'):
+        releases = helmcache.get_inventory(source, 'default', context='prod', cache_dir=str(tmp_path))
+        assert [release['name'] for release in releases] == [source]
+    assert helmcache.inventory_key('api', None, api_server='https://k8s:6443') == ('api:https://k8s:6443', '*')
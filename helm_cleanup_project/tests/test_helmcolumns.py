@@ -0,0 +1,49 @@
+import pytest
+
+import helmcolumns
+from helmclean import RETENTION_DAYS, decide, get_base_name, retained_records
+from helmrecords import make_record
+from helmretention import RetentionPolicies
+
+pytest.importorskip('numpy')
+
+DAY = 86400
+NOW = 100 * DAY
+
+def records(rows):
+    return [make_record({'name': name, 'namespace': namespace, 'status': status, 'revision': '1', 'updated': epoch},
+                        get_base_name, int)
+            for name, namespace, status, epoch in rows]
+
+def python_decisions(records):
+    counts = {}
+    for record in records:
+        counts[record.key] = counts.get(record.key, 0) + 1
+    retained = retained_records(records, RetentionPolicies(), NOW)
+    return [decide(record, counts, None, NOW, retained) for record in records]
+
+def test_engines_agree_when_releases_tie_at_the_newest_time():
+    inventory = records([
+        # Three releases of one group updated in the same second: all stay
+        ('web-app-cu-pr-aaa111', 'default', 'deployed', 50 * DAY),
+        ('web-app-cu-pr-bbb222', 'default', 'deployed', 50 * DAY),
+        ('web-app-cu-pr-ccc333', 'default', 'deployed', 50 * DAY),
+        ('web-app-cu-pr-ddd444', 'default', 'deployed', 40 * DAY),
+        # A failed release ties with the newest deployed one and comes first
+        ('api-svc-cu-pr-aaa111', 'default', 'failed', 60 * DAY),
+        ('api-svc-cu-pr-bbb222', 'default', 'deployed', 60 * DAY),
+        ('api-svc-cu-pr-ccc333', 'default', 'deployed', 30 * DAY),
+        # The same names in another namespace are another group
+        ('web-app-cu-pr-bbb222', 'ml', 'deployed', 50 * DAY),
+        ('web-app-cu-pr-aaa111', 'ml', 'deployed', 50 * DAY),
+        ('solo', 'default', 'deployed', 10 * DAY),
+        ('fresh-one-cu-pr-aaa111', 'default', 'deployed', 98 * DAY),
+        ('fresh-one-cu-pr-bbb222', 'default', 'deployed', 98 * DAY),
+    ])
+    expected = python_decisions(inventory)
+    assert helmcolumns.decisions(inventory, NOW, RETENTION_DAYS) == expected
+    assert [reason for _, reason, _ in expected] == ['latest', 'latest', 'latest', 'stale', 'failed', 'latest',
+                                                     'stale', 'latest', 'latest', 'sole', 'young', 'young']
+
+def test_empty_inventory():
+    assert helmcolumns.decisions([], NOW, RETENTION_DAYS) == []
@@ -0,0 +1,33 @@
+import calendar
+from datetime import datetime
+
+import pytest
+
+from helmdates import parse_helm_time, parse_helm_times
+
+def utc(text):
+    return calendar.timegm(datetime.strptime(text, '%Y-%m-%d %H:%M:%S').timetuple())
+
+@pytest.mark.parametrize('value, expected', [
+    ('2024-09-02 11:37:22.717403877 +0000 UTC', '2024-09-02 11:37:22'),
+    ('2023-08-31 09:05:09.329524 +0100 BST', '2023-08-31 08:05:09'),
+    ('2023-07-27 16:24:38.888559714 +0200 +0200', '2023-07-27 14:24:38'),
+    ('2023-09-08 19:35:37.79209 +0530 +0530', '2023-09-08 14:05:37'),
+    ('2024-01-01 01:00:00 -0330 NST', '2024-01-01 04:30:00'),
+    ('2024-09-02 07:25:10 +0000 UTC', '2024-09-02 07:25:10'),
+    ('2024-02-29 23:59:59', '2024-02-29 23:59:59'),
+])
+def test_parse_helm_time_honours_the_numeric_offset(value, expected):
+    assert parse_helm_time(value) == utc(expected)
+
+@pytest.mark.parametrize('value', ['', 'yesterday', '2024-09-02T11:37:22Z', '2024-13-02 11:37:22 +0000 UTC',
+                                   '2024-09-02 24:00:00 +0000 UTC', '2024-09-02 11:37:22.x +0000 UTC',
+                                   '2024-09-02 11:37:22 +00 UTC'])
+def test_parse_helm_time_rejects_other_forms(value):
+    with pytest.raises(ValueError):
+        parse_helm_time(value)
+
+def test_parse_helm_times_marks_bad_entries():
+    epochs = parse_helm_times(['2024-09-02 07:25:10 +0000 UTC', 'bad', '1970-01-01 00:00:01 +0000 UTC'], invalid=-1)
+    assert epochs.typecode == 'q'
+    assert list(epochs) == [utc('2024-09-02 07:25:10'), -1, 1]
@@ -0,0 +1,56 @@
+import io
+import subprocess
+
+from helmexec import UninstallExecutor
+
+def failing(stderr):
+    def uninstall(names, namespace):
+        raise subprocess.CalledProcessError(1, ['helm', 'uninstall', *names], stderr=stderr)
+    return uninstall
+
+def executor(uninstall, **kwargs):
+    return UninstallExecutor(workers=2, retries=0, backoff=0, uninstall=uninstall, progress=io.StringIO(), **kwargs)
+
+def test_error_is_last_stderr_line():
+    [result] = executor(failing("warning\nError: boom\n")).run([('a', 'default')])
+    assert not result.ok
+    assert result.error == "Error: boom"
+
+def test_blank_stderr_does_not_abort_the_run():
+    results = executor(failing("  \n")).run([('a', 'default'), ('b', 'default')])
+    assert [result.ok for result in results] == [False, False]
+    assert all('returned non-zero exit status 1' in result.error for result in results)
+
+class FakeHelm:
+    """Uninstalls releases in order and stops at the first missing one, as helm does."""
+
+    def __init__(self, installed):
+        self.installed = set(installed)
+        self.calls = []
+
+    def __call__(self, names, namespace):
+        self.calls.append(list(names))
+        for name in names:
+            if name not in self.installed:
+                raise subprocess.CalledProcessError(
+                    1, ['helm'], stderr=f"Error: uninstall: Release not loaded: {name}: release: not found\n")
+            self.installed.remove(name)
+
+def outcomes(results):
+    return {result.name: result.ok for result in results}
+
+def test_single_missing_release_is_a_failure():
+    [result] = executor(FakeHelm([])).run([('typo', 'default')])
+    assert not result.ok
+    assert 'not found' in result.error
+
+def test_batch_split_around_missing_release():
+    helm = FakeHelm(['a', 'b', 'd'])
+    results = executor(helm, batch_size=4).run([(name, 'default') for name in 'abcd'])
+    # a and b went with the batch call; c never existed; d is removed on retry
+    assert outcomes(results) == {'a': True, 'b': True, 'c': False, 'd': True}
+    assert helm.installed == set()
+
+def test_missing_ok_counts_missing_release_as_done():
+    [result] = executor(FakeHelm([]), missing_ok=True).run([('gone', 'default')])
+    assert result.ok
@@ -0,0 +1,20 @@
+import asyncio
+import subprocess
+import sys
+
+import helmfleet
+from helmproc import ProcessRunner
+
+def test_missing_helm_fails_the_target_only():
+    target = helmfleet.Target('prod', 'default')
+    result = asyncio.run(helmfleet.list_target(target, ProcessRunner(1, 5), helm='/nonexistent/helm'))
+    assert not result.ok
+    assert 'No such file' in result.error
+
+def test_missing_kubectl_exits_with_a_message(tmp_path):
+    # No kubectl (or helm) on PATH: discovering contexts fails before any target is listed
+    result = subprocess.run([sys.executable, helmfleet.__file__], capture_output=True, text=True,
+                            env={'PATH': str(tmp_path)})
+    assert result.returncode == 1
+    assert result.stderr.startswith("Could not list kube contexts:")
+    assert 'Traceback' not in result.stderr
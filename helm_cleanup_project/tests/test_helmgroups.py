@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from helmgroups import GroupingEngine, GroupingRule
+from helmsnapshots import read_snapshot
+
+SNAPSHOT = os.path.join(os.path.dirname(__file__), '..', 'helmdel', 'delhelm', 'helmoutput.csv')
+
+# The string splitting each tool did before the engine replaced it
+def helmclean_groups(name):
+    parts = name.split('-')
+    base = '-'.join(parts[:-1]) if len(parts) > 4 else name
+    return base, base
+
+def delhelm_groups(name):
+    parts = name.split('-')
+    return '-'.join(parts[:2]), '-'.join(parts[:-1]) if len(parts) > 2 else name
+
+def newdel_groups(name):
+    parts = name.split('-')
+    return '-'.join(parts[:2]), '-'.join(parts[:3])
+
+@pytest.mark.parametrize('rule, reference', [
+    ('helmclean', helmclean_groups), ('delhelm', delhelm_groups), ('newdel', newdel_groups)])
+def test_rules_match_the_tools_string_splitting(rule, reference):
+    names = [row['name'] for row in read_snapshot(SNAPSHOT)] + ['web', 'a-b', 'a--b-c-d-e']
+    engine = GroupingEngine(rule)
+    assert [engine.group(name) for name in names] == [reference(name) for name in names]
+
+def test_longest_suffix_wins():
+    engine = GroupingEngine('stack').add_all(['vector-email-serv-6eyf2u', 'vector-email-serv-6eyf2u-db',
+                                              'vector-email-serv-6eyf2u-db-be'])
+    assert engine.stacks() == {'vector-email-serv-6eyf2u': ['vector-email-serv-6eyf2u', 'vector-email-serv-6eyf2u-db',
+                                                             'vector-email-serv-6eyf2u-db-be']}
+    assert engine.group('vector-email-serv-6eyf2u-db-be') == ('vector-email', 'vector-email-serv-6eyf2u')
+
+def test_stack_without_its_root_release():
+    engine = GroupingEngine('stack').add_all(['ref-apps2-276-loo-xl2f43-db', 'ref-apps2-276-loo-xl2f43-redis'])
+    assert engine.group('ref-apps2-276-loo-xl2f43-db') == ('ref-apps2', 'ref-apps2-276-loo-xl2f43')
+
+def test_adding_names_rebuilds_stacks():
+    engine = GroupingEngine('stack').add_all(['web-app-cu-k9rao4'])
+    assert engine.stacks() == {}
+    engine.add('web-app-cu-k9rao4-redis')
+    assert engine.stacks() == {'web-app-cu-k9rao4': ['web-app-cu-k9rao4', 'web-app-cu-k9rao4-redis']}
+
+def test_custom_rule_and_unknown_spec():
+    engine = GroupingEngine(GroupingRule('name', 'prefix:1'))
+    assert engine.group('raft-ship-ext') == ('raft-ship-ext', 'raft')
+    with pytest.raises(ValueError, match='Unknown grouping spec'):
+        GroupingEngine(GroupingRule('suffix:1', 'name')).group('raft')
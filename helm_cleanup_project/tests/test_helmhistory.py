@@ -0,0 +1,39 @@
+import io
+
+from helmhistory import connect, first_seen, ingest, report
+
+HEADER = '"name","namespace","revision","updated","status","chart","app_version"\n'
+
+def snapshot(path, *rows):
+    path.write_text(HEADER + ''.join(f'"{name}","{namespace}","{revision}","{updated}","{status}","app-0.1.0","1.0"\n'
+                                     for name, namespace, revision, updated, status in rows))
+    return str(path)
+
+def test_ingest_is_idempotent_and_queries_span_snapshots(tmp_path):
+    db = connect(str(tmp_path / 'history.db'))
+    first = snapshot(tmp_path / 'helmoutput20240901.csv',
+                     ('web', 'default', '4', '2024-08-30 10:00:00 +0100 BST', 'deployed'),
+                     ('train', 'ml', '2', 'not a date', 'failed'))
+    second = snapshot(tmp_path / 'helmoutput20240915.csv',
+                      ('web', 'default', '5', '2024-09-14 10:00:00 +0000 UTC', 'deployed'),
+                      ('web', 'staging', '1', '2024-09-14 10:00:00 +0000 UTC', 'deployed'))
+    assert ingest(db, first) == 2
+    assert ingest(db, second) == 2
+    assert ingest(db, first) == 0
+    assert first_seen(db, 'web') == [('default', '2024-09-01', '2024-09-15', 2), ('staging', '2024-09-15', '2024-09-15', 1)]
+    assert first_seen(db, 'web', 'staging') == [('staging', '2024-09-15', '2024-09-15', 1)]
+    assert first_seen(db, 'nope') == []
+    epochs = db.execute('SELECT name, updated_epoch FROM releases WHERE snapshot_date = ? ORDER BY name',
+                        ('2024-09-01',)).fetchall()
+    assert epochs == [('train', None), ('web', 1725008400)]
+    out = io.StringIO()
+    report(db, out)
+    lines = out.getvalue().splitlines()
+    assert lines[1].split()[:4] == ['2024-09-01', '2', '1', '2']
+    assert lines[2].split()[:4] == ['2024-09-15', '2', '0', '2']
+
+def test_undated_file_uses_the_given_date(tmp_path):
+    db = connect(str(tmp_path / 'history.db'))
+    path = snapshot(tmp_path / 'helmoutput.csv', ('web', 'default', '1', '2024-09-14 10:00:00 +0000 UTC', 'deployed'))
+    ingest(db, path, when='2024-09-20')
+    assert first_seen(db, 'web') == [('default', '2024-09-20', '2024-09-20', 1)]
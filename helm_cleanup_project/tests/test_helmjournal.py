@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from helmexec import UninstallResult
+from helmjournal import UninstallJournal, remaining, replay
+
+RELEASES = [('web-a', 'default'), ('web-b', 'default'), ('train', 'ml')]
+
+def result(name, namespace, ok=True):
+    return UninstallResult(name, namespace, ok, 1, 0.1, None if ok else 'boom')
+
+def test_replay_reports_what_is_left(tmp_path):
+    path = tmp_path / 'run.journal'
+    with UninstallJournal(path) as journal:
+        journal.plan([('old', 'default')], created=1)
+        journal.plan(RELEASES, created=2)
+        journal.record([result('web-a', 'default'), result('train', 'ml', ok=False)])
+    state = replay(path)
+    assert state.created == 2
+    assert state.done == {('web-a', 'default')}
+    assert state.failed == {('train', 'ml'): 'boom'}
+    assert remaining(state) == [('web-b', 'default'), ('train', 'ml')]
+
+def test_crash_resume_resume(tmp_path):
+    path = tmp_path / 'run.journal'
+    with UninstallJournal(path) as journal:
+        journal.plan(RELEASES, created=1)
+        journal.record([result('web-a', 'default')])
+    # Crash in the middle of writing the next entry
+    with open(path, 'a') as f:
+        f.write('{"event":"result","name":"web-b","names')
+    assert remaining(replay(path)) == [('web-b', 'default'), ('train', 'ml')]
+    # First resume records the rest; the torn entry must not swallow it
+    with UninstallJournal(path) as journal:
+        journal.record([result('web-b', 'default')])
+    assert remaining(replay(path)) == [('train', 'ml')]
+    # Second resume reads the journal the first one left
+    with UninstallJournal(path) as journal:
+        journal.record([result('train', 'ml')])
+    assert remaining(replay(path)) == []
+    assert all(json.loads(line) for line in path.read_text().splitlines())
+
+def test_complete_unterminated_entry_is_kept(tmp_path):
+    path = tmp_path / 'run.journal'
+    with UninstallJournal(path) as journal:
+        journal.plan(RELEASES, created=1)
+    with open(path, 'a') as f:
+        f.write('{"event":"result","name":"web-a","namespace":"default","ok":true,"attempts":1,"error":null}')
+    with UninstallJournal(path) as journal:
+        journal.record([result('web-b', 'default')])
+    assert remaining(replay(path)) == [('train', 'ml')]
+
+def test_torn_entry_before_the_last_line_is_an_error(tmp_path):
+    path = tmp_path / 'run.journal'
+    path.write_text('{"event":"plan","created":1,"releases":[]}\n{"event":\n{"event":"plan","created":2,"releases":[]}\n')
+    with pytest.raises(ValueError, match=r':2: unreadable journal entry'):
+        replay(path)
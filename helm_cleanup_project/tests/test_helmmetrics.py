@@ -0,0 +1,116 @@
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from helmmetrics import Metrics
+
+def test_render_prometheus_and_openmetrics():
+    metrics = Metrics('helmclean')
+    metrics.inc('decisions', "Releases by decision.", reason='stale')
+    metrics.inc('decisions', "Releases by decision.", 2, reason='stale')
+    metrics.inc('decisions', "Releases by decision.", reason='fail"ed\n')
+    metrics.set('releases', "Releases listed.", 12)
+    metrics.add_seconds('list', 0.25)
+    metrics.add_seconds('list', 0.5)
+    text = metrics.render()
+    assert text.splitlines() == [
+        '# HELP helmclean_decisions_total Releases by decision.',
+        '# TYPE helmclean_decisions_total counter',
+        'helmclean_decisions_total{reason="fail\\"ed\\n"} 1',
+        'helmclean_decisions_total{reason="stale"} 3',
+        '# HELP helmclean_phase_duration_seconds Wall time spent in each phase of the last run.',
+        '# TYPE helmclean_phase_duration_seconds gauge',
+        'helmclean_phase_duration_seconds{phase="list"} 0.75',
+        '# HELP helmclean_releases Releases listed.',
+        '# TYPE helmclean_releases gauge',
+        'helmclean_releases 12',
+    ]
+    open_text = metrics.render(openmetrics=True).splitlines()
+    assert open_text[:2] == ['# HELP helmclean_decisions Releases by decision.', '# TYPE helmclean_decisions counter']
+    assert open_text[-1] == '# EOF'
+
+def test_histogram_buckets_are_cumulative():
+    metrics = Metrics('t')
+    for value in (0.5, 2, 400):
+        metrics.observe('latency', "Call latency.", value, buckets=(0.5, 1, 5), outcome='ok')
+    assert [line for line in metrics.render().splitlines() if not line.startswith('#')] == [
+        't_latency_bucket{le="0.5",outcome="ok"} 1',
+        't_latency_bucket{le="1.0",outcome="ok"} 1',
+        't_latency_bucket{le="5.0",outcome="ok"} 2',
+        't_latency_bucket{le="+Inf",outcome="ok"} 3',
+        't_latency_count{outcome="ok"} 3',
+        't_latency_sum{outcome="ok"} 402.5',
+    ]
+
+def test_observed_labels_failures():
+    metrics = Metrics('t')
+
+    def fail():
+        raise OSError('boom')
+
+    with pytest.raises(OSError):
+        metrics.observed('latency', "Call latency.", fail)()
+    assert metrics.observed('latency', "Call latency.", lambda x: x * 2)(4) == 8
+    text = metrics.render()
+    assert 't_latency_count{outcome="error"} 1' in text
+    assert 't_latency_count{outcome="ok"} 1' in text
+
+def test_timed_iter_counts_items_and_time():
+    metrics = Metrics('t')
+    assert list(metrics.timed_iter('list', range(5), counter='releases', help_text="Releases.")) == list(range(5))
+    assert 't_releases_total 5' in metrics.render()
+    assert metrics.seconds('list') > 0
+    with metrics.span('decide'):
+        pass
+    assert metrics.seconds('decide') >= 0
+    wrapped, seconds = Metrics.timed_calls(str.upper)
+    assert wrapped('a') == 'A' and seconds() > 0
+
+def test_write_textfile_and_push(tmp_path):
+    metrics = Metrics('t')
+    metrics.set('up', "Up.", 1)
+    path = tmp_path / 'helmclean.prom'
+    metrics.write_textfile(str(path))
+    assert path.read_text() == metrics.render()
+    assert [p.name for p in tmp_path.iterdir()] == ['helmclean.prom']
+
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_PUT(self):
+            received.append((self.path, self.rfile.read(int(self.headers['Content-Length'])).decode()))
+            self.send_response(202)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.handle_request, daemon=True).start()
+    try:
+        metrics.push(f"http://127.0.0.1:{server.server_address[1]}/", 'helm clean', instance='prod/eu')
+    finally:
+        server.server_close()
+    assert received == [('/metrics/job/helm%20clean/instance/prod%2Feu', metrics.render())]
+
+def test_select_releases_counts_an_up_front_listing_as_list_time(monkeypatch, tmp_path, capsys):
+    import helmclean
+
+    def slow_listing(*args):
+        time.sleep(0.2)
+        return iter([{'name': 'app-a-b-c-one', 'namespace': 'default', 'revision': '1',
+                      'updated': '2024-01-01 00:00:00 +0000 UTC', 'status': 'deployed'}])
+
+    monkeypatch.setattr(helmclean, 'get_helm_releases', slow_listing)
+    retention = tmp_path / 'retention.conf'
+    retention.write_text('* keep=1\n')
+    args = argparse.Namespace(source='api', api_server=None, no_cache=False, execute=False, cache_ttl=300,
+                              retention=str(retention), engine='python')
+    metrics = Metrics('helmclean')
+    helmclean.select_releases(args, metrics)
+    assert metrics.seconds('list') >= 0.2
+    assert metrics.seconds('parse') < 0.1
@@ -0,0 +1,43 @@
+import json
+import sys
+
+import pytest
+
+from helmplan import PlanEntry, check_plan, current_revisions, names_to_entries, read_plan, write_plan
+
+ENTRIES = [PlanEntry('web-a', 'default', 4, 'stale'), PlanEntry('train', 'ml', 2, 'failed'),
+           PlanEntry('web-b', 'default', 7, 'listed')]
+
+def test_plan_round_trip(tmp_path):
+    path = str(tmp_path / 'plan.json')
+    write_plan(path, ENTRIES, source='helmoutput.csv')
+    plan, entries = read_plan(path)
+    assert entries == ENTRIES
+    assert plan['source'] == 'helmoutput.csv'
+    assert [p.name for p in tmp_path.iterdir()] == ['plan.json']
+
+def test_unknown_plan_version_is_refused(tmp_path):
+    path = tmp_path / 'plan.json'
+    path.write_text(json.dumps({'version': 2, 'fields': list(PlanEntry._fields), 'releases': []}))
+    with pytest.raises(ValueError, match='unsupported plan version 2'):
+        read_plan(str(path))
+
+def test_check_plan_skips_gone_and_changed_releases():
+    valid, skipped = check_plan(ENTRIES, {('web-a', 'default'): 4, ('web-b', 'default'): 8})
+    assert valid == [ENTRIES[0]]
+    assert skipped == [(ENTRIES[1], 'no longer installed'), (ENTRIES[2], 'revision changed (7 -> 8)')]
+
+def test_names_to_entries_uses_snapshot_revisions():
+    inventory = [{'name': 'web', 'namespace': 'default', 'revision': '3'},
+                 {'name': 'api', 'namespace': 'ml', 'revision': '9'}]
+    assert names_to_entries(['web', 'api', 'web'], 'default', inventory) == (
+        [PlanEntry('web', 'default', 3, 'listed')], ['api'])
+
+def test_current_revisions_lists_each_namespace(tmp_path):
+    helm = tmp_path / 'helm'
+    helm.write_text(f"#!{sys.executable}\n"
+                    "import json, sys\n"
+                    "namespace = sys.argv[sys.argv.index('--namespace') + 1]\n"
+                    "print(json.dumps([{'name': 'web', 'revision': '3' if namespace == 'default' else '8'}]))\n")
+    helm.chmod(0o755)
+    assert current_revisions(['default', 'ml'], helm=str(helm)) == {('web', 'default'): 3, ('web', 'ml'): 8}
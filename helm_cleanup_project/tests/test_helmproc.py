@@ -0,0 +1,54 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+from helmproc import ProcessRunner, run_command
+from helmstream import read_helm_releases
+
+def python(code):
+    return [sys.executable, '-c', code]
+
+def test_run_returns_output_without_a_shell():
+    # An argument with shell metacharacters reaches the program unchanged
+    assert run_command(python("import sys; print(sys.argv[1])") + ['web; rm -rf / $(x)']) == 'web; rm -rf / $(x)\n'
+
+def test_run_failure_carries_stderr():
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        run_command(python("import sys; sys.stderr.write('Error: release: not found'); sys.exit(3)"))
+    assert (e.value.returncode, e.value.stderr) == (3, 'Error: release: not found')
+
+def test_run_timeout_kills_the_process():
+    with pytest.raises(subprocess.TimeoutExpired):
+        run_command(python("import time; time.sleep(30)"), timeout=0.2)
+
+def collect(argv, **kwargs):
+    async def run():
+        return [chunk async for chunk in ProcessRunner(2, 5).stream(argv, **kwargs)]
+    return asyncio.run(run())
+
+def test_stream_decodes_characters_split_across_chunks():
+    chunks = collect(python("import sys; sys.stdout.buffer.write('héllo ✓'.encode())"), chunk_size=1)
+    assert ''.join(chunks) == 'héllo ✓'
+    assert len(chunks) > 1
+
+def test_stream_failure_raises_after_the_output():
+    chunks = []
+
+    async def run():
+        async for chunk in ProcessRunner().stream(python("import sys; print('[]'); sys.stderr.write('boom'); sys.exit(1)")):
+            chunks.append(chunk)
+
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        asyncio.run(run())
+    assert ''.join(chunks) == '[]\n'
+    assert e.value.stderr == 'boom'
+
+def test_stream_timeout():
+    with pytest.raises(subprocess.TimeoutExpired):
+        collect(python("import time; print('[', flush=True); time.sleep(30)"), timeout=0.3)
+
+def test_read_helm_releases():
+    command = python("import json; print(json.dumps([{'name': 'web'}, {'name': 'api'}]))")
+    assert asyncio.run(read_helm_releases(command)) == [{'name': 'web'}, {'name': 'api'}]
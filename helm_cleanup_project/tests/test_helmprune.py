@@ -0,0 +1,66 @@
+import io
+
+from fakekube import release_secret
+from helmprune import delete_revisions, plan_prune, print_report, prune, release_histories
+from helmstore import KubeAPI
+
+def add_history(kube, name, revisions, deployed):
+    for revision in range(1, revisions + 1):
+        kube.add(release_secret('default', name, revision, 'deployed' if revision == deployed else 'superseded'))
+
+def remaining(kube, name):
+    return sorted(int(secret['metadata']['labels']['version']) for secret in kube.secrets
+                  if secret['metadata']['labels']['name'] == name)
+
+def test_plan_keeps_deployed_and_newest_revisions(kube):
+    # web was rolled back to revision 3; api is under the history limit
+    add_history(kube, 'web', 12, deployed=3)
+    add_history(kube, 'api', 10, deployed=10)
+    [plan] = plan_prune(release_histories(KubeAPI(kube.url), page_size=7), max_history=10, keep=5)
+    assert (plan.namespace, plan.name) == ('default', 'web')
+    assert [r.revision for r in plan.keep] == [12, 11, 10, 9, 8, 3]
+    assert [r.revision for r in plan.delete] == [7, 6, 5, 4, 2, 1]
+    assert all(r.bytes > 0 for r in plan.keep + plan.delete)
+
+def test_only_revisions_the_server_deleted_are_counted(kube):
+    add_history(kube, 'web', 12, deployed=12)
+    api = KubeAPI(kube.url)
+    plans = plan_prune(release_histories(api), max_history=10, keep=5)
+    # Rolled back to revision 6 after planning: the selector spares it
+    [secret] = [s for s in kube.secrets if s['metadata']['name'] == 'sh.helm.release.v1.web.v6']
+    secret['metadata']['labels']['status'] = 'deployed'
+    [result] = prune(api, plans, execute=True, batch_size=4)
+    assert result.error is None
+    assert [r.revision for r in result.deleted] == [7, 5, 4, 3, 2, 1]
+    assert remaining(kube, 'web') == [6, 8, 9, 10, 11, 12]
+    out = io.StringIO()
+    print_report([result], out)
+    assert '12 -> 6' in out.getvalue().splitlines()[1]
+    deletes = [params['labelSelector'] for method, _, params in kube.requests if method == 'DELETE']
+    assert deletes == ['owner=helm,name=web,status!=deployed,version in (7,6,5,4)',
+                       'owner=helm,name=web,status!=deployed,version in (3,2,1)']
+
+class StatusAPI(KubeAPI):
+    """An API server that answers a delete-collection with a Status, not the deleted objects."""
+
+    def delete(self, path, params=None):
+        super().delete(path, params)
+        return {'kind': 'Status', 'status': 'Success'}
+
+def test_status_response_is_checked_by_listing_again(kube):
+    add_history(kube, 'web', 12, deployed=12)
+    api = StatusAPI(kube.url)
+    [plan] = plan_prune(release_histories(api), max_history=10, keep=5)
+    [secret] = [s for s in kube.secrets if s['metadata']['name'] == 'sh.helm.release.v1.web.v2']
+    secret['metadata']['labels']['status'] = 'deployed'
+    result = delete_revisions(api, plan, batch_size=50)
+    assert [r.revision for r in result.deleted] == [7, 6, 5, 4, 3, 1]
+    assert remaining(kube, 'web') == [2, 8, 9, 10, 11, 12]
+
+def test_dry_run_deletes_nothing(kube):
+    add_history(kube, 'web', 12, deployed=12)
+    api = KubeAPI(kube.url)
+    [result] = prune(api, plan_prune(release_histories(api)), execute=False)
+    assert len(result.deleted) == 7
+    assert len(kube.secrets) == 12
+    assert not [method for method, _, _ in kube.requests if method == 'DELETE']
@@ -0,0 +1,43 @@
+import pytest
+
+from helmreconcile import parse_entry, read_deletelist, reconcile
+
+@pytest.mark.parametrize('line, expected', [
+    ('web', [('web', 'default')]),
+    ('ml/train', [('train', 'ml')]),
+    ('helm uninstall "web","staging","3","2024-09-02 11:37:22 +0000 UTC","deployed"', [('web', 'staging')]),
+    ('hel uninstall a b', [('a', 'default'), ('b', 'default')]),
+    ('helm uninstall a b -n ml', [('a', 'ml'), ('b', 'ml')]),
+    ('helm uninstall -n ml a', [('a', 'ml')]),
+    ('helm uninstall a --namespace ml', [('a', 'ml')]),
+    ('helm uninstall a --namespace=ml b', [('a', 'ml'), ('b', 'ml')]),
+    ('helm uninstall a -n=ml', [('a', 'ml')]),
+    ('helm uninstall a -nml', [('a', 'ml')]),
+    ('helm uninstall a --dry-run --wait b -n ml', [('a', 'ml'), ('b', 'ml')]),
+    ('helm uninstall a --timeout 5m b --cascade=foreground', [('a', 'default'), ('b', 'default')]),
+])
+def test_parse_entry(line, expected):
+    assert parse_entry(line) == expected
+
+@pytest.mark.parametrize('line', ['helm uninstall a --kube-context prod', 'helm uninstall a --kubeconfig=x',
+                                  'helm uninstall a -x'])
+def test_parse_entry_rejects_other_options(line):
+    with pytest.raises(ValueError, match="unsupported option"):
+        parse_entry(line)
+
+def test_read_deletelist_drops_duplicates(tmp_path):
+    path = tmp_path / 'deletelist'
+    path.write_text("web\n# comment\nhelm uninstall web api\n\nml/train\nhelm uninstall train --namespace=ml\n")
+    assert read_deletelist([str(path)]) == ([('web', 'default'), ('api', 'default'), ('train', 'ml')], 2)
+
+def test_uninstalled_releases_count_as_missing():
+    inventory = [
+        {'name': 'web', 'namespace': 'default', 'status': 'deployed'},
+        {'name': 'api', 'namespace': 'default', 'status': 'uninstalling'},
+        {'name': 'old', 'namespace': 'default', 'status': 'uninstalled'},
+        {'name': 'train', 'namespace': 'ml', 'status': 'failed'},
+    ]
+    entries = [('web', 'default'), ('api', 'default'), ('old', 'default'), ('train', 'ml'), ('train', 'default')]
+    present, missing = reconcile(entries, inventory)
+    assert [entry for entry, _ in present] == [('web', 'default'), ('train', 'ml')]
+    assert missing == [('api', 'default'), ('old', 'default'), ('train', 'default')]
@@ -0,0 +1,30 @@
+from helmclean import load_records
+from helmrecords import group_key, make_record
+
+def release(name, updated, namespace='default', status='deployed', revision='3'):
+    return {'name': name, 'namespace': namespace, 'status': status, 'revision': revision, 'updated': updated}
+
+def test_make_record_parses_once_and_interns_the_key():
+    record = make_record(release('vector-backend-cu-ajt3xw-db', '100'), lambda name: name.rsplit('-', 1)[0], int)
+    assert record.epoch == 100
+    assert record.revision == 3
+    assert record.base_name == 'vector-backend-cu-ajt3xw'
+    assert record.key == 'vector-backend-cu-ajt3xw__default'
+    assert record.key is group_key('vector-backend-cu-ajt3xw', 'default')
+
+def test_missing_revision_is_zero():
+    assert make_record(release('web', '1', revision=''), str, int).revision == 0
+
+def test_load_records_counts_groups_and_skips_bad_dates(capsys):
+    records, counts, latest = load_records([
+        release('vector-backend-cu-aaa111-db', '2024-09-02 11:37:22.7 +0000 UTC'),
+        release('vector-backend-cu-aaa111-redis', '2024-09-03 11:37:22 +0100 BST'),
+        release('vector-backend-cu-aaa111-fe', 'yesterday'),
+        release('vector-backend-cu-aaa111-db', '2024-09-01 00:00:00 +0000 UTC', namespace='ml'),
+    ])
+    assert [(record.name, record.namespace) for record in records] == [
+        ('vector-backend-cu-aaa111-db', 'default'), ('vector-backend-cu-aaa111-redis', 'default'),
+        ('vector-backend-cu-aaa111-db', 'ml')]
+    assert counts == {'vector-backend-cu-aaa111__default': 2, 'vector-backend-cu-aaa111__ml': 1}
+    assert latest['vector-backend-cu-aaa111__default'] == records[1].epoch
+    assert 'Could not parse date for release vector-backend-cu-aaa111-fe' in capsys.readouterr().out
@@ -0,0 +1,73 @@
+import pytest
+
+from helmretention import (DEFAULT_POLICY, RETENTION_FILE, Policy, RetentionPolicies, RetentionSelector,
+                           parse_policy)
+
+DAY = 86400
+NOW = 100 * DAY
+
+@pytest.mark.parametrize('options, expected', [
+    ('', DEFAULT_POLICY),
+    ('keep=0', Policy(0, None, False)),
+    ('keep=2 newer-than=14 highest-revision', Policy(2, 14, True)),
+])
+def test_parse_policy(options, expected):
+    assert parse_policy(options) == expected
+
+@pytest.mark.parametrize('options', ['keep=-1', 'keep=two', 'newer-than', 'highest-revision=yes', 'oldest'])
+def test_parse_policy_rejects_bad_options(options):
+    with pytest.raises(ValueError, match=r'^retention.conf:3: bad option'):
+        parse_policy(options, 'retention.conf:3')
+
+def test_first_matching_namespace_glob_wins(tmp_path):
+    path = tmp_path / 'retention.conf'
+    path.write_text("# comment\n\nml keep=2\nml* keep=3 highest-revision\n")
+    policies = RetentionPolicies.load(str(path))
+    assert policies.for_namespace('ml') == Policy(2, None, False)
+    assert policies.for_namespace('ml-staging') == Policy(3, None, True)
+    assert policies.for_namespace('default') == DEFAULT_POLICY
+    assert policies.uniform() is None
+    assert RetentionPolicies([('*', Policy(2, None, False))]).uniform() == Policy(2, None, False)
+    assert RetentionPolicies.load(RETENTION_FILE).uniform() == DEFAULT_POLICY
+
+def select(policy, releases):
+    selector = RetentionSelector(RetentionPolicies(default=policy), NOW)
+    for name, epoch, revision in releases:
+        selector.add('group', 'default', epoch, revision, name)
+    return dict(selector.decisions('group')), selector
+
+RELEASES = [('a', 10 * DAY, 5), ('b', 50 * DAY, 2), ('c', 50 * DAY, 3), ('d', 95 * DAY, 1), ('e', 30 * DAY, 9)]
+
+def test_keep_newest_breaks_ties_by_arrival():
+    decisions, selector = select(Policy(2, None, False), RELEASES)
+    assert decisions == {'a': None, 'b': 'latest', 'c': None, 'd': 'latest', 'e': None}
+    assert selector.count('group') == 5
+    assert selector.removable('group') == ['a', 'c', 'e']
+
+def test_newer_than_and_highest_revision():
+    decisions, _ = select(Policy(1, 60, True), RELEASES)
+    assert decisions == {'a': None, 'b': 'young', 'c': 'young', 'd': 'latest', 'e': 'revision'}
+
+def test_keep_zero_keeps_nothing():
+    decisions, _ = select(Policy(0, None, False), RELEASES)
+    assert set(decisions.values()) == {None}
+
+def test_keep_ties_keeps_every_release_at_the_cutoff_time():
+    selector = RetentionSelector(RetentionPolicies(default=Policy(2, None, False)), NOW, keep_ties=True)
+    for name, epoch, revision in RELEASES + [('f', 50 * DAY, 1)]:
+        selector.add('group', 'default', epoch, revision, name)
+    # b, c and f all tie with the second newest
+    assert dict(selector.decisions('group')) == {'a': None, 'b': 'latest', 'c': 'latest', 'd': 'latest', 'e': None,
+                                                 'f': 'latest'}
+
+def test_helmclean_keeps_releases_tied_at_the_newest_time():
+    from helmclean import decide, get_base_name, load_records, retained_records
+    releases = [{'name': name, 'namespace': 'default', 'status': 'deployed', 'revision': '1',
+                 'updated': '2024-01-01 00:00:00 +0000 UTC'} for name in ('app-a-b-c-one', 'app-a-b-c-two')]
+    releases.append({'name': 'app-a-b-c-old', 'namespace': 'default', 'status': 'deployed', 'revision': '1',
+                     'updated': '2023-01-01 00:00:00 +0000 UTC'})
+    records, counts, latest = load_records(releases, get_base_name)
+    now = records[0].epoch + 100 * DAY
+    retained = retained_records(records, RetentionPolicies(), now)
+    assert [decide(record, counts, latest, now, retained)[1] for record in records] == ['latest', 'latest', 'stale']
+    assert [decide(record, counts, latest, now)[1] for record in records] == ['latest', 'latest', 'stale']
@@ -0,0 +1,37 @@
+import pytest
+
+from helmrules import Rule, RuleSet
+
+def rules(*patterns, kind='regex'):
+    return RuleSet(Rule('exclude', kind, pattern, f"rules.conf:{i}") for i, pattern in enumerate(patterns, 1))
+
+def test_leading_inline_flag_is_scoped_to_its_rule():
+    ruleset = rules('(?i)^VECTOR-', 'keep-me')
+    assert ruleset.match('exclude', 'vector-backend').pattern == '(?i)^VECTOR-'
+    assert ruleset.is_excluded('x-keep-me')
+    assert not ruleset.is_excluded('KEEP-ME')
+
+def test_verbose_flag_comment_does_not_swallow_the_group():
+    ruleset = rules('(?x) ^ raft - ship  # the shipping stacks')
+    assert ruleset.is_excluded('raft-ship-ext')
+    assert not ruleset.is_excluded('raft-shop')
+
+def test_named_backreference_still_works():
+    ruleset = rules('keep', r'^(?P<word>[a-z]+)-(?P=word)$')
+    assert ruleset.is_excluded('db-db')
+    assert not ruleset.is_excluded('db-fe')
+
+@pytest.mark.parametrize('pattern', [r'^(db)-\1$', r'(a)?(?(1)b|c)'])
+def test_numbered_references_are_rejected(pattern):
+    with pytest.raises(ValueError, match=r'rules.conf:2: numbered group reference'):
+        rules('first', pattern)
+
+def test_escaped_backslash_is_not_a_backreference():
+    assert rules(r'a\\1').is_excluded('xa\\1')
+
+@pytest.mark.parametrize('pattern', ['foo(?i)bar', '(unclosed'])
+def test_invalid_pattern_names_its_line(pattern, tmp_path):
+    path = tmp_path / 'rules.conf'
+    path.write_text(f"[exclude]\nprefix raft-ship\nregex {pattern}\n")
+    with pytest.raises(ValueError, match=r'rules.conf:3: bad regex'):
+        RuleSet.load(str(path))
@@ -0,0 +1,43 @@
+import io
+
+from helmsnapshots import (diff_snapshots, load_state, previous_snapshot, read_snapshot, save_state, snapshot_date,
+                           write_snapshot_csv)
+
+def row(name, revision='1', namespace='default', status='deployed', updated='2024-09-02 11:37:22 +0000 UTC'):
+    return {'name': name, 'namespace': namespace, 'revision': revision, 'updated': updated, 'status': status,
+            'chart': 'app-0.1.0', 'app_version': '1.0'}
+
+def test_write_then_read_round_trip(tmp_path):
+    out = io.StringIO()
+    write_snapshot_csv([row('web'), {'name': 'bare', 'namespace': 'ml'}, row('api', namespace='ml')], out)
+    assert out.getvalue().splitlines()[:2] == [
+        '"name","namespace","revision","updated","status","chart","app_version"',
+        '"web","default","1","2024-09-02 11:37:22 +0000 UTC","deployed","app-0.1.0","1.0"']
+    path = tmp_path / 'helmoutput.csv'
+    path.write_text(out.getvalue())
+    rows = read_snapshot(path)
+    assert [(r['namespace'], r['name']) for r in rows] == [('default', 'web'), ('ml', 'api'), ('ml', 'bare')]
+    assert rows[2]['status'] == ''
+
+def test_diff_snapshots():
+    old = [row('api', namespace='default'), row('gone'), row('web', revision='4')]
+    new = [row('api', namespace='default'), row('new'), row('web', revision='5'), row('train', namespace='ml')]
+    changes = [(change, (old_row or new_row)['name']) for change, old_row, new_row in diff_snapshots(old, new)]
+    assert changes == [('same', 'api'), ('removed', 'gone'), ('added', 'new'), ('changed', 'web'), ('added', 'train')]
+
+def test_previous_snapshot_is_the_newest_older_dated_file(tmp_path):
+    for name in ('helmoutput20240901.csv', 'helmoutput20240915.csv', 'helmoutput20240920.csv', 'helmoutput.csv',
+                 'helmoutput23.csv'):
+        (tmp_path / name).write_text('')
+    assert snapshot_date(str(tmp_path / 'helmoutput20240920.csv')) == '20240920'
+    assert snapshot_date('helmoutput23.csv') is None
+    assert previous_snapshot(str(tmp_path / 'helmoutput20240920.csv')) == str(tmp_path / 'helmoutput20240915.csv')
+    assert previous_snapshot(str(tmp_path / 'helmoutput.csv')) == str(tmp_path / 'helmoutput20240920.csv')
+    assert previous_snapshot(str(tmp_path / 'helmoutput20240901.csv')) is None
+
+def test_state_is_saved_next_to_the_snapshot(tmp_path):
+    snapshot = str(tmp_path / 'helmoutput20240920.csv')
+    assert load_state(snapshot) is None
+    save_state(snapshot, {'default/web': 'keep'})
+    assert load_state(snapshot) == {'default/web': 'keep'}
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['helmoutput20240920.decisions.json']
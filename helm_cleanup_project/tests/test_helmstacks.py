@@ -0,0 +1,34 @@
+import os
+
+from helmgroups import GroupingEngine
+from helmsnapshots import read_snapshot
+from helmstacks import expand_stacks
+
+SNAPSHOT = os.path.join(os.path.dirname(__file__), '..', 'helmdel', 'delhelm', 'helmoutput.csv')
+
+def rows(*names, namespace='default'):
+    return [{'name': name, 'namespace': namespace} for name in names]
+
+def test_long_lived_releases_are_not_stack_roots():
+    stacks = GroupingEngine('stack').add_all(row['name'] for row in read_snapshot(SNAPSHOT)).stacks()
+    assert 'vector-frontend' not in stacks
+    assert 'raft-ship-ext' not in stacks
+    assert sorted(stacks['vector-backend-om-eqpcna']) == [
+        'vector-backend-om-eqpcna', 'vector-backend-om-eqpcna-audit', 'vector-backend-om-eqpcna-db',
+        'vector-backend-om-eqpcna-frontend', 'vector-backend-om-eqpcna-rabbitmq', 'vector-backend-om-eqpcna-redis']
+    assert 'workflow-builder-fwk-543-be' in stacks['workflow-builder-fwk-543']
+
+def test_expanding_a_production_member_stays_put():
+    inventory = rows('vector-frontend', 'vector-frontend-unleash-proxy', 'vector-frontend-o-c26d0r',
+                     'vector-frontend-o-c26d0r-unleash-proxy')
+    assert expand_stacks([('vector-frontend-unleash-proxy', 'default')], inventory) == [
+        ('vector-frontend-unleash-proxy', 'default')]
+
+def test_expansion_adds_siblings_but_not_an_unlisted_root():
+    inventory = rows('vector-backend-cu-ajt3xw', 'vector-backend-cu-ajt3xw-db', 'vector-backend-cu-ajt3xw-redis',
+                     'vector-backend-ed-2opmwn-db')
+    assert expand_stacks([('vector-backend-cu-ajt3xw-db', 'default')], inventory) == [
+        ('vector-backend-cu-ajt3xw-db', 'default'), ('vector-backend-cu-ajt3xw-redis', 'default')]
+    assert expand_stacks([('vector-backend-cu-ajt3xw', 'default')], inventory) == [
+        ('vector-backend-cu-ajt3xw', 'default'), ('vector-backend-cu-ajt3xw-db', 'default'),
+        ('vector-backend-cu-ajt3xw-redis', 'default')]
@@ -0,0 +1,51 @@
+import pytest
+
+from fakekube import release_secret
+from helmstore import KubeAPI, decode_release, helm_time, list_release_secrets, list_releases
+
+def test_list_pages_through_every_secret(kube):
+    for i in range(5):
+        kube.add(release_secret('default', f'app{i}', 1, 'deployed'))
+    metadata = list(list_release_secrets(KubeAPI(kube.url), 'default', page_size=2))
+    assert sorted(item['labels']['name'] for item in metadata) == [f'app{i}' for i in range(5)]
+    lists = [params for method, _, params in kube.requests if method == 'GET']
+    assert len(lists) == 3
+    assert [params.get('continue') for params in lists] == [None, '2', '4']
+    assert all(params['limit'] == '2' for params in lists)
+    # Metadata only: the release payload stays on the server
+    assert all('data' not in item for item in metadata)
+
+def test_status_selector_skips_superseded_revisions(kube):
+    kube.add(release_secret('default', 'web', 1, 'superseded', created='2024-09-01T10:00:00Z'))
+    kube.add(release_secret('default', 'web', 2, 'deployed', created='2024-09-02T11:37:22Z'))
+    kube.add(release_secret('ml', 'train', 4, 'failed', created='2024-09-03T00:00:00Z'))
+    kube.add(release_secret('ml', 'old', 1, 'uninstalled'))
+    releases = list_releases(KubeAPI(kube.url))
+    assert releases == [
+        {'name': 'web', 'namespace': 'default', 'revision': '2', 'updated': '2024-09-02 11:37:22 +0000 UTC',
+         'status': 'deployed', 'chart': '', 'app_version': ''},
+        {'name': 'train', 'namespace': 'ml', 'revision': '4', 'updated': '2024-09-03 00:00:00 +0000 UTC',
+         'status': 'failed', 'chart': '', 'app_version': ''},
+    ]
+    selector = kube.requests[0][2]['labelSelector']
+    assert selector.startswith('owner=helm,status in (deployed,failed,')
+    assert 'superseded' not in selector
+
+def test_with_chart_decodes_newest_revision_only(kube):
+    kube.add(release_secret('default', 'web', 1, 'deployed', chart='web-1.0.0', app_version='1.0'))
+    kube.add(release_secret('default', 'web', 2, 'failed', chart='web-1.2.0', app_version='1.2'))
+    [release] = list_releases(KubeAPI(kube.url), 'default', with_chart=True)
+    assert (release['revision'], release['chart'], release['app_version']) == ('2', 'web-1.2.0', '1.2')
+    assert kube.requests[-1][1].endswith('/secrets/sh.helm.release.v1.web.v2')
+
+def test_decode_release():
+    secret = release_secret('default', 'web', 3, 'deployed', chart='web-2.0.1', manifest='kind: ConfigMap')
+    release = decode_release(secret)
+    assert release['version'] == 3
+    assert release['manifest'] == 'kind: ConfigMap'
+    assert release['chart']['metadata']['version'] == '2.0.1'
+
+def test_api_timestamps_parse_like_helm_list():
+    helm_cleanup = pytest.importorskip('helm_cleanup')
+    updated = helm_time('2024-09-02T11:37:22Z')
+    assert helm_cleanup.parse_helm_date(updated).timestamp() == 1725277042
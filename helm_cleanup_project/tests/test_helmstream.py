@@ -0,0 +1,46 @@
+import io
+import json
+import subprocess
+import sys
+
+import pytest
+
+from helmstream import JSONArrayDecoder, iter_json_array, stream_helm_releases
+
+RELEASES = [{'name': 'web', 'revision': '12', 'weight': -1500.25, 'tags': ['a', 'b,]'], 'chart': None},
+            {'name': 'api', 'nested': {'list': [1, 2, [3]]}}, 7, 'x']
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 65536])
+def test_elements_decode_across_any_chunk_boundary(chunk_size):
+    text = json.dumps(RELEASES, indent=1)
+    assert list(iter_json_array(io.StringIO(text), chunk_size)) == RELEASES
+
+def test_number_split_across_chunks_is_not_decoded_early():
+    decoder = JSONArrayDecoder()
+    assert decoder.feed('[-15') == []
+    assert decoder.feed('00.5, 2') == [-1500.5]
+    assert decoder.feed(']') == [2]
+    assert decoder.done
+
+@pytest.mark.parametrize('text', ['', '  \n', '[]', ' [ ] '])
+def test_empty_input_is_an_empty_array(text):
+    assert list(iter_json_array(io.StringIO(text))) == []
+
+@pytest.mark.parametrize('text', ['{"name": "web"}', '[1, 2', '[1, 2}', '[{"a": }]'])
+def test_malformed_input_raises(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), 4))
+
+def python(code):
+    return [sys.executable, '-c', code]
+
+def test_stream_helm_releases_reads_the_pipe():
+    command = python(f"import json; print(json.dumps({RELEASES!r}))")
+    assert list(stream_helm_releases(command)) == RELEASES
+
+def test_stream_helm_releases_raises_with_helm_stderr():
+    command = python("import sys; print('[]'); sys.stderr.write('Error: Kubernetes cluster unreachable'); sys.exit(1)")
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        list(stream_helm_releases(command))
+    assert e.value.returncode == 1
+    assert 'cluster unreachable' in e.value.stderr
@@ -0,0 +1,50 @@
+import io
+from itertools import islice
+
+from fakekube import release_secret
+from helmstore import KubeAPI
+from helmwatch import CleanupController, api_epoch, api_events
+
+def metadata(secret, version):
+    return dict(secret['metadata'], resourceVersion=str(version))
+
+def watches(kube):
+    return [params for method, _, params in kube.requests if params.get('watch')]
+
+def test_api_events_resume_from_bookmarks_and_relist_when_gone(kube):
+    kube.add(release_secret('default', 'web', 1, 'deployed'))
+    api = metadata(release_secret('default', 'api', 1, 'deployed'), 5)
+    kube.watches = [
+        [{'type': 'ADDED', 'object': {'metadata': api}},
+         {'type': 'BOOKMARK', 'object': {'metadata': {'resourceVersion': '9'}}}],
+        410,
+        [{'type': 'ERROR', 'object': {'code': 410, 'message': 'too old resource version'}}],
+        [{'type': 'DELETED', 'object': {'metadata': metadata(release_secret('default', 'web', 1, 'deployed'), 12)}}],
+    ]
+    events = list(islice(api_events(KubeAPI(kube.url), 'default', timeout_seconds=1, reconnect_delay=0), 5))
+    assert [event_type for event_type, _ in events] == ['SYNC', 'ADDED', 'SYNC', 'SYNC', 'DELETED']
+    assert [item['labels']['name'] for item in events[0][1]] == ['web']
+    assert events[1][1]['labels']['name'] == 'api'
+    # Resumed from the listing, then from the bookmark; each relist starts a fresh watch
+    assert [params.get('resourceVersion') for params in watches(kube)] == ['1', '9', '1', '1']
+    assert all(params['allowWatchBookmarks'] == 'true' for params in watches(kube))
+    lists = [params for method, _, params in kube.requests if method == 'GET' and not params.get('watch')]
+    assert len(lists) == 3
+
+def test_controller_uninstalls_from_watch_and_does_not_refire_after_resync(kube, capsys):
+    kube.add(release_secret('default', 'app-a-b-c-old', 1, 'deployed', created='2024-01-01T00:00:00Z'))
+    kube.add(release_secret('default', 'app-a-b-c-new', 1, 'deployed', created='2024-06-01T00:00:00Z'))
+    failed = release_secret('default', 'app-a-b-c-bad', 1, 'failed', created='2024-05-01T00:00:00Z')
+    kube.watches = [[{'type': 'ADDED', 'object': {'metadata': metadata(failed, 3)}}], 410]
+    out = io.StringIO()
+    controller = CleanupController(clock=lambda: api_epoch('2024-07-01T00:00:00Z'), out=out)
+    controller.run(islice(api_events(KubeAPI(kube.url), 'default', timeout_seconds=1, reconnect_delay=0), 3))
+    lines = out.getvalue().splitlines()
+    assert lines == [
+        'Uninstalling release app-a-b-c-old (base: app-a-b-c) in namespace default (age: 182 days)',
+        'Found failed release app-a-b-c-bad in namespace default',
+    ]
+    # The relist still shows app-a-b-c-old at the revision already handed over
+    assert controller.fired == {('default', 'app-a-b-c-old'): 1}
+    assert controller.next_expiry() is None
+    assert capsys.readouterr().out.count('Dry run: 1 release(s) would be uninstalled') == 2
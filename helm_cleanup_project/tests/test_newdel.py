@@ -0,0 +1,32 @@
+import csv
+from datetime import datetime, timezone
+
+import newdel
+from helmrules import RuleSet
+
+def test_snapshot_keeps_what_plain_helm_list_shows(monkeypatch, tmp_path):
+    statuses = ['deployed', 'failed', 'pending-install', 'pending-upgrade', 'pending-rollback', 'uninstalling',
+                'superseded', 'uninstalled']
+    inventory = [{'name': f'app-{status}', 'namespace': 'default', 'revision': '1',
+                  'updated': '2024-09-02 11:37:22 +0000 UTC', 'status': status, 'chart': 'app-1.0', 'app_version': '1'}
+                 for status in statuses]
+    monkeypatch.setattr(newdel, 'get_inventory', lambda source, namespace, ttl: inventory)
+    path = tmp_path / 'helmoutput.csv'
+    newdel.write_snapshot(str(path))
+    with open(path, newline='') as f:
+        assert [row['status'] for row in csv.DictReader(f)] == ['deployed', 'failed']
+
+def test_each_namespace_keeps_its_own_newest_and_rows_come_oldest_first():
+    def row(name, namespace, day):
+        return {'name': name, 'namespace': namespace, 'status': 'deployed', 'revision': '1', 'chart': 'app-1.0',
+                'updated': f'2024-08-{day:02d} 10:00:00 +0000 UTC'}
+    rows = [row('shop-web-cu-aaa', 'default', 5), row('shop-web-cu-bbb', 'default', 1),
+            row('shop-web-cu-ccc', 'default', 3), row('shop-web-cu-ddd', 'staging', 2),
+            row('shop-web-bl-eee', 'default', 4), row('shop-web-bl-fff', 'default', 6)]
+    decisions = newdel.evaluate_rows(rows, RuleSet([]), datetime(2024, 9, 20, tzinfo=timezone.utc))
+    subs = decisions['shop-web']['subs']
+    # staging's only release of shop-web-cu is its newest, so it stays
+    assert {sub: [(name, namespace) for name, namespace, *_ in rows] for sub, rows in subs.items()} == {
+        'shop-web-cu': [('shop-web-cu-bbb', 'default'), ('shop-web-cu-ccc', 'default')],
+        'shop-web-bl': [('shop-web-bl-eee', 'default')],
+    }